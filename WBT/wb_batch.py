@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+''' Runs one WhiteboxTools tool over many input files with a bounded process pool.
+
+Example:
+
+    from wb_batch import expand_batch, run_batch
+
+    pairs = expand_batch("/data/**/*_DEM*.tif", "{dir}/{name}_HS{ext}")
+    summary = run_batch("hillshade", pairs, "--dem", "--output",
+                        extra_args=["--azimuth=315.0"], max_workers=4)
+    print(format_summary(summary))
+'''
+
+# This script is part of the WhiteboxTools geospatial analysis library.
+# Created: 19/10/2026
+# License: MIT
+
+import glob
+import os
+from os import path
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from whitebox_tools import WhiteboxTools
+
+
+def default_workers():
+    '''
+    Default size of the process pool. Most tools are multithreaded
+    themselves, so only use half of the available cores for concurrent files.
+    '''
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def expand_batch(input_glob, output_template, work_dir=""):
+    '''
+    Expands an input glob (recursive '**' is allowed) into a sorted list of
+    (input_file, output_file) pairs. The output template may use the
+    fields {dir} (input directory), {name} (input file name without
+    extension), {ext} (input extension, including the dot) and {index}.
+    Relative globs are resolved against work_dir.
+    '''
+    if work_dir and not path.isabs(input_glob):
+        input_glob = path.join(work_dir, input_glob)
+    inputs = sorted(f for f in glob.glob(input_glob, recursive=True)
+                    if path.isfile(f))
+    pairs = []
+    for index, in_file in enumerate(inputs):
+        name, ext = path.splitext(path.basename(in_file))
+        out_file = output_template.format(dir=path.dirname(in_file), name=name,
+                                          ext=ext, index=index)
+        if work_dir and not path.isabs(out_file):
+            out_file = path.join(work_dir, out_file)
+        pairs.append((in_file, out_file))
+    return pairs
+
+
+def batch_args(in_file, out_file, input_flag, output_flag, extra_args=[]):
+    '''
+    Builds the argument list for one file of a batch.
+    '''
+    args = ["{}='{}'".format(input_flag, in_file),
+            "{}='{}'".format(output_flag, out_file)]
+    args.extend(extra_args)
+    return args
+
+
+def run_tool_process(exe_path, work_dir, tool_name, args, verbose=False,
+                     cancel_event=None):
+    '''
+    Runs a single tool in a worker process. Returns a tuple of the tool's
+    return value (see WhiteboxTools.run_tool), the elapsed time in seconds
+    and the last lines of tool output. If cancel_event (a
+    multiprocessing.Manager Event) is set, the tool is stopped at its next
+    line of output and the return value is 2.
+    '''
+    start = time.time()
+    if cancel_event is not None and cancel_event.is_set():
+        return 2, 0.0, ["Cancelled"]
+    wbt = WhiteboxTools()
+    wbt.set_whitebox_dir(exe_path)
+    if work_dir:
+        wbt.set_working_dir(work_dir)
+    wbt.set_verbose_mode(verbose)
+    lines = []
+
+    def callback(line):
+        lines.append(line)
+        if cancel_event is not None and cancel_event.is_set():
+            wbt.cancel_op = True
+
+    ret = wbt.run_tool(tool_name, args, callback)
+    return ret, time.time() - start, lines[-10:]
+
+
+def summarize_batch(results, elapsed):
+    '''
+    Summarizes a list of batch results, i.e. dicts with the keys input,
+    output, ret, seconds and messages. Runs stopped by the user (ret 2)
+    are listed as cancelled rather than failed.
+    '''
+    cancelled = [r for r in results if r['ret'] == 2]
+    failed = [r for r in results if r['ret'] not in (0, 2)]
+    succeeded = len(results) - len(failed) - len(cancelled)
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': failed,
+        'cancelled': cancelled,
+        'elapsed': elapsed,
+        'files_per_minute': 60.0 * succeeded / elapsed if elapsed > 0 else 0.0,
+        'tool_seconds': sum(r['seconds'] for r in results),
+    }
+
+
+def format_summary(summary):
+    '''
+    Formats a batch summary as printable text.
+    '''
+    lines = ["Batch complete: {} of {} files succeeded in {:.1f}s ({:.2f} files/min, {:.1f}s of tool time).".format(
+        summary['succeeded'], summary['total'], summary['elapsed'],
+        summary['files_per_minute'], summary['tool_seconds'])]
+    if summary['failed']:
+        lines.append("{} failed:".format(len(summary['failed'])))
+        for r in summary['failed']:
+            last = r['messages'][-1] if r['messages'] else ""
+            lines.append("  {} ({})".format(r['input'], last))
+    if summary['cancelled']:
+        lines.append("{} cancelled:".format(len(summary['cancelled'])))
+        for r in summary['cancelled']:
+            lines.append("  {}".format(r['input']))
+    return "\n".join(lines)
+
+
+def run_batch(tool_name, pairs, input_flag, output_flag, extra_args=[],
+              exe_path=None, work_dir="", max_workers=None, callback=print):
+    '''
+    Runs tool_name once for each (input_file, output_file) pair on a
+    process pool of max_workers processes and returns a summary dict
+    (see summarize_batch). The callback receives one line per finished file.
+    '''
+    if exe_path is None:
+        exe_path = WhiteboxTools().exe_path
+    if max_workers is None:
+        max_workers = default_workers()
+
+    results = []
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for in_file, out_file in pairs:
+            args = batch_args(in_file, out_file, input_flag, output_flag, extra_args)
+            f = executor.submit(run_tool_process, exe_path, work_dir, tool_name, args)
+            futures[f] = (in_file, out_file)
+        for f in as_completed(futures):
+            in_file, out_file = futures[f]
+            try:
+                ret, seconds, messages = f.result()
+            except Exception as e:
+                ret, seconds, messages = 1, 0.0, [str(e)]
+            results.append({'input': in_file, 'output': out_file, 'ret': ret,
+                            'seconds': seconds, 'messages': messages})
+            callback("[{}/{}] {} {} ({:.1f}s)".format(
+                len(results), len(pairs), {0: "OK", 2: "CANCELLED"}.get(ret, "FAILED"),
+                in_file, seconds))
+
+    return summarize_batch(results, time.time() - start)
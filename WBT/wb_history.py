@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+''' Records WhiteboxTools runs in a local SQLite database and reports timings.
+
+Recording is turned on by setting a database path, either with the
+WBT_HISTORY_DB environment variable (applies to every script, the Runner
+and wb_jobs.py) or with WhiteboxTools.set_history_db(). Each run stores
+the tool, arguments, input file sizes, exit status, wall and CPU time,
+peak memory, the WhiteboxTools version and the host.
+
+Usage:
+
+    python wb_history.py report --db runs.sqlite [--tool breach_depressions_least_cost]
+    python wb_history.py list --db runs.sqlite [--tool NAME] [--limit 20]
+
+The report groups runs by tool, WhiteboxTools version and host, and
+compares each group's median time per GB of input with the tool's
+earliest group.
+'''
+
+# This script is part of the WhiteboxTools geospatial analysis library.
+# Created: 19/10/2026
+# License: MIT
+
+import argparse
+import json
+import os
+from os import path
+import platform
+import re
+import sqlite3
+import sys
+import time
+from subprocess import Popen, PIPE, STDOUT
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    args TEXT NOT NULL,
+    work_dir TEXT,
+    inputs TEXT,
+    input_bytes INTEGER,
+    exit_status INTEGER,
+    wall_seconds REAL,
+    cpu_seconds REAL,
+    max_rss_kb INTEGER,
+    wbt_version TEXT,
+    host TEXT,
+    machine TEXT,
+    cpu_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_tool ON runs (tool, wbt_version, host);
+'''
+
+_versions = {}
+
+
+def wbt_version(exe_path, exe_name):
+    '''
+    Returns the version string of a WhiteboxTools executable, e.g. 'v1.4.0'.
+    The result is cached for as long as the executable is unchanged.
+    '''
+    exe = path.join(exe_path, exe_name)
+    try:
+        key = (exe, os.stat(exe).st_mtime)
+    except OSError:
+        return None
+    if key not in _versions:
+        try:
+            proc = Popen([exe, "--version"], stdout=PIPE, stderr=STDOUT,
+                         universal_newlines=True)
+            out = proc.communicate()[0]
+        except OSError:
+            out = ""
+        m = re.search(r'v\d+(\.\d+)+', out)
+        _versions[key] = m.group(0) if m else (out.strip().splitlines() or [None])[0]
+    return _versions[key]
+
+
+def input_files(args, work_dir=""):
+    '''
+    Returns (file, size) pairs for the existing files named by tool
+    arguments, ignoring output parameters.
+    '''
+    ret = []
+    for arg in args:
+        if '=' not in arg:
+            continue
+        flag, value = arg.split('=', 1)
+        if 'out' in flag.lower():
+            continue
+        for v in re.split(r'[;,]', value.strip("'\"")):
+            v = v.strip().strip("'\"")
+            if not v:
+                continue
+            f = v if path.isabs(v) or not work_dir else path.join(work_dir, v)
+            if path.isfile(f):
+                ret.append((f, path.getsize(f)))
+    return ret
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(db_path, tool_name, args, ret, wall_seconds, usage=None,
+               exe_path="", exe_name="whitebox_tools", work_dir=""):
+    '''
+    Adds one tool run to the database. usage is the resource.struct_rusage
+    of the tool process, if available.
+    '''
+    cpu_seconds = None
+    max_rss_kb = None
+    if usage is not None:
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    files = input_files(args, work_dir)
+    conn = connect(db_path)
+    with conn:
+        conn.execute(
+            '''INSERT INTO runs (started, tool, args, work_dir, inputs, input_bytes,
+            exit_status, wall_seconds, cpu_seconds, max_rss_kb, wbt_version, host,
+            machine, cpu_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - wall_seconds)),
+             tool_name, json.dumps(list(args)), work_dir, json.dumps(files),
+             sum(s for _, s in files), ret, wall_seconds, cpu_seconds, max_rss_kb,
+             wbt_version(exe_path, exe_name), platform.node(), platform.machine(),
+             os.cpu_count()))
+    conn.close()
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if n == 0:
+        return None
+    if n % 2:
+        return values[n // 2]
+    return 0.5 * (values[n // 2 - 1] + values[n // 2])
+
+
+def timing_report(db_path, tool=None):
+    '''
+    Returns one row per (tool, version, host) group of successful runs with
+    run count, median wall and CPU time, median seconds per GB of input,
+    peak memory and the ratio of seconds per GB to the tool's earliest group.
+    '''
+    conn = connect(db_path)
+    sql = '''SELECT tool, wbt_version, host, started, input_bytes, wall_seconds,
+             cpu_seconds, max_rss_kb FROM runs WHERE exit_status = 0'''
+    params = ()
+    if tool:
+        sql += " AND tool = ?"
+        params = (tool,)
+    groups = {}
+    for row in conn.execute(sql + " ORDER BY started", params):
+        groups.setdefault((row[0], row[1], row[2]), []).append(row)
+    conn.close()
+
+    report = []
+    baselines = {}
+    for (tool_name, version, host), rows in groups.items():
+        per_gb = [r[5] / (r[4] / 1e9) for r in rows if r[4]]
+        entry = {
+            'tool': tool_name,
+            'version': version,
+            'host': host,
+            'first_run': rows[0][3],
+            'runs': len(rows),
+            'median_wall': median([r[5] for r in rows]),
+            'median_cpu': median([r[6] for r in rows if r[6] is not None]),
+            'median_s_per_gb': median(per_gb),
+            'max_rss_kb': max([r[7] for r in rows if r[7] is not None] or [None]),
+        }
+        # the first group of each tool (by date, since groups come in start order)
+        # is the baseline for comparisons
+        baselines.setdefault(tool_name, entry)
+        report.append(entry)
+
+    for entry in report:
+        base = baselines[entry['tool']]
+        key = 'median_s_per_gb' if entry['median_s_per_gb'] and base['median_s_per_gb'] else 'median_wall'
+        entry['vs_baseline'] = entry[key] / base[key] if base[key] else None
+    return sorted(report, key=lambda e: (e['tool'], e['first_run']))
+
+
+def format_report(report):
+    def fmt(v, spec):
+        return format(v, spec) if v is not None else "-"
+
+    lines = ["{:<36} {:<10} {:<16} {:>5} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "tool", "version", "host", "runs", "wall(s)", "cpu(s)", "s/GB", "rss(MB)", "ratio")]
+    for e in report:
+        lines.append("{:<36} {:<10} {:<16} {:>5} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+            e['tool'][:36], str(e['version'])[:10], str(e['host'])[:16], e['runs'],
+            fmt(e['median_wall'], '.2f'), fmt(e['median_cpu'], '.2f'),
+            fmt(e['median_s_per_gb'], '.2f'),
+            fmt(e['max_rss_kb'] / 1024.0 if e['max_rss_kb'] is not None else None, '.0f'),
+            fmt(e['vs_baseline'], '.2f')))
+    return "\n".join(lines)
+
+
+def recent_runs(db_path, tool=None, limit=20):
+    conn = connect(db_path)
+    sql = '''SELECT started, tool, exit_status, wall_seconds, cpu_seconds, max_rss_kb,
+             input_bytes, wbt_version, host FROM runs'''
+    params = ()
+    if tool:
+        sql += " WHERE tool = ?"
+        params = (tool,)
+    rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reports WhiteboxTools run history.")
+    parser.add_argument("command", choices=["report", "list"])
+    parser.add_argument("--db", default=os.environ.get("WBT_HISTORY_DB", ""),
+                        help="run history database (default: $WBT_HISTORY_DB)")
+    parser.add_argument("--tool", default=None, help="only show this tool")
+    parser.add_argument("--limit", type=int, default=20, help="number of runs to list")
+    a = parser.parse_args()
+    if not a.db or not path.isfile(a.db):
+        print("Run history database not found: '{}'".format(a.db))
+        return 1
+
+    if a.command == "report":
+        print(format_report(timing_report(a.db, a.tool)))
+    else:
+        for r in recent_runs(a.db, a.tool, a.limit):
+            print("{} {:<36} status={} wall={:.2f}s cpu={} rss={}KB in={}B {} {}".format(
+                r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
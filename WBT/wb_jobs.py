@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+''' Runs a job file of WhiteboxTools tool invocations without a GUI.
+
+Jobs run on a process pool as soon as all of the jobs they depend on have
+finished. Progress is recorded in a state file next to the job file, and
+--resume skips jobs that already finished with unchanged definitions.
+
+Job files are JSON, or YAML if PyYAML is installed:
+
+    {
+        "work_dir": "/path/to/data",
+        "max_workers": 4,
+        "jobs": [
+            {"id": "fill", "tool": "fill_depressions",
+             "args": {"dem": "DEM.tif", "output": "filled.tif"}},
+            {"id": "hs", "tool": "hillshade", "depends_on": ["fill"],
+             "args": {"dem": "filled.tif", "output": "hs.tif", "azimuth": 315.0}}
+        ]
+    }
+
+Tool args may be a dict ({"flag": value}, where true adds a bare flag)
+or a list of ready-made arguments such as ["--dem='DEM.tif'"].
+
+Usage:
+
+    python wb_jobs.py job.json [--resume] [--workers N] [--exe DIR] [--dry-run]
+'''
+
+# This script is part of the WhiteboxTools geospatial analysis library.
+# Created: 19/10/2026
+# License: MIT
+
+import argparse
+import hashlib
+import json
+import os
+from os import path
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from whitebox_tools import WhiteboxTools
+from wb_batch import run_tool_process, default_workers
+
+
+def load_job_file(file_name):
+    '''
+    Reads a JSON or YAML job file and checks the job graph.
+    '''
+    with open(file_name) as f:
+        if file_name.lower().endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("PyYAML is required to read YAML job files.")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    jobs = spec.get('jobs', [])
+    ids = set()
+    for job in jobs:
+        if 'id' not in job or 'tool' not in job:
+            raise ValueError("Every job needs an 'id' and a 'tool': {}".format(job))
+        if job['id'] in ids:
+            raise ValueError("Duplicate job id: {}".format(job['id']))
+        ids.add(job['id'])
+    for job in jobs:
+        for dep in job.get('depends_on', []):
+            if dep not in ids:
+                raise ValueError("Job {} depends on unknown job {}".format(job['id'], dep))
+    topological_order(jobs)
+    return spec
+
+
+def topological_order(jobs):
+    '''
+    Returns the job ids in dependency order. Raises ValueError on cycles.
+    '''
+    remaining = {job['id']: set(job.get('depends_on', [])) for job in jobs}
+    order = []
+    while remaining:
+        ready = sorted(i for i, deps in remaining.items() if not deps)
+        if not ready:
+            raise ValueError("Job dependencies contain a cycle: {}".format(sorted(remaining)))
+        for i in ready:
+            del remaining[i]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+        order.extend(ready)
+    return order
+
+
+def job_args(job):
+    '''
+    Converts a job's args into a WhiteboxTools argument list.
+    '''
+    args = job.get('args', [])
+    if isinstance(args, list):
+        return [str(a) for a in args]
+    ret = []
+    for flag, value in args.items():
+        flag = flag if flag.startswith('-') else "--{}".format(flag)
+        if value is True:
+            ret.append(flag)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, (int, float)):
+            ret.append("{}={}".format(flag, value))
+        else:
+            ret.append("{}='{}'".format(flag, value))
+    return ret
+
+
+def job_signature(job):
+    '''
+    Hash of a job definition; resumed runs redo jobs whose definition changed.
+    '''
+    s = json.dumps({'tool': job['tool'], 'args': job_args(job)}, sort_keys=True)
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+def state_file_name(job_file):
+    return job_file + ".state.json"
+
+
+def load_state(file_name):
+    if path.isfile(file_name):
+        with open(file_name) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(file_name, state):
+    tmp = file_name + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, file_name)
+
+
+def run_jobs(spec, state_file, resume=False, max_workers=None, exe_path=None,
+             callback=print):
+    '''
+    Runs the jobs of a loaded job file. Returns the final state dict, which
+    maps job ids to a record with status ('done', 'failed' or 'skipped'),
+    seconds and the last tool messages.
+    '''
+    jobs = {job['id']: job for job in spec.get('jobs', [])}
+    work_dir = spec.get('work_dir', "")
+    if max_workers is None:
+        max_workers = spec.get('max_workers') or default_workers()
+    if exe_path is None:
+        exe_path = spec.get('exe_path') or WhiteboxTools().exe_path
+
+    # A finished job is only skipped if all of its dependencies are skipped
+    # too; otherwise it would miss the rerun dependency's new outputs.
+    state = load_state(state_file) if resume else {}
+    done = set()
+    for i in topological_order(list(jobs.values())):
+        record = state.get(i)
+        deps = set(jobs[i].get('depends_on', []))
+        if (record and record['status'] == 'done' and deps <= done and
+                record.get('signature') == job_signature(jobs[i])):
+            done.add(i)
+            callback("{}: already done, skipping".format(i))
+        else:
+            state.pop(i, None)
+
+    blocked = set()
+    running = {}
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            # Submit every job whose dependencies are done
+            for i in topological_order(list(jobs.values())):
+                if i in done or i in blocked or i in running.values():
+                    continue
+                deps = set(jobs[i].get('depends_on', []))
+                if deps & blocked:
+                    blocked.add(i)
+                    state[i] = {'status': 'skipped', 'seconds': 0.0,
+                                'messages': ["Dependency failed: {}".format(sorted(deps & blocked))]}
+                    callback("{}: skipped, a dependency failed".format(i))
+                    continue
+                if deps <= done:
+                    f = executor.submit(run_tool_process, exe_path, work_dir,
+                                        jobs[i]['tool'], job_args(jobs[i]))
+                    running[f] = i
+                    callback("{}: started {}".format(i, jobs[i]['tool']))
+
+            if not running:
+                break
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for f in finished:
+                i = running.pop(f)
+                try:
+                    ret, seconds, messages = f.result()
+                except Exception as e:
+                    ret, seconds, messages = 1, 0.0, [str(e)]
+                record = {'status': 'done' if ret == 0 else 'failed', 'seconds': seconds,
+                          'messages': messages, 'signature': job_signature(jobs[i])}
+                state[i] = record
+                if ret == 0:
+                    done.add(i)
+                else:
+                    blocked.add(i)
+                callback("{}: {} in {:.1f}s".format(i, record['status'], seconds))
+            save_state(state_file, state)
+
+    save_state(state_file, state)
+    failed = [i for i in jobs if i in state and state[i]['status'] != 'done']
+    callback("{} of {} jobs done in {:.1f}s.".format(len(jobs) - len(failed), len(jobs),
+                                                     time.time() - start))
+    for i in failed:
+        last = state[i]['messages'][-1] if state[i]['messages'] else ""
+        callback("  {} {}: {}".format(state[i]['status'], i, last))
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a WhiteboxTools job file without a GUI.")
+    parser.add_argument("job_file", help="JSON or YAML job file")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip jobs that finished in a previous run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="maximum number of concurrent tools")
+    parser.add_argument("--exe", default=None,
+                        help="directory containing the whitebox_tools executable")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the jobs in dependency order and exit")
+    a = parser.parse_args()
+
+    try:
+        spec = load_job_file(a.job_file)
+    except (OSError, ValueError) as e:
+        print("Error reading job file: {}".format(e))
+        return 1
+
+    if a.dry_run:
+        jobs = {job['id']: job for job in spec.get('jobs', [])}
+        for i in topological_order(list(jobs.values())):
+            print("{}: {} {}".format(i, jobs[i]['tool'], " ".join(job_args(jobs[i]))))
+        return 0
+
+    state = run_jobs(spec, state_file_name(a.job_file), a.resume, a.workers, a.exe)
+    # The state file may still hold jobs since removed from the job file
+    done = all(state.get(job['id'], {}).get('status') == 'done' for job in spec.get('jobs', []))
+    return 0 if done else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,9 @@ from pathlib import Path
 import glob
 from sys import platform as _platform
 import shlex
+import tempfile
+import time
+from collections import deque
 import tkinter as tk
 from tkinter import ttk
 from tkinter.scrolledtext import ScrolledText
@@ -28,10 +31,19 @@ from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import PhotoImage
 import webbrowser
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from whitebox_tools import WhiteboxTools, to_camelcase
+import wb_batch
 
 wbt = WhiteboxTools()
 
+# Maximum number of lines kept in the output console. Older lines are
+# spilled to an output log file, a new one for every run.
+MAX_OUTPUT_LINES = 5000
+# Maximum number of console/progress bar redraws per second while a tool runs.
+OUTPUT_FRAME_RATE = 10
+
 
 class FileSelector(tk.Frame):
     def __init__(self, json_str, runner, master=None):
@@ -739,7 +751,8 @@ class DataInput(tk.Frame):
 
 
 class WbRunner(tk.Frame):
-    def __init__(self, tool_name=None, master=None):
+    def __init__(self, tool_name=None, master=None, max_output_lines=MAX_OUTPUT_LINES,
+                 output_log=None, frame_rate=OUTPUT_FRAME_RATE):
         if platform.system() == 'Windows':
             self.ext = '.exe'
         else:
@@ -760,6 +773,24 @@ class WbRunner(tk.Frame):
         self.script_dir = os.path.dirname(os.path.realpath(__file__))
         self.grid()
         self.tool_name = tool_name
+        # Bounded output console state
+        self.max_output_lines = max(int(max_output_lines), 1)
+        # If no log path is given, each run spills to its own temporary file
+        self.output_log = output_log
+        self.spill_path = None
+        self.frame_interval = 1.0 / max(float(frame_rate), 1.0)
+        self.pending_lines = deque()
+        self.output_line_count = 0
+        self.spilled_line_count = 0
+        self.spill_file = None
+        self.last_frame_time = 0.0
+        self.pending_progress = None
+        # Folder batch mode state
+        self.batch_executor = None
+        self.batch_futures = {}
+        self.batch_results = []
+        self.batch_manager = None
+        self.batch_cancel = None
         self.master.title("WhiteboxTools Runner")
         if _platform == "darwin":
             os.system(
@@ -895,10 +926,12 @@ class WbRunner(tk.Frame):
         self.run_button = ttk.Button(buttons_frame, text="Run", width=8, command=self.run_tool)
         self.quit_button = ttk.Button(buttons_frame, text="Cancel", width=8, command=self.cancel_operation)
         self.help_button = ttk.Button(buttons_frame, text="Help", width=8, command=self.tool_help_button)
+        self.batch_button = ttk.Button(buttons_frame, text="Batch...", width=8, command=self.batch_dialog)
         #Define layout of the frame
-        self.run_button.grid(row=0, column=0)
-        self.quit_button.grid(row=0, column=1)
-        self.help_button.grid(row = 0, column = 2)
+        self.batch_button.grid(row=0, column=0)
+        self.run_button.grid(row=0, column=1)
+        self.quit_button.grid(row=0, column=2)
+        self.help_button.grid(row = 0, column = 3)
         buttons_frame.grid(row=2, column=0, columnspan = 2, sticky=tk.E)
         #########################################################
         #                  Output Frame                      #
@@ -953,6 +986,7 @@ class WbRunner(tk.Frame):
         filemenu.add_command(label="Set Working Directory", command=self.set_directory)
         filemenu.add_command(label="Locate WhiteboxTools exe", command=self.select_exe)
         filemenu.add_command(label="Refresh Tools", command=self.refresh_tools)
+        filemenu.add_command(label="Set Run History Database", command=self.set_history_db)
         filemenu.add_separator()
         filemenu.add_command(label="Exit", command=self.quit)
         menubar.add_cascade(label="File", menu=filemenu)
@@ -1032,7 +1066,7 @@ class WbRunner(tk.Frame):
         self.update_tool_help()
   
     def update_tool_help(self):
-        self.out_text.delete('1.0', tk.END)
+        self.clear_output()
         for widget in self.arg_scroll_frame.winfo_children():
             widget.destroy()
 
@@ -1210,6 +1244,14 @@ class WbRunner(tk.Frame):
             messagebox.showinfo(
                 "Warning", "Could not find WhiteboxTools executable file.")
 
+    def set_history_db(self):
+        filename = filedialog.asksaveasfilename(
+            initialdir=self.working_dir, title="Run history database",
+            filetypes=[("SQLite databases", "*.sqlite"), ("all files", "*.*")])
+        if filename:
+            wbt.set_history_db(filename)
+            self.print_line_to_output("Recording tool runs in {}".format(filename))
+
     def run_tool(self):
         # wd_str = self.wd.get_value()
         wbt.set_working_dir(self.working_dir)
@@ -1228,8 +1270,13 @@ class WbRunner(tk.Frame):
         self.print_line_to_output("")
         # self.print_line_to_output("Tool arguments:{}".format(args))
         # self.print_line_to_output("")
+        # A Cancel pressed while no tool was running must not stop this run
+        wbt.cancel_op = False
         # Run the tool and check the return value for an error
-        if wbt.run_tool(self.tool_name, args, self.custom_callback) == 1:
+        ret = wbt.run_tool(self.tool_name, args, self.custom_callback)
+        self.flush_output()
+        self.close_spill_file()
+        if ret == 1:
             print("Error running {}".format(self.tool_name))
 
         else:
@@ -1239,15 +1286,195 @@ class WbRunner(tk.Frame):
             self.progress.update_idletasks()
 
     def print_to_output(self, value):
+        self.flush_output()
         self.out_text.insert(tk.END, value)
+        self.output_line_count += value.count("\n")
+        self.trim_output()
         self.out_text.see(tk.END)
 
     def print_line_to_output(self, value):
-        self.out_text.insert(tk.END, value + "\n")
-        self.out_text.see(tk.END)
+        self.queue_output(value)
+        self.flush_output()
+
+    def queue_output(self, value):
+        ''' Buffers a line of tool output until the next console redraw.
+        A full buffer is flushed early, so that trim_output spills the
+        console's oldest lines to the output log in order.
+        '''
+        self.pending_lines.append(value)
+        if len(self.pending_lines) >= self.max_output_lines:
+            self.flush_output()
+
+    def flush_output(self):
+        ''' Writes buffered lines and the latest progress value to the widgets.
+        '''
+        if self.pending_lines:
+            lines = list(self.pending_lines)
+            self.pending_lines.clear()
+            self.out_text.insert(tk.END, "\n".join(lines) + "\n")
+            self.output_line_count += len(lines)
+            self.trim_output()
+            self.out_text.see(tk.END)
+        if self.pending_progress is not None:
+            label, progress = self.pending_progress
+            self.pending_progress = None
+            self.progress_var.set(progress)
+            self.progress_label['text'] = label
+        self.last_frame_time = time.monotonic()
+
+    def trim_output(self):
+        ''' Removes the oldest lines from the output widget once it holds
+        more than max_output_lines lines, spilling them to the output log.
+        '''
+        excess = self.output_line_count - self.max_output_lines
+        if excess <= 0:
+            return
+        end_index = "{}.0".format(excess + 1)
+        removed = self.out_text.get("1.0", end_index)
+        self.out_text.delete("1.0", end_index)
+        self.output_line_count -= excess
+        self.spill_lines(removed.splitlines())
+
+    def spill_lines(self, lines):
+        if not lines:
+            return
+        try:
+            if self.spill_file is None:
+                # A new (or truncated) log for every run
+                if self.output_log:
+                    self.spill_file = open(self.output_log, "w")
+                else:
+                    self.spill_file = tempfile.NamedTemporaryFile(
+                        "w", prefix="wb_runner_", suffix=".log", delete=False)
+                self.spill_path = self.spill_file.name
+            self.spill_file.write("\n".join(lines) + "\n")
+            self.spilled_line_count += len(lines)
+        except OSError as e:
+            print("Could not write to output log {}: {}".format(
+                self.spill_path or self.output_log, e))
+
+    def close_spill_file(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            self.out_text.insert(tk.END, "({} earlier lines written to {})\n".format(
+                self.spilled_line_count, self.spill_path))
+            self.output_line_count += 1
+            self.spilled_line_count = 0
+            self.out_text.see(tk.END)
+
+    def clear_output(self):
+        # Later output spills to a new log rather than after the lines cleared here
+        self.close_spill_file()
+        self.pending_lines.clear()
+        self.pending_progress = None
+        self.out_text.delete('1.0', tk.END)
+        self.output_line_count = 0
+
+    def batch_dialog(self):
+        inputs = []
+        outputs = []
+        for widget in self.arg_scroll_frame.winfo_children():
+            if isinstance(widget, FileSelector):
+                if "ExistingFile" in widget.parameter_type:
+                    inputs.append(widget.flag)
+                elif "NewFile" in widget.parameter_type:
+                    outputs.append(widget.flag)
+        if not inputs or not outputs:
+            messagebox.showinfo(
+                "Error", "{} needs an input file and an output file parameter to run in batch mode.".format(self.tool_name))
+            return
+        BatchDialog(self, inputs, outputs)
+
+    def run_batch(self, input_glob, output_template, input_flag, output_flag, max_workers):
+        ''' Runs the current tool over every file matching input_glob. The
+        input and output parameters are taken from the batch dialog; all
+        other parameters come from the tool's parameter widgets.
+        '''
+        if self.batch_executor is not None:
+            messagebox.showinfo("Error", "A batch is already running.")
+            return
+        extra_args = []
+        for widget in self.arg_scroll_frame.winfo_children():
+            if getattr(widget, 'flag', None) in (input_flag, output_flag):
+                continue
+            v = widget.get_value()
+            if v:
+                extra_args.append(v)
+            elif not widget.optional:
+                messagebox.showinfo(
+                    "Error", "Non-optional tool parameter not specified.")
+                return
+
+        pairs = wb_batch.expand_batch(input_glob, output_template, self.working_dir)
+        if not pairs:
+            messagebox.showinfo("Error", "No files match {}.".format(input_glob))
+            return
+
+        self.print_line_to_output("")
+        self.print_line_to_output("Running {} on {} files with {} processes...".format(
+            self.tool_name, len(pairs), max_workers))
+        self.batch_results = []
+        self.batch_start = time.time()
+        self.batch_total = len(pairs)
+        self.batch_executor = ProcessPoolExecutor(max_workers=max_workers)
+        # Shared with the worker processes, to stop the tools they are running
+        self.batch_manager = multiprocessing.Manager()
+        self.batch_cancel = self.batch_manager.Event()
+        self.batch_futures = {}
+        for in_file, out_file in pairs:
+            args = wb_batch.batch_args(in_file, out_file, input_flag, output_flag, extra_args)
+            f = self.batch_executor.submit(wb_batch.run_tool_process, self.exe_path,
+                                           self.working_dir, self.tool_name, args,
+                                           False, self.batch_cancel)
+            self.batch_futures[f] = (in_file, out_file)
+        self.after(int(self.frame_interval * 1000), self.poll_batch)
+
+    def poll_batch(self):
+        ''' Collects finished batch jobs without blocking the event loop.
+        '''
+        for f in [f for f in self.batch_futures if f.done()]:
+            in_file, out_file = self.batch_futures.pop(f)
+            if f.cancelled():
+                continue
+            try:
+                ret, seconds, messages = f.result()
+            except Exception as e:
+                ret, seconds, messages = 1, 0.0, [str(e)]
+            self.batch_results.append({'input': in_file, 'output': out_file, 'ret': ret,
+                                       'seconds': seconds, 'messages': messages})
+            self.queue_output("[{}/{}] {} {} ({:.1f}s)".format(
+                len(self.batch_results), self.batch_total,
+                {0: "OK", 2: "CANCELLED"}.get(ret, "FAILED"), in_file, seconds))
+        self.pending_progress = ("Batch: {} of {}".format(len(self.batch_results), self.batch_total),
+                                 int(100 * len(self.batch_results) / self.batch_total))
+        self.flush_output()
+
+        if self.batch_futures:
+            self.after(int(self.frame_interval * 1000), self.poll_batch)
+            return
+
+        self.batch_executor.shutdown(wait=False)
+        self.batch_executor = None
+        self.batch_manager.shutdown()
+        self.batch_manager = None
+        self.batch_cancel = None
+        summary = wb_batch.summarize_batch(self.batch_results, time.time() - self.batch_start)
+        self.print_line_to_output(wb_batch.format_summary(summary))
+        self.close_spill_file()
+        self.progress_var.set(0)
+        self.progress_label['text'] = "Progress:"
 
     def cancel_operation(self):
-        wbt.cancel_op = True
+        if self.batch_executor is not None:
+            # Queued files are dropped; the workers stop the tools they are
+            # running at their next line of output. The runner's own tool
+            # isn't running, so wbt.cancel_op is left alone.
+            for f in self.batch_futures:
+                f.cancel()
+            self.batch_cancel.set()
+        else:
+            wbt.cancel_op = True
         self.print_line_to_output("Cancelling operation...")
         self.progress.update_idletasks()
 
@@ -1287,16 +1514,19 @@ class WbRunner(tk.Frame):
                     str_array[len(str_array) - 1], "").strip()
                 progress = float(
                     str_array[len(str_array) - 1].replace("%", "").strip())
-                self.progress_var.set(int(progress))
-                self.progress_label['text'] = label
+                self.pending_progress = (label, int(progress))
             except ValueError as e:
                 print("Problem converting parsed data into number: ", e)
             except Exception as e:
                 print(e)
         else:
-            self.print_line_to_output(value)
+            self.queue_output(value)
 
-        self.update()  # this is needed for cancelling and updating the progress bar
+        # Redraw at most frame_rate times per second, however fast the tool prints.
+        # update() is still needed for cancelling and updating the progress bar.
+        if time.monotonic() - self.last_frame_time >= self.frame_interval:
+            self.flush_output()
+            self.update()
 
     def select_all(self, event):
         self.out_text.tag_add(tk.SEL, "1.0", tk.END)
@@ -1304,6 +1534,57 @@ class WbRunner(tk.Frame):
         self.out_text.see(tk.INSERT)
         return 'break'
 
+class BatchDialog(tk.Toplevel):
+    ''' Asks for the input glob, output name template and process count
+    of a folder batch run.
+    '''
+    def __init__(self, runner, input_flags, output_flags):
+        tk.Toplevel.__init__(self, runner)
+        self.runner = runner
+        self.title("Batch: {}".format(runner.tool_name))
+        self.transient(runner)
+
+        frame = ttk.Frame(self, padding='0.1i')
+        frame.grid(row=0, column=0, sticky=tk.NSEW)
+
+        self.input_glob = tk.StringVar(value=path.join(runner.working_dir, "**", "*.tif"))
+        self.output_template = tk.StringVar(value="{dir}/{name}_out{ext}")
+        self.input_flag = tk.StringVar(value=input_flags[0])
+        self.output_flag = tk.StringVar(value=output_flags[0])
+        self.max_workers = tk.IntVar(value=wb_batch.default_workers())
+
+        rows = [
+            ("Input files (glob):", ttk.Entry(frame, width=50, textvariable=self.input_glob)),
+            ("Output name ({dir}, {name}, {ext}, {index}):",
+             ttk.Entry(frame, width=50, textvariable=self.output_template)),
+            ("Input parameter:", ttk.Combobox(frame, values=input_flags,
+                                              textvariable=self.input_flag, state='readonly')),
+            ("Output parameter:", ttk.Combobox(frame, values=output_flags,
+                                               textvariable=self.output_flag, state='readonly')),
+            ("Processes:", ttk.Spinbox(frame, from_=1, to=os.cpu_count() or 1,
+                                       width=5, textvariable=self.max_workers)),
+        ]
+        for row, (text, widget) in enumerate(rows):
+            ttk.Label(frame, text=text, justify=tk.LEFT).grid(row=row, column=0, sticky=tk.W)
+            widget.grid(row=row, column=1, sticky=tk.W)
+
+        buttons_frame = ttk.Frame(frame, padding='0.1i')
+        ttk.Button(buttons_frame, text="Run", width=8, command=self.run).grid(row=0, column=0)
+        ttk.Button(buttons_frame, text="Cancel", width=8, command=self.destroy).grid(row=0, column=1)
+        buttons_frame.grid(row=len(rows), column=0, columnspan=2, sticky=tk.E)
+
+    def run(self):
+        try:
+            max_workers = max(1, int(self.max_workers.get()))
+        except (ValueError, tk.TclError):
+            messagebox.showinfo("Error", "Error converting Processes to type Integer.")
+            return
+        args = (self.input_glob.get(), self.output_template.get(),
+                self.input_flag.get(), self.output_flag.get(), max_workers)
+        self.destroy()
+        self.runner.run_batch(*args)
+
+
 class JsonPayload(object):
     def __init__(self, j):
         self.__dict__ = json.loads(j)
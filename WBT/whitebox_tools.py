@@ -15,8 +15,16 @@ from os import path
 import sys
 import platform
 import re
+import time
 # import shutil
 from subprocess import CalledProcessError, Popen, PIPE, STDOUT
+try:
+    from . import wb_history
+except ImportError:
+    try:
+        import wb_history
+    except ImportError:
+        wb_history = None
 
 
 def default_callback(value):
@@ -43,6 +51,22 @@ def to_snakecase(name):
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
+def wait_for_process(proc):
+    '''
+    Waits for a tool process to exit. Returns the exit status and the
+    process's resource usage, or None for the resource usage on platforms
+    without os.wait4.
+    '''
+    if hasattr(os, 'wait4') and hasattr(os, 'waitstatus_to_exitcode'):
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return proc.returncode, usage
+        except ChildProcessError:
+            pass
+    return proc.wait(), None
+
+
 class WhiteboxTools(object):
     ''' 
     An object for interfacing with the WhiteboxTools executable.
@@ -62,6 +86,8 @@ class WhiteboxTools(object):
         self.verbose = True
         self.cancel_op = False
         self.default_callback = default_callback
+        self.history_db = os.environ.get("WBT_HISTORY_DB", "")
+        self.cpu_affinity = None
 
     def set_whitebox_dir(self, path_str):
         ''' 
@@ -90,6 +116,39 @@ class WhiteboxTools(object):
         '''
         self.verbose = val
 
+    def set_history_db(self, path_str):
+        ''' 
+        Sets the SQLite run history database. When set, every run_tool
+        call is recorded in it (see wb_history.py). An empty string turns
+        recording off. The WBT_HISTORY_DB environment variable sets the
+        default.
+        '''
+        self.history_db = path_str
+
+    def set_cpu_affinity(self, cpus=None):
+        ''' 
+        Restricts tool processes to a set of CPU ids, e.g. range(4), so that
+        concurrent tools don't compete for the same cores. The tools size
+        their thread pools to the CPUs they are allowed to use. Only
+        supported on platforms with os.sched_setaffinity (Linux); None
+        removes the restriction.
+        '''
+        self.cpu_affinity = None if cpus is None else set(cpus)
+
+    def record_run(self, tool_name, args, ret, start_time, usage):
+        ''' 
+        Records a finished tool run in the run history database.
+        '''
+        if wb_history is None:
+            print("Could not record run history: wb_history.py not found")
+            return
+        try:
+            wb_history.record_run(self.history_db, tool_name, args, ret,
+                                  time.time() - start_time, usage,
+                                  self.exe_path, self.exe_name, self.work_dir)
+        except Exception as err:
+            print("Could not record run history: {}".format(err))
+
     def run_tool(self, tool_name, args, callback=None):
         ''' 
         Runs a tool and specifies tool arguments.
@@ -124,9 +183,18 @@ class WhiteboxTools(object):
                     cl += v + " "
                 callback(cl.strip() + "\n")
 
+            start_time = time.time()
             proc = Popen(args2, shell=False, stdout=PIPE,
                          stderr=STDOUT, bufsize=1, universal_newlines=True)
 
+            # Set the affinity from the parent after the fork; preexec_fn is
+            # not safe when tools are launched from several threads.
+            if self.cpu_affinity and hasattr(os, 'sched_setaffinity'):
+                try:
+                    os.sched_setaffinity(proc.pid, self.cpu_affinity)
+                except OSError:
+                    pass  # the tool already exited
+
             while True:
                 line = proc.stdout.readline()
                 sys.stdout.flush()
@@ -136,12 +204,21 @@ class WhiteboxTools(object):
                     else:
                         self.cancel_op = False
                         proc.terminate()
+                        status, usage = wait_for_process(proc)
+                        if self.history_db:
+                            self.record_run(tool_name, args, 2, start_time, usage)
                         return 2
 
                 else:
                     break
 
-            return 0
+            # A non-zero exit status means the tool reported an error.
+            status, usage = wait_for_process(proc)
+            ret = 0 if status == 0 else 1
+            if self.history_db:
+                self.record_run(tool_name, args, ret, start_time, usage)
+
+            return ret
         except (OSError, ValueError, CalledProcessError) as err:
             callback(str(err))
             return 1
@@ -0,0 +1,194 @@
+#! python3
+"""
+Functions to read raster grid information and to read and write rasters in strips.
+
+Requires the GDAL Python bindings (`osgeo`) and NumPy.
+"""
+
+
+def read_header_00(raster_path):
+    """Reads the grid definition of a raster without reading any cell values.
+
+    Parameters
+    ----------
+    raster_path : str
+        Path to raster file
+
+    Returns
+    -------
+    header : dict
+        Keys: cols, rows, transform (GDAL geotransform), projection (WKT),
+        nodata, cell_x, cell_y, extent (xmin, ymin, xmax, ymax), dtype (GDAL
+        data type name)
+    """
+
+    from osgeo import gdal
+
+    ds = gdal.Open(str(raster_path))
+    if ds is None:
+        raise IOError("Could not open raster: {}".format(raster_path))
+    band = ds.GetRasterBand(1)
+    gt = ds.GetGeoTransform()
+    cols = ds.RasterXSize
+    rows = ds.RasterYSize
+    xs = (gt[0], gt[0] + cols * gt[1])
+    ys = (gt[3], gt[3] + rows * gt[5])
+
+    header = dict(
+        cols=cols,
+        rows=rows,
+        transform=gt,
+        projection=ds.GetProjection(),
+        nodata=band.GetNoDataValue(),
+        cell_x=abs(gt[1]),
+        cell_y=abs(gt[5]),
+        extent=(min(xs), min(ys), max(xs), max(ys)),
+        dtype=gdal.GetDataTypeName(band.DataType),
+    )
+    ds = None
+
+    return header
+
+
+def grid_signature_00(raster_path, digits=6):
+    """Creates a short string that is the same for rasters on the same grid.
+
+    Two rasters have the same signature if they have the same size, origin,
+    cell size and projection.
+
+    Parameters
+    ----------
+    raster_path : str
+        Path to raster file
+    digits : int
+        Number of decimal places compared for the origin and cell size
+
+    Returns
+    -------
+    signature : str
+    """
+
+    import hashlib
+
+    h = read_header_00(raster_path)
+    key = "{}x{}|{}|{}".format(
+        h['cols'], h['rows'],
+        ",".join(str(round(v, digits)) for v in h['transform']),
+        h['projection'])
+
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def block_rows_00(raster_path, target_cells=4194304):
+    """Number of rows to read at a time, a multiple of the file's block height.
+
+    Parameters
+    ----------
+    raster_path : str
+        Path to raster file
+    target_cells : int
+        Approximate number of cells per strip
+
+    Returns
+    -------
+    rows : int
+    """
+
+    from osgeo import gdal
+
+    ds = gdal.Open(str(raster_path))
+    block_y = max(ds.GetRasterBand(1).GetBlockSize()[1], 1)
+    rows = max(target_cells // max(ds.RasterXSize, 1), 1)
+    ds = None
+
+    return max((rows // block_y) * block_y, block_y)
+
+
+def row_strips_00(rows, strip_rows):
+    """Splits a raster's rows into strips.
+
+    Returns
+    -------
+    strips : list of tuple
+        (first_row, number_of_rows) of each strip
+    """
+
+    return [(r, min(strip_rows, rows - r)) for r in range(0, rows, strip_rows)]
+
+
+def create_like_00(raster_path, out_path, dtype=None, nodata=None,
+                   options=('TILED=YES', 'BIGTIFF=IF_SAFER')):
+    """Creates an empty GeoTIFF on the same grid as a raster.
+
+    The default creation options write an uncompressed, tiled file, so windows
+    that were already written can be rewritten in place.
+
+    Parameters
+    ----------
+    raster_path : str
+        Path to template raster
+    out_path : str
+        Path to output .tif file
+    dtype : str, optional
+        GDAL data type name. Example: 'Float32'. Defaults to the template's type.
+    nodata : float, optional
+        Nodata value. Defaults to the template's nodata value.
+    options : tuple of str, optional
+        GDAL GTiff creation options
+
+    Returns
+    -------
+    ds : gdal.Dataset
+        Open output dataset. Set it to None to close the file.
+    """
+
+    from osgeo import gdal
+
+    src = gdal.Open(str(raster_path))
+    band = src.GetRasterBand(1)
+    if dtype is None:
+        gdal_type = band.DataType
+    else:
+        gdal_type = gdal.GetDataTypeByName(dtype)
+    if nodata is None:
+        nodata = band.GetNoDataValue()
+
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(str(out_path), src.RasterXSize, src.RasterYSize, 1,
+                       gdal_type, list(options))
+    ds.SetGeoTransform(src.GetGeoTransform())
+    ds.SetProjection(src.GetProjection())
+    if nodata is not None:
+        ds.GetRasterBand(1).SetNoDataValue(nodata)
+    src = None
+
+    return ds
+
+
+def valid_mask_00(values, nodata):
+    """Boolean array of the cells that aren't nodata (or NaN)."""
+
+    import numpy as np
+
+    mask = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(values.shape, bool)
+    if nodata is not None:
+        mask &= values != nodata
+
+    return mask
+
+
+def valid_area_00(raster_path):
+    """Area of a raster's cells that aren't nodata, in square map units."""
+
+    import numpy as np
+    from osgeo import gdal
+
+    h = read_header_00(raster_path)
+    ds = gdal.Open(str(raster_path))
+    band = ds.GetRasterBand(1)
+    cells = 0
+    for r0, n in row_strips_00(h['rows'], block_rows_00(raster_path)):
+        cells += int(np.count_nonzero(valid_mask_00(band.ReadAsArray(0, r0, h['cols'], n), h['nodata'])))
+    ds = None
+
+    return cells * h['cell_x'] * h['cell_y']
@@ -0,0 +1,467 @@
+#! python3
+"""
+Functions to read and subset ESRI shapefiles without GIS libraries.
+
+Only the parts of the format needed for culvert files are handled: record
+bounding boxes, polyline coordinates, raw record copying and the dBase
+attribute table. `read_polylines_00` needs NumPy.
+"""
+
+SHP_HEADER_LENGTH = 100
+
+
+def read_shp_header_00(shp_path):
+    """Reads the main file header of a .shp or .shx file.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to .shp or .shx file
+
+    Returns
+    -------
+    header : dict
+        Keys: file_length (bytes), shape_type, bbox (xmin, ymin, xmax, ymax)
+    """
+
+    import struct
+
+    with open(str(shp_path), 'rb') as f:
+        data = f.read(SHP_HEADER_LENGTH)
+
+    file_code, = struct.unpack('>i', data[0:4])
+    if file_code != 9994:
+        raise ValueError("Not a shapefile: {}".format(shp_path))
+    file_words, = struct.unpack('>i', data[24:28])
+    shape_type, = struct.unpack('<i', data[32:36])
+    bbox = struct.unpack('<4d', data[36:68])
+
+    return dict(file_length=file_words * 2, shape_type=shape_type, bbox=bbox)
+
+
+def read_shx_00(shp_path):
+    """Reads the record offsets and lengths from the shapefile's .shx index.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to .shp file. The .shx file must be next to it.
+
+    Returns
+    -------
+    records : list of tuple
+        (offset, content_length) of each record in the .shp file, in bytes
+    """
+
+    import struct
+    from pathlib import Path
+
+    shx = Path(str(shp_path)).with_suffix(".shx")
+    with open(str(shx), 'rb') as f:
+        data = f.read()
+
+    n = (len(data) - SHP_HEADER_LENGTH) // 8
+    words = struct.unpack('>{}i'.format(2 * n), data[SHP_HEADER_LENGTH:SHP_HEADER_LENGTH + 8 * n])
+
+    return [(words[2 * i] * 2, words[2 * i + 1] * 2) for i in range(n)]
+
+
+def record_bbox_00(content):
+    """Bounding box of a shape record's content, or None for null shapes."""
+
+    import struct
+
+    shape_type, = struct.unpack('<i', content[0:4])
+    if shape_type == 0:
+        return None
+    if shape_type in (1, 11, 21):
+        x, y = struct.unpack('<2d', content[4:20])
+        return (x, y, x, y)
+
+    return struct.unpack('<4d', content[4:36])
+
+
+def read_bboxes_00(shp_path):
+    """Reads the bounding box of every record in a shapefile.
+
+    Only the first 36 bytes of each record are read.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to .shp file
+
+    Returns
+    -------
+    bboxes : list of tuple
+        (xmin, ymin, xmax, ymax) of each record, or None for null shapes
+    """
+
+    bboxes = []
+    with open(str(shp_path), 'rb') as f:
+        for offset, length in read_shx_00(shp_path):
+            f.seek(offset + 8)
+            bboxes.append(record_bbox_00(f.read(min(length, 36))))
+
+    return bboxes
+
+
+def read_records_00(shp_path, record_ids=None):
+    """Reads the raw content of shape records.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to .shp file
+    record_ids : list of int, optional
+        Zero-based record numbers. If none given, reads every record.
+
+    Returns
+    -------
+    records : list of bytes
+    """
+
+    index = read_shx_00(shp_path)
+    if record_ids is None:
+        record_ids = range(len(index))
+
+    records = []
+    with open(str(shp_path), 'rb') as f:
+        for i in record_ids:
+            offset, length = index[i]
+            f.seek(offset + 8)
+            records.append(f.read(length))
+
+    return records
+
+
+def read_polylines_00(shp_path, record_ids=None):
+    """Reads the coordinates of polyline records into NumPy arrays.
+
+    Z and M values of PolyLineZ and PolyLineM records are ignored.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to polyline .shp file
+    record_ids : list of int, optional
+        Zero-based record numbers. If none given, reads every record.
+
+    Returns
+    -------
+    lines : dict
+        Keys: xy (float64 array of (points, 2) vertices), part_offsets (index
+        of each part's first vertex in `xy`, plus the number of vertices),
+        part_records (position of each part's record in `record_ids`),
+        num_records
+    """
+
+    import struct
+
+    import numpy as np
+
+    if record_ids is None:
+        record_ids = range(len(read_shx_00(shp_path)))
+    record_ids = list(record_ids)
+
+    xy = []
+    part_offsets = []
+    part_records = []
+    base = 0
+    for rec, content in enumerate(read_records_00(shp_path, record_ids)):
+        shape_type, = struct.unpack('<i', content[0:4])
+        if shape_type == 0:
+            continue
+        if shape_type not in (3, 13, 23):
+            raise ValueError("Record {} of {} is not a polyline".format(
+                record_ids[rec], shp_path))
+        num_parts, num_points = struct.unpack('<2i', content[36:44])
+        parts = struct.unpack('<{}i'.format(num_parts), content[44:44 + 4 * num_parts])
+        start = 44 + 4 * num_parts
+        xy.append(np.frombuffer(content, '<f8', 2 * num_points, start).reshape(-1, 2))
+        part_offsets.extend(base + p for p in parts)
+        part_records.extend([rec] * num_parts)
+        base += num_points
+    part_offsets.append(base)
+
+    return dict(
+        xy=np.concatenate(xy) if xy else np.zeros((0, 2)),
+        part_offsets=np.array(part_offsets, dtype='int64'),
+        part_records=np.array(part_records, dtype='int64'),
+        num_records=len(record_ids),
+    )
+
+
+def polyline_records_00(lines):
+    """Encodes polylines as raw shape records, the reverse of `read_polylines_00`.
+
+    Records without parts are written as null shapes.
+
+    Returns
+    -------
+    records : list of bytes
+    """
+
+    import struct
+
+    import numpy as np
+
+    xy = lines['xy']
+    offsets = lines['part_offsets']
+    part_records = lines['part_records']
+    first_part = np.searchsorted(part_records, np.arange(lines['num_records'] + 1))
+
+    records = []
+    for rec in range(lines['num_records']):
+        p0, p1 = first_part[rec], first_part[rec + 1]
+        if p0 == p1:
+            records.append(struct.pack('<i', 0))
+            continue
+        points = np.ascontiguousarray(xy[offsets[p0]:offsets[p1]], dtype='<f8')
+        parts = offsets[p0:p1] - offsets[p0]
+        records.append(
+            struct.pack('<i4d2i', 3, points[:, 0].min(), points[:, 1].min(),
+                        points[:, 0].max(), points[:, 1].max(), len(parts), len(points)) +
+            struct.pack('<{}i'.format(len(parts)), *parts) +
+            points.tobytes())
+
+    return records
+
+
+def read_dbf_header_00(dbf_path):
+    """Reads the header of a dBase file.
+
+    Returns
+    -------
+    header : dict
+        Keys: num_records, header_length, record_length, fields (list of
+        (name, type, length, decimals)), raw (header bytes)
+    """
+
+    import struct
+
+    with open(str(dbf_path), 'rb') as f:
+        start = f.read(32)
+        num_records, header_length, record_length = struct.unpack('<IHH', start[4:12])
+        raw = start + f.read(header_length - 32)
+
+    fields = []
+    for pos in range(32, header_length - 1, 32):
+        desc = raw[pos:pos + 32]
+        if desc[0] == 0x0D:
+            break
+        name = desc[0:11].split(b'\x00')[0].decode('ascii', 'replace')
+        fields.append((name, chr(desc[11]), desc[16], desc[17]))
+
+    return dict(num_records=num_records, header_length=header_length,
+                record_length=record_length, fields=fields, raw=raw)
+
+
+def read_dbf_records_00(dbf_path, record_ids=None):
+    """Reads raw dBase records (including the deletion flag byte)."""
+
+    header = read_dbf_header_00(dbf_path)
+    n = header['num_records']
+    size = header['record_length']
+    if record_ids is None:
+        record_ids = range(n)
+
+    records = []
+    with open(str(dbf_path), 'rb') as f:
+        for i in record_ids:
+            f.seek(header['header_length'] + i * size)
+            records.append(f.read(size))
+
+    return records
+
+
+def read_dbf_columns_00(dbf_path):
+    """Reads a whole dBase table into one NumPy array per field.
+
+    The records are read in one block and each field is parsed for all
+    records at once. Numeric fields without decimals become int64 (float64
+    if a value is blank), other numeric fields float64 (NaN where blank),
+    logical fields bool and the other fields str.
+
+    Returns
+    -------
+    columns : dict
+        Array of each field, by field name, in field order
+    """
+
+    import numpy as np
+
+    header = read_dbf_header_00(dbf_path)
+    n = header['num_records']
+    size = header['record_length']
+    with open(str(dbf_path), 'rb') as f:
+        f.seek(header['header_length'])
+        data = f.read(n * size)
+    rows = np.frombuffer(data, 'uint8', n * size).reshape(n, size)
+
+    columns = {}
+    pos = 1
+    for name, field_type, length, decimals in header['fields']:
+        raw = np.ascontiguousarray(rows[:, pos:pos + length]).view('S{}'.format(length)).ravel()
+        pos += length
+        if field_type in ('N', 'F'):
+            text = np.char.strip(raw)
+            blank = (text == b'') | (np.char.strip(text, b'*') == b'')
+            values = np.where(blank, b'nan', text).astype('float64')
+            if field_type == 'N' and decimals == 0 and not blank.any():
+                values = values.astype('int64')
+        elif field_type == 'L':
+            values = np.isin(np.char.upper(np.char.strip(raw)), [b'T', b'Y'])
+        else:
+            values = np.char.rstrip(np.char.decode(raw, 'utf-8', 'replace'))
+        columns[name] = values
+
+    return columns
+
+
+def dbf_header_00(fields, num_records):
+    """Creates a dBase III header.
+
+    Parameters
+    ----------
+    fields : list of tuple
+        (name, type, length, decimals) of each field. Types: 'C' or 'N'.
+    num_records : int
+
+    Returns
+    -------
+    raw : bytes
+    """
+
+    import struct
+
+    header_length = 32 + 32 * len(fields) + 1
+    record_length = 1 + sum(f[2] for f in fields)
+    raw = bytearray(32)
+    raw[0] = 3
+    struct.pack_into('<IHH', raw, 4, num_records, header_length, record_length)
+    for name, field_type, length, decimals in fields:
+        desc = bytearray(32)
+        desc[0:len(name[:10])] = name[:10].encode('ascii')
+        desc[11] = ord(field_type)
+        desc[16] = length
+        desc[17] = decimals
+        raw += desc
+    raw += b'\x0d'
+
+    return bytes(raw)
+
+
+def dbf_record_00(fields, values):
+    """Encodes one dBase record (with its deletion flag) from field values."""
+
+    record = b' '
+    for (name, field_type, length, decimals), value in zip(fields, values):
+        if field_type == 'N':
+            text = "{:.{}f}".format(value, decimals) if decimals else str(int(value))
+            record += text.rjust(length)[:length].encode('ascii')
+        else:
+            record += str(value).encode('utf-8')[:length].ljust(length)
+
+    return record
+
+
+def write_shapefile_00(out_shp_path, shape_type, records, dbf_header_raw=None,
+                       dbf_records=None, prj_path=None):
+    """Writes a shapefile from raw shape records and dBase records.
+
+    Parameters
+    ----------
+    out_shp_path : str
+        Path to output .shp file. The .shx, .dbf and .prj files are written
+        next to it.
+    shape_type : int
+        Shapefile shape type. Example: 3 (PolyLine)
+    records : list of bytes
+        Raw record contents
+    dbf_header_raw : bytes, optional
+        Header of the source dBase file. The record count is updated.
+    dbf_records : list of bytes, optional
+        Raw dBase records, one per shape record
+    prj_path : str, optional
+        Projection file to copy
+    """
+
+    import shutil
+    import struct
+    from pathlib import Path
+
+    out = Path(str(out_shp_path))
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    boxes = [b for b in (record_bbox_00(r) for r in records) if b is not None]
+    if boxes:
+        bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+    else:
+        bbox = (0.0, 0.0, 0.0, 0.0)
+
+    def header(length):
+        return (struct.pack('>7i', 9994, 0, 0, 0, 0, 0, length // 2) +
+                struct.pack('<2i', 1000, shape_type) +
+                struct.pack('<8d', bbox[0], bbox[1], bbox[2], bbox[3], 0.0, 0.0, 0.0, 0.0))
+
+    shp_length = SHP_HEADER_LENGTH + sum(8 + len(r) for r in records)
+    shx_length = SHP_HEADER_LENGTH + 8 * len(records)
+    with open(str(out), 'wb') as shp, open(str(out.with_suffix(".shx")), 'wb') as shx:
+        shp.write(header(shp_length))
+        shx.write(header(shx_length))
+        offset = SHP_HEADER_LENGTH
+        for n, r in enumerate(records):
+            shp.write(struct.pack('>2i', n + 1, len(r) // 2))
+            shp.write(r)
+            shx.write(struct.pack('>2i', offset // 2, len(r) // 2))
+            offset += 8 + len(r)
+
+    if dbf_header_raw is not None:
+        raw = bytearray(dbf_header_raw)
+        raw[4:8] = struct.pack('<I', len(dbf_records))
+        with open(str(out.with_suffix(".dbf")), 'wb') as dbf:
+            dbf.write(bytes(raw))
+            for r in dbf_records:
+                dbf.write(r)
+            dbf.write(b'\x1a')
+
+    if prj_path is not None and Path(str(prj_path)).exists():
+        shutil.copyfile(str(prj_path), str(out.with_suffix(".prj")))
+
+
+def write_subset_00(shp_path, record_ids, out_shp_path):
+    """Copies selected records of a shapefile, with their attributes, to a new shapefile.
+
+    Parameters
+    ----------
+    shp_path : str
+        Path to source .shp file
+    record_ids : list of int
+        Zero-based record numbers to copy
+    out_shp_path : str
+        Path to output .shp file
+
+    Returns
+    -------
+    out_shp_path : str
+    """
+
+    from pathlib import Path
+
+    shp = Path(str(shp_path))
+    dbf = shp.with_suffix(".dbf")
+    record_ids = list(record_ids)
+
+    dbf_header_raw = None
+    dbf_records = None
+    if dbf.exists():
+        dbf_header_raw = read_dbf_header_00(str(dbf))['raw']
+        dbf_records = read_dbf_records_00(str(dbf), record_ids)
+
+    write_shapefile_00(out_shp_path, read_shp_header_00(str(shp))['shape_type'],
+                       read_records_00(str(shp), record_ids), dbf_header_raw,
+                       dbf_records, str(shp.with_suffix(".prj")))
+
+    return str(out_shp_path)
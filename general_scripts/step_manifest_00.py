@@ -0,0 +1,243 @@
+#! python3
+"""
+Functions to record completed processing steps, so reruns can skip them.
+
+A manifest is a JSON file with one record per step: the step's parameters,
+the fingerprints (size and modification time) of its input files and the
+paths and fingerprints of its outputs. A step is current if its parameters
+are the same, none of its inputs changed and its outputs still exist
+unchanged. Like `make`, a step whose input was rewritten by an earlier step
+is run again.
+"""
+
+import threading
+
+# Manifests are updated from the threads of parallel steps
+_lock = threading.Lock()
+
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf")
+
+
+def fingerprint_00(file_path):
+    """Size and modification time of a file, or None if it doesn't exist.
+
+    For shapefiles, the .shx and .dbf files are included.
+
+    Parameters
+    ----------
+    file_path : str
+
+    Returns
+    -------
+    fingerprint : list or None
+    """
+
+    from pathlib import Path
+
+    path = Path(str(file_path))
+    if not path.exists():
+        return None
+    if path.suffix.lower() != ".shp":
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns]
+
+    fingerprint = []
+    for ext in SHAPEFILE_PARTS:
+        part = path.with_suffix(ext)
+        if part.exists():
+            st = part.stat()
+            fingerprint.extend([st.st_size, st.st_mtime_ns])
+
+    return fingerprint
+
+
+def load_manifest_00(manifest_path):
+    """Reads a manifest, or returns an empty one if the file doesn't exist."""
+
+    import json
+    from pathlib import Path
+
+    if manifest_path is not None and Path(str(manifest_path)).exists():
+        with open(str(manifest_path)) as f:
+            return json.load(f)
+
+    return dict(params=None, groups={}, steps={})
+
+
+def save_manifest_00(manifest_path, manifest):
+    """Writes a manifest atomically."""
+
+    import json
+    import os
+
+    tmp = str(manifest_path) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, str(manifest_path))
+
+
+def update_manifest_00(manifest_path, key, name, value):
+    """Sets `manifest[key][name]` in the file, keeping changes made by other threads."""
+
+    with _lock:
+        manifest = load_manifest_00(manifest_path)
+        manifest.setdefault(key, {})[name] = value
+        save_manifest_00(manifest_path, manifest)
+
+
+def start_run_00(manifest_path, params):
+    """Loads the manifest of a run, or starts a new one if the run parameters changed.
+
+    Parameters
+    ----------
+    manifest_path : str
+    params : dict
+        Parameters of the whole run. Must be JSON serializable.
+
+    Returns
+    -------
+    manifest : dict
+    """
+
+    import json
+
+    params = json.loads(json.dumps(params))
+    with _lock:
+        manifest = load_manifest_00(manifest_path)
+        if manifest.get('params') != params:
+            manifest = dict(params=params, groups={}, steps={})
+            save_manifest_00(manifest_path, manifest)
+
+    return manifest
+
+
+def flatten_00(values):
+    """Flattens nested lists, tuples and dicts (their values) to a list of their items."""
+
+    if isinstance(values, dict):
+        values = list(values.values())
+    if isinstance(values, (list, tuple)):
+        return [v for item in values for v in flatten_00(item)]
+
+    return [values]
+
+
+def is_file_00(value):
+    """Checks whether a value is the path of an existing file."""
+
+    from pathlib import Path
+
+    return isinstance(value, str) and Path(value).is_file()
+
+
+def step_current_00(manifest_path, name, inputs, params):
+    """Checks whether a step's record in the manifest is still valid.
+
+    Parameters
+    ----------
+    manifest_path : str
+    name : str
+        Step name
+    inputs : list of str
+        Paths to the step's input files
+    params : dict
+        The step's other parameters. Must be JSON serializable.
+
+    Returns
+    -------
+    current : bool
+    record : dict or None
+        The step's record, if it's current
+    """
+
+    import json
+
+    record = load_manifest_00(manifest_path)['steps'].get(name)
+    if record is None:
+        return False, None
+    if record['params'] != json.loads(json.dumps(params)):
+        return False, None
+    if record['inputs'] != [[str(p), fingerprint_00(p)] for p in inputs]:
+        return False, None
+    for path, fingerprint in record['outputs']:
+        if fingerprint is None or fingerprint_00(path) != fingerprint:
+            return False, None
+
+    return True, record
+
+
+def run_step_00(manifest_path, name, func, args, params=None, **kwargs):
+    """Runs a step, or returns its recorded result if the step is current.
+
+    Positional arguments that are paths to existing files (or lists of them)
+    are the step's inputs. The other positional arguments and `params` are
+    its parameters. Keyword arguments are passed to `func` without being recorded; use them
+    for settings that don't change the result, like CPU lists.
+
+    Parameters
+    ----------
+    manifest_path : str or None
+        Path to the manifest. If None, always runs the step.
+    name : str
+        Step name, unique within the manifest
+    func : function
+    args : list
+        Positional arguments for `func`
+    params : dict, optional
+        Extra parameters to record, for settings hidden in `func`
+
+    Returns
+    -------
+    result
+        Return value of `func`, or the recorded value
+
+    Raises
+    ------
+    IOError
+        If a path returned by `func` doesn't exist, so the step isn't recorded
+    """
+
+    if manifest_path is None:
+        return func(*args, **kwargs)
+
+    values = flatten_00(list(args))
+    inputs = [v for v in values if is_file_00(v)]
+    step_params = dict(params or {})
+    step_params['args'] = [str(v) for v in values if not is_file_00(v)]
+
+    current, record = step_current_00(manifest_path, name, inputs, step_params)
+    if current:
+        print("{}: up to date, skipping".format(name))
+        return record['result']
+
+    result = func(*args, **kwargs)
+
+    outputs = [[p, fingerprint_00(p)] for p in flatten_00(result)
+               if isinstance(p, str)]
+    missing = [p for p, fingerprint in outputs if fingerprint is None]
+    if missing:
+        raise IOError("Step {} didn't write {}".format(name, ", ".join(missing)))
+
+    update_manifest_00(manifest_path, 'steps', name, dict(
+        params=step_params,
+        inputs=[[p, fingerprint_00(p)] for p in inputs],
+        outputs=outputs,
+        result=result,
+    ))
+
+    return result
+
+
+def checkpointed_00(manifest_path, name, func, params=None):
+    """Wraps a step function so it's skipped when its manifest record is current.
+
+    Returns `func` unchanged if `manifest_path` is None.
+    """
+
+    if manifest_path is None:
+        return func
+
+    def run(*args, **kwargs):
+        return run_step_00(manifest_path, name, func, args, params, **kwargs)
+
+    return run
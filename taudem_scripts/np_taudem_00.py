@@ -0,0 +1,857 @@
+#!/usr/bin/env python3
+"""
+In-process NumPy versions of TauDEM tools
+
+For small and medium basins, these skip MPI startup and the extra raster
+reads of the TauDEM tools. They read and write the same rasters, with
+TauDEM's D8 direction encoding:
+
+    4 3 2
+    5 . 1
+    6 7 8
+
+Cells are processed in flow order (upstream cells before downstream
+cells), found all at once for each "frontier" of cells whose upstream
+cells are done, so each tool is a few vectorized passes instead of a
+Python loop over cells.
+
+Requires NumPy and the GDAL Python bindings (`osgeo`).
+
+Updated: 2026-10-19
+"""
+
+# Row and column offsets of TauDEM D8 directions 1 to 8 (index 0 unused)
+D8_ROWS = (0, 0, -1, -1, -1, 0, 1, 1, 1)
+D8_COLS = (0, 1, 1, 0, -1, -1, -1, 0, 1)
+
+# TauDEM's nodata values
+MISSING_FLOAT = -3.4028234663852886e+38
+MISSING_SHORT = -32768
+
+
+def read_raster_00(raster_path):
+    """Reads a whole raster's first band.
+
+    Returns
+    -------
+    values: numpy array
+    header: dict
+        See `raster_utilities_00.read_header_00`
+    """
+    from osgeo import gdal
+
+    from general_scripts import raster_utilities_00 as ru
+
+    header = ru.read_header_00(raster_path)
+    ds = gdal.Open(str(raster_path))
+    values = ds.GetRasterBand(1).ReadAsArray()
+    ds = None
+
+    return values, header
+
+
+def write_raster_00(values, template_path, out_path, dtype, nodata):
+    """Writes an array to a new GeoTIFF on a template raster's grid, in strips."""
+    from general_scripts import raster_utilities_00 as ru
+
+    ds = ru.create_like_00(template_path, out_path, dtype=dtype, nodata=nodata,
+                           options=('TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER'))
+    band = ds.GetRasterBand(1)
+    for r0, n in ru.row_strips_00(values.shape[0], 1024):
+        band.WriteArray(values[r0:r0 + n], 0, r0)
+    band.FlushCache()
+    ds = None
+
+
+def neighbour_flat_00(rows, cols, flat, direction):
+    """Flat index of the neighbour in a D8 direction, or -1 if it's off the grid."""
+    import numpy as np
+
+    dr = np.asarray(D8_ROWS)[direction]
+    dc = np.asarray(D8_COLS)[direction]
+    r = flat // cols + dr
+    c = flat % cols + dc
+    inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+
+    return np.where(inside, r * cols + c, -1)
+
+
+def d8_downstream_00(p):
+    """Downstream cell of every cell of a D8 pointer grid.
+
+    Parameters
+    ----------
+    p: numpy array
+        TauDEM D8 directions. Values other than 1 to 8 are nodata.
+
+    Returns
+    -------
+    down: numpy array
+        Flat index of each cell's downstream cell, or -1 for nodata cells
+        and cells that flow off the grid or into nodata
+    valid: numpy array of bool
+        Flat mask of the cells with a direction
+    """
+    import numpy as np
+
+    rows, cols = p.shape
+    flat_p = p.ravel()
+    valid = (flat_p >= 1) & (flat_p <= 8)
+    index_type = 'int32' if p.size < 2 ** 31 - 1 else 'int64'
+
+    down = np.full(p.size, -1, index_type)
+    cells = np.flatnonzero(valid)
+    target = neighbour_flat_00(rows, cols, cells, flat_p[cells].astype('int64'))
+    ok = target >= 0
+    ok[ok] = valid[target[ok]]
+    down[cells[ok]] = target[ok]
+
+    return down, valid
+
+
+def edge_cells_00(valid, shape):
+    """Valid cells with a neighbour that is off the grid or nodata (TauDEM edge contamination)."""
+    import numpy as np
+
+    rows, cols = shape
+    padded = np.zeros((rows + 2, cols + 2), bool)
+    padded[1:-1, 1:-1] = valid.reshape(shape)
+    edge = np.zeros(shape, bool)
+    for k in range(1, 9):
+        dr, dc = D8_ROWS[k], D8_COLS[k]
+        edge |= ~padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+
+    return edge.ravel() & valid
+
+
+def flow_order_00(down, valid):
+    """Yields the cells in flow order, one frontier at a time.
+
+    A frontier holds the cells all of whose upstream cells were in earlier
+    frontiers. The first frontier is the cells with no upstream cells.
+
+    Parameters
+    ----------
+    down: numpy array
+        Downstream flat index of each cell, or -1 (see `d8_downstream_00`)
+    valid: numpy array of bool
+
+    Yields
+    ------
+    frontier: numpy array
+        Flat indexes of the cells
+    targets: numpy array
+        Sorted unique downstream cells of the frontier
+    inverse: numpy array
+        Index into `targets` of each frontier cell that has a downstream
+        cell, in the order of `frontier[has_down]`
+    has_down: numpy array of bool
+    """
+    import numpy as np
+
+    has_down_all = down >= 0
+    indegree = np.bincount(down[has_down_all], minlength=len(down)).astype('int32')
+    frontier = np.flatnonzero(valid & (indegree == 0))
+
+    while len(frontier):
+        d = down[frontier]
+        has_down = d >= 0
+        targets, inverse, counts = np.unique(d[has_down], return_inverse=True,
+                                             return_counts=True)
+        yield frontier, targets, inverse, has_down
+
+        indegree[targets] -= counts.astype('int32')
+        frontier = targets[indegree[targets] == 0]
+
+
+def area_d8_array_00(p, contamination=True):
+    """D8 contributing area, in cells, of every cell of a pointer grid.
+
+    Parameters
+    ----------
+    p: numpy array
+        TauDEM D8 directions
+    contamination: bool, optional
+        Set cells whose area may be incomplete to nodata, like AreaD8 without
+        `-nc`: cells next to the grid edge or nodata, and every cell they drain to.
+
+    Returns
+    -------
+    area: numpy array
+        Float64 area, NaN where nodata
+    """
+    import numpy as np
+
+    down, valid = d8_downstream_00(p)
+    area = valid.astype('float64')
+    if contamination:
+        contaminated = edge_cells_00(valid, p.shape)
+
+    for frontier, targets, inverse, has_down in flow_order_00(down, valid):
+        upstream = frontier[has_down]
+        area[targets] += np.bincount(inverse, weights=area[upstream], minlength=len(targets))
+        if contamination:
+            contaminated[targets] |= np.bincount(
+                inverse, weights=contaminated[upstream], minlength=len(targets)) > 0
+
+    area[~valid] = np.nan
+    if contamination:
+        area[contaminated] = np.nan
+
+    return area.reshape(p.shape)
+
+
+def area_d8_00(p_path, ad8_path, contamination=True):
+    """In-process equivalent of TauDEM `AreaD8 -p <p> -ad8 <ad8>`.
+
+    Gives the same areas as AreaD8 (in cells, Float32, nodata -FLT_MAX) for
+    basins of up to 2^24 cells per contributing area, where single-precision
+    sums are exact.
+
+    Parameters
+    ----------
+    p_path: str
+        Path to the D8 pointer raster (TauDEM encoding)
+    ad8_path: str
+        Path to the output .tif file
+    contamination: bool, optional
+        False is AreaD8's `-nc` flag
+
+    Returns
+    -------
+    ad8_path: str
+    """
+    import numpy as np
+
+    p, header = read_raster_00(p_path)
+    area = area_d8_array_00(p, contamination)
+    out = np.where(np.isnan(area), MISSING_FLOAT, area).astype('float32')
+    write_raster_00(out, p_path, ad8_path, 'Float32', MISSING_FLOAT)
+
+    return ad8_path
+
+
+def d8_factors_00(cell_x, cell_y):
+    """Inverse distance to the neighbour in each D8 direction (index 0 unused)."""
+    import math
+
+    diag = 1.0 / math.hypot(cell_x, cell_y)
+
+    return (0.0, 1.0 / cell_x, diag, 1.0 / cell_y, diag,
+            1.0 / cell_x, diag, 1.0 / cell_y, diag)
+
+
+def d8_block_00(values, fact):
+    """Steepest-descent D8 direction and slope of the cells of a halo strip.
+
+    Like D8FlowDir, the first direction (in 1 to 8 order) with the steepest
+    downhill slope wins. Cells next to nodata or the grid edge are nodata.
+
+    Parameters
+    ----------
+    values: numpy array
+        Elevations with a one-cell border, NaN where nodata
+    fact: tuple of float
+        See `d8_factors_00`
+
+    Returns
+    -------
+    dirs: numpy array
+        Int16 directions of the cells without the border: 0 where no
+        neighbour is lower (flats), MISSING_SHORT where nodata
+    slope: numpy array
+        Float64 drop per distance: 0 on flats, NaN where nodata
+    """
+    import numpy as np
+
+    centre = values[1:-1, 1:-1]
+    rows, cols = centre.shape
+    contaminated = np.isnan(centre)
+    smax = np.zeros(centre.shape)
+    dirs = np.zeros(centre.shape, 'int16')
+    for k in range(1, 9):
+        dr, dc = D8_ROWS[k], D8_COLS[k]
+        nb = values[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+        contaminated |= np.isnan(nb)
+        with np.errstate(invalid='ignore'):
+            slope = (centre - nb) * fact[k]
+            steeper = slope > smax
+        smax[steeper] = slope[steeper]
+        dirs[steeper] = k
+    dirs[contaminated] = MISSING_SHORT
+    smax[contaminated] = np.nan
+
+    return dirs, smax
+
+
+def flat_cells_00(values, dirs, r0, cols):
+    """Flat cells of a strip and what flat resolution needs to know about their neighbours.
+
+    Parameters
+    ----------
+    values: numpy array
+        Elevations with a two-cell border (see `np_dem_00.halo_strips_00`)
+    dirs: numpy array
+        `d8_block_00` directions of `values`, with a one-cell border
+    r0: int
+        First row of the strip
+    cols: int
+        Number of columns of the raster
+
+    Returns
+    -------
+    cells: tuple of numpy arrays
+        Flat index of each flat cell; bit masks (bit k - 1 for direction k) of
+        its neighbours at the same elevation that are flat, and of the ones
+        that have a direction (low edges); and whether a neighbour is higher
+    """
+    import numpy as np
+
+    elev = values[1:-1, 1:-1]
+    centre = elev[1:-1, 1:-1]
+    rows = centre.shape[0]
+    flat = dirs == 0
+    same_bits = np.zeros(centre.shape, 'uint8')
+    edge_bits = np.zeros(centre.shape, 'uint8')
+    higher = np.zeros(centre.shape, bool)
+    for k in range(1, 9):
+        dr, dc = D8_ROWS[k], D8_COLS[k]
+        window = (slice(1 + dr, 1 + dr + rows), slice(1 + dc, 1 + dc + cols))
+        nb = elev[window]
+        same = nb == centre
+        same_bits |= (same & flat[window]).astype('uint8') << (k - 1)
+        edge_bits |= (same & (dirs[window] > 0)).astype('uint8') << (k - 1)
+        with np.errstate(invalid='ignore'):
+            higher |= nb > centre
+
+    inner = np.flatnonzero(flat[1:-1, 1:-1])
+
+    return (inner + r0 * cols, same_bits.flat[inner], edge_bits.flat[inner],
+            higher.flat[inner])
+
+
+def connected_labels_00(n, a, b):
+    """Labels the connected components of a graph, by hooking and pointer jumping.
+
+    Parameters
+    ----------
+    n: int
+        Number of nodes
+    a, b: numpy arrays
+        Node indexes of the ends of each edge
+
+    Returns
+    -------
+    labels: numpy array
+        Smallest node index of each node's component
+    """
+    import numpy as np
+
+    labels = np.arange(n)
+    while True:
+        la, lb = labels[a], labels[b]
+        differ = la != lb
+        if not differ.any():
+            return labels
+        smaller = np.minimum(la[differ], lb[differ])
+        np.minimum.at(labels, la[differ], smaller)
+        np.minimum.at(labels, lb[differ], smaller)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def bfs_layers_00(n, a, b, starts, first):
+    """Breadth-first distances in a graph with symmetric edges.
+
+    Parameters
+    ----------
+    n: int
+        Number of nodes
+    a, b: numpy arrays
+        Node indexes of the ends of each edge, listed both ways
+    starts: numpy array
+        Nodes at distance `first`
+    first: int
+        Distance of the start nodes, at least 1
+
+    Returns
+    -------
+    distance: numpy array
+        Distance of each node, 0 where it can't be reached
+    """
+    import numpy as np
+
+    order = np.argsort(a, kind='stable')
+    targets = b[order]
+    indptr = np.searchsorted(a[order], np.arange(n + 1))
+
+    distance = np.zeros(n, 'int64')
+    frontier = np.unique(starts)
+    distance[frontier] = first
+    layer = first
+    while len(frontier):
+        begin = indptr[frontier]
+        counts = indptr[frontier + 1] - begin
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        nb = targets[np.repeat(begin, counts) + offsets]
+        frontier = np.unique(nb[distance[nb] == 0])
+        layer += 1
+        distance[frontier] = layer
+
+    return distance
+
+
+def resolve_flats_00(index, same_bits, edge_bits, higher, cols, fact):
+    """Directions of flat cells, towards lower terrain and away from higher terrain.
+
+    Follows Barnes, Lehman and Mulla (2014), the method of TauDEM 5.3
+    D8FlowDir: each flat cell gets a mask value that combines twice its
+    distance from the flat's outlets (the low edges) with its distance from
+    higher terrain, and flows to the neighbour at the same elevation with the
+    steepest drop in mask value. Flats without an outlet stay nodata.
+
+    Parameters
+    ----------
+    index, same_bits, edge_bits, higher: numpy arrays
+        See `flat_cells_00`, for all the flat cells, sorted by index
+    cols: int
+        Number of columns of the raster
+    fact: tuple of float
+        See `d8_factors_00`
+
+    Returns
+    -------
+    dirs: numpy array
+        Int16 direction of each flat cell
+    """
+    import numpy as np
+
+    n = len(index)
+    a, b, ks = [], [], []
+    for k in range(1, 9):
+        cells = np.flatnonzero((same_bits >> (k - 1)) & 1)
+        a.append(cells)
+        b.append(np.searchsorted(index, index[cells] + D8_ROWS[k] * cols + D8_COLS[k]))
+        ks.append(np.full(len(cells), k))
+    a, b, ks = np.concatenate(a), np.concatenate(b), np.concatenate(ks)
+
+    labels = connected_labels_00(n, a, b)
+    towards = bfs_layers_00(n, a, b, np.flatnonzero(edge_bits), 2)
+    away = bfs_layers_00(n, a, b, np.flatnonzero(higher), 1)
+    max_away = np.zeros(n, 'int64')
+    np.maximum.at(max_away, labels, away)
+    mask = 2 * towards + np.where(away > 0, max_away[labels] - away, 0)
+
+    # Low edges have mask value 2 (distance 1 from themselves)
+    dirs = np.zeros(n, 'int16')
+    smax = np.zeros(n)
+    for k in range(1, 9):
+        slope = np.full(n, -np.inf)
+        edge = ((edge_bits >> (k - 1)) & 1).astype(bool)
+        slope[edge] = (mask[edge] - 2) * fact[k]
+        in_k = ks == k
+        slope[a[in_k]] = (mask[a[in_k]] - mask[b[in_k]]) * fact[k]
+        steeper = slope > smax
+        smax[steeper] = slope[steeper]
+        dirs[steeper] = k
+    dirs[(dirs == 0) | (towards == 0)] = MISSING_SHORT
+
+    return dirs
+
+
+def flow_dir_array_00(fel, cell_x, cell_y):
+    """D8 directions and slopes of a pit-filled DEM held in memory.
+
+    The same as `flow_dir_00`, on a single strip.
+
+    Parameters
+    ----------
+    fel: numpy array
+        Elevations, NaN where nodata
+    cell_x, cell_y: float
+        Cell size
+
+    Returns
+    -------
+    p: numpy array
+        Int16 TauDEM directions, MISSING_SHORT where nodata
+    slope: numpy array
+        Float64 slopes, NaN where nodata
+    """
+    import numpy as np
+
+    rows, cols = fel.shape
+    fact = d8_factors_00(cell_x, cell_y)
+    values = np.full((rows + 4, cols + 4), np.nan)
+    values[2:-2, 2:-2] = fel
+    dirs, slope = d8_block_00(values, fact)
+    p = dirs[1:-1, 1:-1].copy()
+
+    index, same_bits, edge_bits, higher = flat_cells_00(values, dirs, 0, cols)
+    if len(index):
+        p.flat[index] = resolve_flats_00(index, same_bits, edge_bits, higher, cols, fact)
+
+    return p, slope[1:-1, 1:-1]
+
+
+def flow_dir_00(fel_path, p_path, slp_path, strip_rows=None):
+    """In-process equivalent of TauDEM `D8FlowDir -fel <fel> -p <p> -sd8 <slp>`.
+
+    Reads the FEL raster once, in strips, and writes the P (Int16) and
+    D8SLP (Float32) rasters with D8FlowDir's encoding and nodata values.
+    Flat cells are collected on the way and resolved at the end (see
+    `resolve_flats_00`), then their P values are patched in place.
+
+    Directions are computed in double precision on projected cell sizes,
+    so exact ties between directions may break differently from TauDEM.
+
+    Parameters
+    ----------
+    fel_path: str
+        Path to the pit-filled DEM
+    p_path: str
+        Path to the output pointer .tif file
+    slp_path: str
+        Path to the output slope .tif file
+    strip_rows: int, optional
+        Number of rows read at a time
+
+    Returns
+    -------
+    p_path: str
+    slp_path: str
+    """
+    import numpy as np
+
+    from general_scripts import raster_utilities_00 as ru
+    from whitebox_scripts import np_dem_00 as npd
+
+    header = ru.read_header_00(fel_path)
+    cols = header['cols']
+    fact = d8_factors_00(header['cell_x'], header['cell_y'])
+    if strip_rows is None:
+        strip_rows = ru.block_rows_00(fel_path)
+
+    # P is uncompressed, so the strips with flats can be rewritten in place
+    p_ds = ru.create_like_00(fel_path, p_path, dtype='Int16', nodata=MISSING_SHORT)
+    s_ds = ru.create_like_00(fel_path, slp_path, dtype='Float32', nodata=MISSING_FLOAT,
+                             options=('TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER'))
+    p_band = p_ds.GetRasterBand(1)
+    s_band = s_ds.GetRasterBand(1)
+
+    flats = []
+    for r0, values in npd.halo_strips_00(fel_path, strip_rows, halo=2):
+        dirs, slope = d8_block_00(values, fact)
+        p_band.WriteArray(dirs[1:-1, 1:-1], 0, r0)
+        slope = slope[1:-1, 1:-1]
+        s_band.WriteArray(np.where(np.isnan(slope), MISSING_FLOAT, slope).astype('float32'), 0, r0)
+        flats.append(flat_cells_00(values, dirs, r0, cols))
+    s_band.FlushCache()
+    s_ds = None
+
+    index, same_bits, edge_bits, higher = [np.concatenate(f) for f in zip(*flats)]
+    if len(index):
+        flat_dirs = resolve_flats_00(index, same_bits, edge_bits, higher, cols, fact)
+        rows = index // cols
+        for r0, n in ru.row_strips_00(header['rows'], strip_rows):
+            lo, hi = np.searchsorted(rows, [r0, r0 + n])
+            if lo == hi:
+                continue
+            block = p_band.ReadAsArray(0, r0, cols, n)
+            block.flat[index[lo:hi] - r0 * cols] = flat_dirs[lo:hi]
+            p_band.WriteArray(block, 0, r0)
+    p_band.FlushCache()
+    p_ds = None
+
+    return p_path, slp_path
+
+
+def grid_net_arrays_00(p, cell_x, cell_y):
+    """Longest and total upslope path length and Strahler order of every cell of a pointer grid.
+
+    Computes all three in one upstream-to-downstream sweep (see `flow_order_00`).
+    A cell's upstream cells can be in several frontiers, so the order keeps,
+    for each cell, the highest upstream order so far and how many upstream
+    cells have it.
+
+    Parameters
+    ----------
+    p: numpy array
+        TauDEM D8 directions
+    cell_x, cell_y: float
+        Cell size
+
+    Returns
+    -------
+    plen, tlen: numpy arrays
+        Float64 lengths in map units, NaN where nodata
+    gord: numpy array
+        Int16 order, MISSING_SHORT where nodata
+    """
+    import numpy as np
+
+    down, valid = d8_downstream_00(p)
+    fact = d8_factors_00(cell_x, cell_y)
+    step = 1.0 / np.asarray(fact[1:])
+    flat_p = p.ravel()
+
+    plen = np.zeros(p.size)
+    tlen = np.zeros(p.size)
+    gord = np.full(p.size, MISSING_SHORT, 'int16')
+    up_order = np.zeros(p.size, 'int16')
+    up_count = np.zeros(p.size, 'int16')
+
+    for frontier, targets, inverse, has_down in flow_order_00(down, valid):
+        gord[frontier] = np.where(up_order[frontier] == 0, 1,
+                                  up_order[frontier] + (up_count[frontier] >= 2))
+        upstream = frontier[has_down]
+        length = step[flat_p[upstream].astype('int64') - 1]
+
+        longest = np.zeros(len(targets))
+        np.maximum.at(longest, inverse, plen[upstream] + length)
+        plen[targets] = np.maximum(plen[targets], longest)
+        tlen[targets] += np.bincount(inverse, weights=tlen[upstream] + length,
+                                     minlength=len(targets))
+
+        order = gord[upstream]
+        highest = np.zeros(len(targets), 'int16')
+        np.maximum.at(highest, inverse, order)
+        count = np.bincount(inverse, weights=order == highest[inverse],
+                            minlength=len(targets)).astype('int16')
+        current = up_order[targets]
+        up_count[targets] = np.where(highest > current, count,
+                                     up_count[targets] + np.where(highest == current, count, 0))
+        up_order[targets] = np.maximum(current, highest)
+
+    plen[~valid] = np.nan
+    tlen[~valid] = np.nan
+
+    return plen.reshape(p.shape), tlen.reshape(p.shape), gord.reshape(p.shape)
+
+
+def grid_net_00(p_path, plen_path, tlen_path, gord_path):
+    """In-process equivalent of TauDEM `Gridnet -p <p> -plen <plen> -tlen <tlen> -gord <gord>`.
+
+    Writes PLEN and TLEN as Float32 (nodata -FLT_MAX) and GORD as Int16
+    (nodata -32768), like Gridnet. Lengths are summed in double precision,
+    so they can differ from Gridnet's in the last single-precision digit.
+
+    Parameters
+    ----------
+    p_path: str
+        Path to the D8 pointer raster (TauDEM encoding)
+    plen_path, tlen_path, gord_path: str
+        Paths to the output .tif files
+
+    Returns
+    -------
+    paths: tuple of str
+        plen_path, tlen_path, gord_path
+    """
+    import numpy as np
+
+    p, header = read_raster_00(p_path)
+    plen, tlen, gord = grid_net_arrays_00(p, header['cell_x'], header['cell_y'])
+    for values, out_path in ((plen, plen_path), (tlen, tlen_path)):
+        out = np.where(np.isnan(values), MISSING_FLOAT, values).astype('float32')
+        write_raster_00(out, p_path, out_path, 'Float32', MISSING_FLOAT)
+    write_raster_00(gord, p_path, gord_path, 'Int16', MISSING_SHORT)
+
+    return plen_path, tlen_path, gord_path
+
+
+def compare_rasters_00(a_path, b_path, tolerance=0.0, relative=False):
+    """Compares two rasters on the same grid cell by cell.
+
+    Parameters
+    ----------
+    a_path, b_path: str
+    tolerance: float, optional
+        Largest difference that counts as equal
+    relative: bool, optional
+        `tolerance` is relative to the value in `b_path` (for single-precision sums)
+
+    Returns
+    -------
+    result: dict
+        nodata_mismatch (cells that are nodata in only one raster),
+        value_mismatch (cells that differ by more than `tolerance`),
+        max_diff, and equal (True if both counts are 0)
+    """
+    import numpy as np
+
+    from general_scripts import raster_utilities_00 as ru
+
+    a, ha = read_raster_00(a_path)
+    b, hb = read_raster_00(b_path)
+    if a.shape != b.shape:
+        raise ValueError("{} and {} are not on the same grid".format(a_path, b_path))
+    va = ru.valid_mask_00(a, ha['nodata'])
+    vb = ru.valid_mask_00(b, hb['nodata'])
+    both = va & vb
+    diff = np.abs(a[both].astype('float64') - b[both])
+    limit = tolerance * np.maximum(np.abs(b[both]), 1.0) if relative else tolerance
+
+    result = dict(
+        nodata_mismatch=int(np.count_nonzero(va != vb)),
+        value_mismatch=int(np.count_nonzero(diff > limit)),
+        max_diff=float(diff.max()) if len(diff) else 0.0,
+    )
+    result['equal'] = result['nodata_mismatch'] == 0 and result['value_mismatch'] == 0
+
+    return result
+
+
+def benchmark_00(name, in_process, td_args, outputs, n=None):
+    """Times an in-process tool against the TauDEM tool and checks they match.
+
+    Parameters
+    ----------
+    name: str
+        Label for the printout
+    in_process: function
+        Takes a dict mapping each output's key to a path and writes the outputs there
+    td_args: function
+        Takes the same dict and returns the TauDEM tool arguments
+    outputs: dict
+        Key and path of each TauDEM output. The in-process outputs are
+        written next to them, with a `_np` suffix.
+    n: int, optional
+        Number of MPI ranks for TauDEM (see `td_streams_00.td_cmd_00`)
+
+    Returns
+    -------
+    result: dict
+        numpy_seconds, taudem_seconds, taudem (the timing record of
+        `td_cmd_00`) and the comparison of each output (see `compare_rasters_00`)
+    """
+    import time
+    from pathlib import Path
+
+    from taudem_scripts import td_streams_00 as td
+
+    np_outputs = {k: str(Path(str(v)).with_name(Path(str(v)).stem + "_np.tif"))
+                  for k, v in outputs.items()}
+
+    start = time.perf_counter()
+    in_process(np_outputs)
+    np_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    record = td.td_cmd_00(td_args({k: str(v) for k, v in outputs.items()}), n)
+    td_seconds = time.perf_counter() - start
+
+    result = dict(numpy_seconds=np_seconds, taudem_seconds=td_seconds, taudem=record)
+    for k in outputs:
+        result[k] = compare_rasters_00(np_outputs[k], str(outputs[k]))
+    print("{}: NumPy {:.2f} s, TauDEM {:.2f} s with {} ranks, equal: {}".format(
+        name, np_seconds, td_seconds, record['ranks'],
+        all(result[k]['equal'] for k in outputs)))
+
+    return result
+
+
+def benchmark_area_d8_00(p_path, ad8_path, n=None):
+    """Runs `area_d8_00` and `mpiexec AreaD8` on the same P raster and compares them.
+
+    Returns
+    -------
+    result: dict
+        See `benchmark_00`
+    """
+    return benchmark_00(
+        "AreaD8",
+        lambda out: area_d8_00(p_path, out['ad8']),
+        lambda out: ["AreaD8", "-p", str(p_path), "-ad8", out['ad8']],
+        dict(ad8=ad8_path), n)
+
+
+def benchmark_flow_dir_00(fel_path, p_path, slp_path, n=None):
+    """Runs `flow_dir_00` and `mpiexec D8FlowDir` on the same FEL raster and compares them.
+
+    Returns
+    -------
+    result: dict
+        See `benchmark_00`. Slopes are compared with a tolerance of 1e-6.
+    """
+    result = benchmark_00(
+        "D8FlowDir",
+        lambda out: flow_dir_00(fel_path, out['p'], out['sd8']),
+        lambda out: ["D8FlowDir", "-fel", str(fel_path), "-p", out['p'], "-sd8", out['sd8']],
+        dict(p=p_path, sd8=slp_path), n)
+    result['sd8'] = compare_rasters_00(str(slp_path).replace(".tif", "_np.tif"), slp_path, 1e-6)
+
+    return result
+
+
+def benchmark_grid_net_00(p_path, plen_path, tlen_path, gord_path, n=None):
+    """Runs `grid_net_00` and `mpiexec Gridnet` on the same P raster and compares them.
+
+    Returns
+    -------
+    result: dict
+        See `benchmark_00`. Lengths are compared with a relative tolerance of 1e-6.
+    """
+    result = benchmark_00(
+        "Gridnet",
+        lambda out: grid_net_00(p_path, out['plen'], out['tlen'], out['gord']),
+        lambda out: ["Gridnet", "-p", str(p_path), "-plen", out['plen'],
+                     "-tlen", out['tlen'], "-gord", out['gord']],
+        dict(plen=plen_path, tlen=tlen_path, gord=gord_path), n)
+    for k, path in (('plen', plen_path), ('tlen', tlen_path)):
+        result[k] = compare_rasters_00(str(path).replace(".tif", "_np.tif"), path, 1e-6, relative=True)
+
+    return result
+
+
+def benchmark_dems_00(fel_paths, out_dir, n=None):
+    """Benchmarks the in-process D8FlowDir, AreaD8 and Gridnet on several DEMs.
+
+    Use it on the same basin at several resolutions (for example 20, 10 and
+    5 ft FEL rasters) to find the size where MPI starts to pay off.
+
+    Parameters
+    ----------
+    fel_paths: list of str
+        Paths to pit-filled DEMs
+    out_dir: str
+        Folder for the outputs of both versions
+    n: int, optional
+        Number of MPI ranks for TauDEM
+
+    Returns
+    -------
+    table: list of dict
+        For each DEM and tool: fel, cell_size, cells, tool, numpy_seconds,
+        taudem_seconds, ranks and equal
+    """
+    from pathlib import Path
+
+    from general_scripts import raster_utilities_00 as ru
+
+    out = Path(str(out_dir))
+    out.mkdir(parents=True, exist_ok=True)
+
+    table = []
+    for fel_path in fel_paths:
+        h = ru.read_header_00(fel_path)
+        stem = Path(str(fel_path)).stem
+        paths = {k: str(out / "{}_{}.tif".format(stem, k))
+                 for k in ("p", "sd8", "ad8", "plen", "tlen", "gord")}
+        runs = [
+            ("D8FlowDir", benchmark_flow_dir_00(fel_path, paths['p'], paths['sd8'], n), ("p", "sd8")),
+            ("AreaD8", benchmark_area_d8_00(paths['p'], paths['ad8'], n), ("ad8",)),
+            ("Gridnet", benchmark_grid_net_00(paths['p'], paths['plen'], paths['tlen'],
+                                              paths['gord'], n), ("plen", "tlen", "gord")),
+        ]
+        for tool, r, keys in runs:
+            table.append(dict(
+                fel=str(fel_path), cell_size=h['cell_x'], cells=h['cols'] * h['rows'],
+                tool=tool, numpy_seconds=r['numpy_seconds'],
+                taudem_seconds=r['taudem_seconds'], ranks=r['taudem']['ranks'],
+                equal=all(r[k]['equal'] for k in keys)))
+
+    return table
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Loads StreamNet TREE and COORD files into indexed NumPy arrays, and
+exports RCH shapefiles to columnar files
+
+The text files are parsed once. The arrays and the link indexes are
+cached in a sidecar .npz file next to the TREE file, which is rebuilt when
+the TREE or COORD file changes.
+
+Links are stored in preorder (each link followed by all of its upstream
+links), so the links upstream of any link are one slice of an array.
+Upstream and downstream traversals, coordinate slicing and order queries
+take time in proportion to the size of their result.
+
+Usage
+------
+    net = load_network_00(tree_path, coord_path)
+    up = upstream_links_00(net, 12)
+    coords, offsets = network_coords_00(net, up)
+
+RCH attributes and vertices can be exported next to the shapefile
+(`export_reaches_00`), as Parquet if pyarrow is installed or as .npy
+files, so analyses over many basins don't have to read dBase files.
+
+Requires NumPy.
+
+Updated: 2026-10-19
+"""
+
+# Columns of the TREE file
+TREE_DTYPE = [('link', 'int32'), ('start', 'int64'), ('end', 'int64'),
+              ('down', 'int32'), ('up1', 'int32'), ('up2', 'int32'),
+              ('order', 'int16'), ('point', 'int32'), ('magnitude', 'int32')]
+
+# Columns of the COORD file
+COORD_DTYPE = [('x', 'float64'), ('y', 'float64'), ('dist', 'float64'),
+               ('elev', 'float32'), ('area', 'float64')]
+
+# Arrays of a network, in the sidecar file
+NETWORK_KEYS = ('tree', 'coord', 'link_sorter', 'down_row', 'child_ptr', 'children',
+                'preorder', 'first', 'last', 'by_order', 'order_values', 'order_ptr')
+
+
+def read_dat_00(dat_path, dtype):
+    """Reads a whitespace-separated TauDEM .dat file into a structured array."""
+    import numpy as np
+
+    with open(str(dat_path)) as f:
+        text = f.read()
+    values = np.array(text.split(), dtype='float64')
+    table = np.zeros(len(values) // len(dtype), dtype)
+    if len(table):
+        values = values[:len(table) * len(dtype)].reshape(len(table), len(dtype))
+        for i, (name, _) in enumerate(dtype):
+            table[name] = values[:, i]
+
+    return table
+
+
+def index_network_00(tree, coord):
+    """Builds the link indexes of a network.
+
+    Parameters
+    ----------
+    tree: numpy structured array
+        TREE_DTYPE rows, in file order
+    coord: numpy structured array
+        COORD_DTYPE rows
+
+    Returns
+    -------
+    net: dict
+        tree and coord, link_sorter (rows sorted by link number), and for
+        the links (by row of `tree`): down_row (-1 at outlets), child_ptr
+        and children (CSR lists of the upstream links), preorder (rows in preorder), first and last (range
+        of each link and its upstream links in `preorder`), and by_order,
+        order_values and order_ptr (rows grouped by order)
+    """
+    import numpy as np
+
+    n = len(tree)
+    links = tree['link']
+    sorter = np.argsort(links, kind='stable')
+    down = tree['down']
+    has_down = np.zeros(n, bool)
+    down_row = np.full(n, -1, 'int64')
+    if n:
+        pos = sorter[np.minimum(np.searchsorted(links, down, sorter=sorter), n - 1)]
+        has_down = (down >= 0) & (links[pos] == down)
+        down_row[has_down] = pos[has_down]
+
+    # Upstream links of each link, in row order
+    rows = np.arange(n)
+    children = rows[has_down][np.argsort(down_row[has_down], kind='stable')]
+    child_ptr = np.searchsorted(down_row[children], np.arange(n + 1))
+
+    # Levels from the outlets up
+    levels = [np.flatnonzero(~has_down)]
+    while True:
+        parents = levels[-1]
+        counts = child_ptr[parents + 1] - child_ptr[parents]
+        if not counts.sum():
+            break
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        levels.append(children[np.repeat(child_ptr[parents], counts) + offsets])
+
+    # Number of links in each link's upstream network, itself included
+    size = np.ones(n, 'int64')
+    for level in levels[:0:-1]:
+        np.add.at(size, down_row[level], size[level])
+
+    # Preorder position: after the parent and the earlier siblings' networks
+    first = np.zeros(n, 'int64')
+    roots = levels[0]
+    first[roots] = np.cumsum(size[roots]) - size[roots]
+    for level in levels[1:]:
+        # `level` is grouped by parent, in `children` order
+        total = np.cumsum(size[level])
+        parent = down_row[level]
+        group_start = np.r_[True, parent[1:] != parent[:-1]]
+        before = total - size[level]
+        before -= np.maximum.accumulate(np.where(group_start, before, 0))
+        first[level] = first[parent] + 1 + before
+
+    preorder = np.zeros(n, 'int64')
+    preorder[first] = rows
+    by_order = np.argsort(tree['order'], kind='stable')
+    order_values, order_ptr = np.unique(tree['order'][by_order], return_index=True)
+
+    return dict(
+        tree=tree, coord=coord, link_sorter=sorter, down_row=down_row,
+        child_ptr=child_ptr, children=children, preorder=preorder, first=first, last=first + size,
+        by_order=by_order, order_values=order_values,
+        order_ptr=np.r_[order_ptr, n],
+    )
+
+
+def sidecar_path_00(tree_path):
+    """Path to the cache of a TREE file: the same name, with the .npz extension."""
+    from pathlib import Path
+
+    return Path(str(tree_path)).with_suffix(".npz")
+
+
+def load_network_00(tree_path, coord_path, cache=True):
+    """Loads a StreamNet network, from its sidecar file if it's current.
+
+    Parameters
+    ----------
+    tree_path: str
+        TREE .dat file
+    coord_path: str
+        COORD .dat file
+    cache: bool, optional
+        Read and write the sidecar file (see `sidecar_path_00`)
+
+    Returns
+    -------
+    net: dict
+        See `index_network_00`
+    """
+    import json
+    import os
+
+    import numpy as np
+
+    from general_scripts import step_manifest_00 as sm
+
+    sidecar = sidecar_path_00(tree_path)
+    fingerprint = json.dumps([sm.fingerprint_00(tree_path), sm.fingerprint_00(coord_path)])
+    if cache and sidecar.exists():
+        with np.load(str(sidecar)) as data:
+            if str(data['fingerprint']) == fingerprint:
+                return {k: data[k] for k in NETWORK_KEYS}
+
+    net = index_network_00(read_dat_00(tree_path, TREE_DTYPE),
+                           read_dat_00(coord_path, COORD_DTYPE))
+    if cache:
+        tmp = str(sidecar) + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, fingerprint=np.array(fingerprint), **net)
+        os.replace(tmp, str(sidecar))
+
+    return net
+
+
+def link_rows_00(net, links):
+    """Rows of links, by link number. Raises KeyError for unknown links."""
+    import numpy as np
+
+    ids = net['tree']['link']
+    sorter = net['link_sorter']
+    links = np.atleast_1d(np.asarray(links, 'int64'))
+    if not len(ids):
+        if links.size:
+            raise KeyError("Unknown link: {}".format(links.tolist()))
+        return links
+    rows = sorter[np.minimum(np.searchsorted(ids, links, sorter=sorter), len(ids) - 1)]
+    unknown = ids[rows] != links
+    if unknown.any():
+        raise KeyError("Unknown link: {}".format(links[unknown].tolist()))
+
+    return rows
+
+
+def upstream_links_00(net, link, include_self=True):
+    """Link numbers of a link's upstream network, in preorder."""
+    row = int(link_rows_00(net, link)[0])
+    start = net['first'][row] + (0 if include_self else 1)
+
+    return net['tree']['link'][net['preorder'][start:net['last'][row]]]
+
+
+def downstream_links_00(net, link, include_self=True):
+    """Link numbers from a link down to the outlet."""
+    import numpy as np
+
+    row = int(link_rows_00(net, link)[0])
+    rows = [row] if include_self else []
+    row = net['down_row'][row]
+    while row >= 0:
+        rows.append(row)
+        row = net['down_row'][row]
+
+    return net['tree']['link'][np.asarray(rows, 'int64')]
+
+
+def links_of_order_00(net, order):
+    """Link numbers of the links of a stream order."""
+    import numpy as np
+
+    i = np.searchsorted(net['order_values'], order)
+    if i == len(net['order_values']) or net['order_values'][i] != order:
+        return net['tree']['link'][:0]
+
+    return net['tree']['link'][net['by_order'][net['order_ptr'][i]:net['order_ptr'][i + 1]]]
+
+
+def link_coords_00(net, link):
+    """COORD rows of a link, from its start point to its end point."""
+    t = net['tree'][int(link_rows_00(net, link)[0])]
+    start, end = sorted((int(t['start']), int(t['end'])))
+
+    return net['coord'][start:end + 1]
+
+
+def network_coords_00(net, links):
+    """COORD rows of several links, concatenated.
+
+    Returns
+    -------
+    coords: numpy structured array
+    offsets: numpy array
+        Start of each link's rows in `coords`, and the total at the end
+    """
+    import numpy as np
+
+    t = net['tree'][link_rows_00(net, links)]
+    start = np.minimum(t['start'], t['end'])
+    counts = np.abs(t['end'] - t['start']) + 1
+    offsets = np.r_[0, np.cumsum(counts)]
+    index = np.repeat(start, counts) + np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+
+    return net['coord'][index], offsets
+
+
+def link_lengths_00(net):
+    """Length of each link (in TREE order), from the distances to the outlet."""
+    import numpy as np
+
+    dist = net['coord']['dist']
+    tree = net['tree']
+
+    return np.abs(dist[tree['start']] - dist[tree['end']])
+
+
+def reach_columns_00(rch_path):
+    """Reads the attributes and vertices of a StreamNet RCH shapefile as columns.
+
+    Returns
+    -------
+    columns: dict
+        One array per dBase field, plus vertex_offsets (index of each
+        reach's first vertex in `xy`, and the number of vertices at the end)
+        and xy (float64 array of (vertices, 2))
+    """
+    from pathlib import Path
+
+    import numpy as np
+
+    from general_scripts import shapefile_utilities_00 as su
+
+    rch = Path(str(rch_path))
+    columns = su.read_dbf_columns_00(str(rch.with_suffix(".dbf")))
+    lines = su.read_polylines_00(str(rch))
+    first_part = np.searchsorted(lines['part_records'], np.arange(lines['num_records'] + 1))
+    columns['vertex_offsets'] = lines['part_offsets'][first_part]
+    columns['xy'] = lines['xy']
+
+    return columns
+
+
+def export_reaches_00(rch_path, fmt=None):
+    """Writes a RCH shapefile's attributes and geometry in a columnar format, next to it.
+
+    - 'parquet': one `<RCH name>.parquet` file with a row per reach: the
+      attributes and the vertices as `x` and `y` list columns. Needs pyarrow.
+    - 'npy': a `<RCH name>_cols` folder with one .npy file per attribute,
+      plus `vertex_offsets.npy` and `xy.npy`. Load them with
+      `numpy.load(..., mmap_mode='r')` to read only the parts you use.
+
+    Parameters
+    ----------
+    rch_path: str
+        RCH .shp file from `td_streams_00.stream_net_00`
+    fmt: str, optional
+        'parquet' or 'npy'. Defaults to 'parquet' if pyarrow is installed.
+
+    Returns
+    -------
+    out_path: path object
+        The .parquet file or the _cols folder
+    """
+    import os
+    import shutil
+    from pathlib import Path
+
+    import numpy as np
+
+    if fmt is None:
+        try:
+            import pyarrow
+            fmt = 'parquet'
+        except ImportError:
+            fmt = 'npy'
+
+    rch = Path(str(rch_path))
+    columns = reach_columns_00(rch)
+
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        offsets = pa.array(columns.pop('vertex_offsets').astype('int32'))
+        xy = columns.pop('xy')
+        table = pa.table(dict(
+            columns,
+            x=pa.ListArray.from_arrays(offsets, pa.array(xy[:, 0])),
+            y=pa.ListArray.from_arrays(offsets, pa.array(xy[:, 1])),
+        ))
+        out_path = rch.with_suffix(".parquet")
+        tmp = str(out_path) + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, str(out_path))
+
+    elif fmt == 'npy':
+        out_path = rch.with_name(rch.stem + "_cols")
+        tmp = Path(str(out_path) + ".tmp")
+        if tmp.exists():
+            shutil.rmtree(str(tmp))
+        tmp.mkdir()
+        for name, values in columns.items():
+            np.save(str(tmp / (name + ".npy")), values)
+        if out_path.exists():
+            shutil.rmtree(str(out_path))
+        os.replace(str(tmp), str(out_path))
+
+    else:
+        raise ValueError("Unknown format: {}".format(fmt))
+
+    return out_path
+
+
+def load_reaches_00(path, fields=None):
+    """Reads reach columns written by `export_reaches_00`.
+
+    Parameters
+    ----------
+    path: str
+        The .parquet file or the _cols folder
+    fields: list of str, optional
+        Columns to read. Defaults to all, including vertex_offsets and xy.
+
+    Returns
+    -------
+    columns: dict
+        See `reach_columns_00`. Arrays from a _cols folder are memory-mapped.
+    """
+    from pathlib import Path
+
+    import numpy as np
+
+    path = Path(str(path))
+    if path.is_dir():
+        names = fields or [p.stem for p in sorted(path.glob("*.npy"))]
+        return {k: np.load(str(path / (k + ".npy")), mmap_mode='r') for k in names}
+
+    import pyarrow.parquet as pq
+
+    geometry = fields is None or 'xy' in fields or 'vertex_offsets' in fields
+    read = None
+    if fields is not None:
+        read = [k for k in fields if k not in ('xy', 'vertex_offsets')]
+        if geometry:
+            read += ['x', 'y']
+    table = pq.read_table(str(path), columns=read)
+
+    columns = {k: table.column(k).to_numpy() for k in table.column_names
+               if k not in ('x', 'y')}
+    if geometry:
+        x = table.column('x').combine_chunks()
+        y = table.column('y').combine_chunks()
+        columns['vertex_offsets'] = x.offsets.to_numpy().astype('int64')
+        columns['xy'] = np.column_stack([x.flatten().to_numpy(), y.flatten().to_numpy()])
+
+    return columns
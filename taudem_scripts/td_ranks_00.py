@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Chooses the number of MPI ranks for TauDEM commands
+
+The rank count depends on:
+- the number of cores that are free (cores available to this process minus
+  the current load);
+- the size of the input raster, so small basins don't pay for ranks they
+  can't use;
+- how well each tool scales on this host, measured by a calibration run.
+
+Calibrations are saved per host and tool in a JSON file
+(`~/.taudem_ranks.json`, or the path in the `TAUDEM_CALIBRATION` environment
+variable). Without a calibration, ranks are only limited by cores and
+raster size. Set `TAUDEM_NPROCS` to force a rank count.
+
+Usage
+------
+Calibrate once per host on a typical DEM, for example:
+
+    python -m taudem_scripts.td_ranks_00 AreaD8 -p D:/Basins/.../CHOWN05_P01_FEL01.tif -ad8 D:/tmp/ad8.tif
+
+Updated: 2026-10-19
+"""
+
+# Fewest raster cells per rank worth paying MPI overhead for
+CELLS_PER_RANK = 1000000
+
+# Smallest parallel efficiency (speedup / ranks) a calibrated rank count needs
+MIN_EFFICIENCY = 0.5
+
+
+def calibration_path_00():
+    import os
+    from pathlib import Path
+
+    return os.environ.get("TAUDEM_CALIBRATION",
+                          str(Path.home() / ".taudem_ranks.json"))
+
+
+def load_calibration_00():
+    """Calibrations of this host, by tool name."""
+    import json
+    import socket
+    from pathlib import Path
+
+    path = Path(calibration_path_00())
+    if not path.exists():
+        return {}
+    with open(str(path)) as f:
+        return json.load(f).get(socket.gethostname(), {})
+
+
+def save_calibration_00(tool, timings):
+    """Saves a tool's calibration for this host.
+
+    Parameters
+    ----------
+    tool: str
+        TauDEM tool name. Example: 'AreaD8'
+    timings: dict
+        Wall time in seconds, by rank count
+    """
+    import json
+    import os
+    import socket
+    from pathlib import Path
+
+    path = Path(calibration_path_00())
+    data = {}
+    if path.exists():
+        with open(str(path)) as f:
+            data = json.load(f)
+    data.setdefault(socket.gethostname(), {})[tool] = {
+        str(n): t for n, t in sorted(timings.items())}
+
+    tmp = str(path) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, str(path))
+
+
+def free_cores_00():
+    """Cores available to this process, minus the ones busy with other work."""
+    import os
+
+    if hasattr(os, 'sched_getaffinity'):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    try:
+        busy = int(round(os.getloadavg()[0]))
+    except (OSError, AttributeError):
+        busy = 0
+
+    return max(cores - busy, 1), cores
+
+
+def raster_cells_00(tool_args):
+    """Number of cells of the first input raster in a TauDEM command, or None."""
+    from pathlib import Path
+
+    for arg in tool_args[1:]:
+        path = Path(str(arg))
+        if path.suffix.lower() == ".tif" and path.is_file():
+            try:
+                from general_scripts import raster_utilities_00 as ru
+                h = ru.read_header_00(str(path))
+                return h['cols'] * h['rows']
+            except ImportError:
+                # Without GDAL, guess from the file size (4-byte cells)
+                return path.stat().st_size // 4
+
+    return None
+
+
+def scaling_limit_00(timings, min_efficiency=MIN_EFFICIENCY):
+    """Largest calibrated rank count that still scales well.
+
+    Parameters
+    ----------
+    timings: dict
+        Wall time in seconds, by rank count (keys may be str)
+
+    Returns
+    -------
+    ranks: int or None
+    """
+    timings = {int(n): float(t) for n, t in timings.items()}
+    if not timings:
+        return None
+    base_n = min(timings)
+    base = timings[base_n] * base_n
+
+    best = base_n
+    for n, t in sorted(timings.items()):
+        if t > 0 and base / (n * t) >= min_efficiency and t <= timings[best]:
+            best = n
+
+    return best
+
+
+def choose_ranks_00(tool_args, n=None):
+    """Chooses the MPI rank count for a TauDEM command.
+
+    Parameters
+    ----------
+    tool_args: list
+        TauDEM tool name and arguments
+    n: int, optional
+        Rank count to use. Overrides everything else, like `TAUDEM_NPROCS`.
+
+    Returns
+    -------
+    ranks: int
+    """
+    import os
+
+    if n is not None:
+        return max(int(n), 1)
+    if os.environ.get("TAUDEM_NPROCS"):
+        return max(int(os.environ["TAUDEM_NPROCS"]), 1)
+
+    free, cores = free_cores_00()
+    ranks = free
+
+    cells = raster_cells_00(tool_args)
+    if cells is not None:
+        ranks = min(ranks, max(cells // CELLS_PER_RANK, 1))
+
+    limit = scaling_limit_00(load_calibration_00().get(tool_args[0], {}))
+    if limit is not None:
+        ranks = min(ranks, limit)
+
+    return max(ranks, 1)
+
+
+def calibrate_00(tool_args, rank_counts=None):
+    """Times a TauDEM command with several rank counts and saves the result for this host.
+
+    The command's outputs are overwritten by each run.
+
+    Parameters
+    ----------
+    tool_args: list
+        TauDEM tool name and arguments, on a typical raster
+    rank_counts: list of int, optional
+        Defaults to powers of 2 up to the number of cores
+
+    Returns
+    -------
+    timings: dict
+        Wall time in seconds, by rank count
+    """
+    import subprocess
+    import time
+
+    free, cores = free_cores_00()
+    if rank_counts is None:
+        rank_counts = [1]
+        while rank_counts[-1] * 2 <= cores:
+            rank_counts.append(rank_counts[-1] * 2)
+
+    timings = {}
+    for n in rank_counts:
+        start = time.perf_counter()
+        subprocess.check_call(["mpiexec", "-n", str(n)] + [str(a) for a in tool_args])
+        timings[n] = time.perf_counter() - start
+        print("{} with {} ranks: {:.2f} s".format(tool_args[0], n, timings[n]))
+    save_calibration_00(tool_args[0], timings)
+
+    return timings
+
+
+if __name__ == "__main__":
+    import sys
+
+    t = calibrate_00(sys.argv[1:])
+    print("{}: scales well up to {} ranks".format(sys.argv[1], scaling_limit_00(t)))
@@ -7,23 +7,193 @@ To create the initial sfw group, run `dem_to_sfw_00`.
 
 To create a stream network group from the files created using the GRASS r.watershed tool, run `watershed_to_snet_00`
 
+To compare stream thresholds, run `threshold_sweep_00`, which runs Threshold and StreamNet for each
+threshold at the same time and returns a table of reach counts, lengths and drainage densities.
+
+The number of MPI ranks for each tool is chosen automatically (see `td_ranks_00`). Set the
+`TAUDEM_NPROCS` environment variable to use a fixed number.
+
 """
 
+import threading
+
+# Group numbers come from listing the existing groups, so concurrent runs
+# must create their groups one at a time
+_group_lock = threading.Lock()
+
+
+def parse_timings_00(output):
+    """Reads the timing lines printed by a TauDEM tool.
+
+    TauDEM tools print lines like `Processes: 8`, `Header read time: 0.01`,
+    `Data read time: 0.5`, `Compute time: 2.1`, `Write time: 0.3` and
+    `Total time: 2.9`. Some tools split the phases further, like D8FlowDir's
+    `Compute Slope time` and `Resolve Flat time`, or `Write Slope time` and
+    `Write Flat time`. Each phase's times are added together, by the first
+    word of the line (`Resolve` counts as compute, `Header` and `Data` as read).
+
+    Parameters
+    ----------
+    output: str
+        Text printed by the tool
+
+    Returns
+    -------
+    timings: dict
+        ranks, read, compute, write and total (seconds). Values that weren't
+        printed are None.
+    """
+
+    import re
+
+    phases = dict(header='read', data='read', read='read', compute='compute',
+                  resolve='compute', write='write', total='total')
+    timings = dict(ranks=None, read=None, compute=None, write=None, total=None)
+    rank_re = re.compile(r'^\s*(?:Number of )?Process(?:es|ors)\s*:\s*(\d+)', re.I)
+    time_re = re.compile(r'^\s*(\w+)(?:\s+\w+)*?\s+time\s*:\s*([-+\d.eE]+)', re.I)
+
+    for line in output.splitlines():
+        mo = rank_re.search(line)
+        if mo:
+            timings['ranks'] = int(mo.group(1))
+            continue
+        mo = time_re.search(line)
+        if mo and mo.group(1).lower() in phases:
+            key = phases[mo.group(1).lower()]
+            timings[key] = (timings[key] or 0.0) + float(mo.group(2))
+
+    return timings
+
+
+def log_run_00(record):
+    """Appends a TauDEM run record to the timing log.
+
+    The log is a JSON-lines file, `~/.taudem_timings.jsonl` or the path in
+    the `TAUDEM_TIMING_LOG` environment variable. If the log can't be
+    written, a message is printed and the run goes on.
+    """
+
+    import json
+    import os
+    from pathlib import Path
+
+    log_path = os.environ.get("TAUDEM_TIMING_LOG",
+                              str(Path.home() / ".taudem_timings.jsonl"))
+    try:
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+    except OSError as e:
+        print("Could not write to timing log {}: {}".format(log_path, e))
 
-def td_cmd_00(tool_args):
+
+def timing_summary_00(log_path=None):
+    """Summarizes the timing log by tool and raster size.
+
+    Parameters
+    ----------
+    log_path: str, optional
+        Defaults to the log used by `log_run_00`
+
+    Returns
+    -------
+    rows: list of dict
+        tool, cells, ranks, runs, and the median read, compute, write and
+        total times, with io_share ((read + write) / total). An io_share
+        above 0.5 means the tool is I/O-bound at that size.
     """
 
+    import json
+    import os
+    import statistics
+    from pathlib import Path
+
+    if log_path is None:
+        log_path = os.environ.get("TAUDEM_TIMING_LOG",
+                                  str(Path.home() / ".taudem_timings.jsonl"))
+    groups = {}
+    with open(str(log_path)) as f:
+        for line in f:
+            r = json.loads(line)
+            if r.get('returncode') or r.get('total') is None:
+                continue
+            groups.setdefault((r['tool'], r.get('cells'), r['ranks']), []).append(r)
+
+    rows = []
+    for (tool, cells, ranks), runs in sorted(groups.items(), key=lambda g: (g[0][0], g[0][1] or 0, g[0][2])):
+        row = dict(tool=tool, cells=cells, ranks=ranks, runs=len(runs))
+        for key in ('read', 'compute', 'write', 'total'):
+            row[key] = statistics.median(r.get(key) or 0.0 for r in runs)
+        row['io_share'] = (row['read'] + row['write']) / row['total'] if row['total'] else None
+        rows.append(row)
+
+    return rows
+
+
+def td_cmd_00(tool_args, n=None):
+    """Runs a TauDEM tool with mpiexec and records its timings.
+
+    The number of ranks depends on the free cores, the input raster's size
+    and the tool's calibrated scaling on this host (see `td_ranks_00`). The
+    tool's output is printed as it runs, and its timing breakdown is parsed
+    (see `parse_timings_00`), returned and added to the timing log (see
+    `log_run_00`).
+
     Parameters
     ----------
     tool_args: list
+        Tool name and arguments
+    n: int, optional
+        Number of MPI ranks. Overrides the automatic choice and `TAUDEM_NPROCS`.
+
+    Returns
+    -------
+    record: dict
+        tool, args, ranks, cells (of the first input raster), read, compute,
+        write, total (seconds, as printed by the tool), wall (seconds) and
+        time (start time)
     """
 
     import subprocess
+    import time
+
+    from taudem_scripts import td_ranks_00 as tr
 
-    cmd = ["mpiexec", "-n", "8"]
+    tool_args = [str(a) for a in tool_args]
+    ranks = tr.choose_ranks_00(tool_args, n)
+    cmd = ["mpiexec", "-n", str(ranks)]
     cmd.extend(tool_args)
 
-    subprocess.check_call(cmd)
+    start = time.time()
+    lines = []
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, bufsize=1)
+    for line in proc.stdout:
+        print(line, end="")
+        lines.append(line)
+    ret = proc.wait()
+    wall = time.time() - start
+
+    record = dict(tool=tool_args[0], args=tool_args[1:], ranks=ranks,
+                  cells=tr.raster_cells_00(tool_args), wall=wall,
+                  time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)))
+    timings = parse_timings_00("".join(lines))
+    record.update((k, v) for k, v in timings.items() if v is not None)
+    log_run_00(dict(record, returncode=ret))
+
+    if ret != 0:
+        raise subprocess.CalledProcessError(ret, cmd, "".join(lines))
+
+    return record
+
+
+def sfw_group_00(dem_path):
+    """Path to the SFW group that `pit_remove_00` creates for a DEM."""
+    from pathlib import Path
+
+    dem = Path(str(dem_path))
+    in_group_num = dem.stem.split("_")[1][-2:]
+
+    return dem.parent.parent.parent / "Surface_Flow" / "SFW{n}_DSM{n}".format(n=in_group_num)
 
 
 def pit_remove_00(dem_path):
@@ -45,7 +215,7 @@ def pit_remove_00(dem_path):
     dem = Path(str(dem_path))
     name_strings = dem.stem.split("_")
     in_group_num = name_strings[1][-2:]
-    fel = dem.parent.parent.parent / "Surface_Flow" / "SFW{n}_DSM{n}".format(n=in_group_num) / "{h}_FEL{n}_{d}.tif".format(h=name_strings[0], n=in_group_num, d=name_strings[1])
+    fel = sfw_group_00(dem_path) / "{h}_FEL{n}_{d}.tif".format(h=name_strings[0], n=in_group_num, d=name_strings[1])
     fel.parent.mkdir(parents=True, exist_ok=True)
     td_args.extend(["-fel", str(fel)])
 
@@ -54,13 +224,16 @@ def pit_remove_00(dem_path):
     return fel
 
 
-def flow_dir_00(fel_path):
+def flow_dir_00(fel_path, in_process=False):
     """Creates pointer and slope files.
 
     Parameters
     ----------
     fel_path: str or path object
         Path to FEL tif
+    in_process: bool, optional
+        Compute the files with NumPy (`np_taudem_00.flow_dir_00`) instead of
+        running D8FlowDir with MPI
 
     Returns
     -------
@@ -76,19 +249,27 @@ def flow_dir_00(fel_path):
     p = fel.parent.joinpath(p_name)
     slp = fel.parent.joinpath(s_name)
 
+    if in_process:
+        from taudem_scripts import np_taudem_00 as npt
+        npt.flow_dir_00(str(fel_path), str(p), str(slp))
+        return p
+
     td_args.extend(["-fel", str(fel_path), "-p", str(p), "-sd8", str(slp)])
     td_cmd_00(td_args)
 
     return p
 
 
-def area_d8_00(p_path):
+def area_d8_00(p_path, in_process=False):
     """Creates D8 Area file.
 
     Parameters
     ----------
     p_path: str
         Path to pointer file, which could be created by TauDEM or r.watershed.
+    in_process: bool, optional
+        Compute the area with NumPy (`np_taudem_00.area_d8_00`) instead of
+        running AreaD8 with MPI
 
     Returns
     -------
@@ -102,19 +283,27 @@ def area_d8_00(p_path):
     d8_name = p.name.replace("P", "D8AREA").replace("FEL", "P")
     d8 = p.parent / d8_name
 
+    if in_process:
+        from taudem_scripts import np_taudem_00 as npt
+        npt.area_d8_00(str(p_path), str(d8))
+        return d8
+
     td_args.extend(["-p", str(p_path), "-ad8", str(d8)])
     td_cmd_00(td_args)
 
     return d8
 
 
-def grid_net_00(p_path):
+def grid_net_00(p_path, in_process=False):
     """
 
     Parameters
     ----------
     p_path: str
         Path to P tif
+    in_process: bool, optional
+        Compute the files with NumPy (`np_taudem_00.grid_net_00`) instead of
+        running Gridnet with MPI
 
     Returns
     -------
@@ -135,9 +324,12 @@ def grid_net_00(p_path):
     tlen = sfw / tlen_name
     gord = sfw / gord_name
 
-    td_args.extend(["-plen", str(plen), "-tlen", str(tlen), "-gord", str(gord)])
-
-    td_cmd_00(td_args)
+    if in_process:
+        from taudem_scripts import np_taudem_00 as npt
+        npt.grid_net_00(str(p_path), str(plen), str(tlen), str(gord))
+    else:
+        td_args.extend(["-plen", str(plen), "-tlen", str(tlen), "-gord", str(gord)])
+        td_cmd_00(td_args)
 
     return dict(
         sfw=sfw,
@@ -150,26 +342,73 @@ def grid_net_00(p_path):
 # ============================
 # === Run all of the above ===
 
-def dem_to_sfw_00(dem_path):
+def dem_to_sfw_00(dem_path, force=False, in_process=False):
     """Create SFW group with all TauDEM results.
 
     Use this to create the first set of SFW groups.
 
+    Each step is recorded in a manifest in the SFW group (RUN .json file;
+    see `general_scripts.step_manifest_00`). Like `make`, rerunning only
+    redoes the steps whose inputs changed or whose outputs are missing or
+    were modified since; for example, after the DEM changes, every step
+    runs again, but if nothing changed, nothing runs.
+
     Parameters
     ----------
     dem_path: str
         Path to DEM .tif file
+    force: bool, optional
+        Run every step, even if it's up to date
+    in_process: bool, optional
+        Run D8FlowDir, AreaD8 and Gridnet with NumPy (`np_taudem_00`) instead
+        of MPI. Faster for small and medium basins.
 
     Returns
     -------
     sfw: dict
     """
+    from pathlib import Path
 
-    fel = pit_remove_00(dem_path)
-    p = flow_dir_00(fel)
-    d8 = area_d8_00(p)
-    out_paths = grid_net_00(p)
-    out_paths.update(fel=fel, p=p, d8=d8)
+    from general_scripts import step_manifest_00 as sm
+
+    dem = Path(str(dem_path))
+    name_strings = dem.stem.split("_")
+    sfw = sfw_group_00(dem_path)
+    sfw.mkdir(parents=True, exist_ok=True)
+    manifest_path = sfw / "{h}_RUN{n}_{d}.json".format(
+        h=name_strings[0], n=name_strings[1][-2:], d=name_strings[1])
+    if force and manifest_path.exists():
+        manifest_path.unlink()
+
+    def run(name, func, *args):
+        # Steps record their outputs as str paths
+        def step(*a):
+            out = func(*a)
+            if isinstance(out, dict):
+                return {k: str(v) for k, v in out.items()}
+            return [str(v) for v in out] if isinstance(out, list) else str(out)
+        # in_process is recorded, so switching it reruns the steps
+        return sm.run_step_00(str(manifest_path), name, step, [str(a) for a in args],
+                              params=dict(in_process=in_process))
+
+    def flow_dir_slope(fel_path):
+        fel = Path(fel_path)
+        return [flow_dir_00(fel_path, in_process),
+                fel.parent / fel.name.replace("FEL", "D8SLP").replace("DEM", "FEL")]
+
+    def area_d8(p_path):
+        return area_d8_00(p_path, in_process)
+
+    def grid_net(p_path):
+        out = grid_net_00(p_path, in_process)
+        out.pop('sfw')
+        return out
+
+    fel = Path(run("PitRemove", pit_remove_00, dem_path))
+    p = Path(run("D8FlowDir", flow_dir_slope, fel)[0])
+    d8 = Path(run("AreaD8", area_d8, p))
+    out_paths = {k: Path(v) for k, v in run("Gridnet", grid_net, p).items()}
+    out_paths.update(sfw=sfw, fel=fel, p=p, d8=d8)
     return out_paths
 
 
@@ -201,7 +440,7 @@ def p_to_sfw_00(p):
 #! Not done testing anything below this line
 
 
-def threshold_00(ssa_path, threshold):
+def threshold_00(ssa_path, threshold, n=None):
     """
 
     Parameters
@@ -215,6 +454,9 @@ def threshold_00(ssa_path, threshold):
         If running with FWINVPLAN, try 5 for 20ft resolution, 60 for 10ft, 500 for 5ft.
         If running with ORD, 5 usually works.
         If running with D8AREA, default is 100
+        To compare several, use `threshold_sweep_00`.
+    n : int, optional
+        Number of MPI ranks (see `td_cmd_00`)
 
     Returns
     -------
@@ -233,19 +475,21 @@ def threshold_00(ssa_path, threshold):
     source_str = name_strings[1]
     huc = name_strings[0]
 
-    group = Path(str(pf.new_group_00(sp, "STPRES", source_str)))
+    sp.mkdir(parents=True, exist_ok=True)
+    with _group_lock:
+        group = Path(str(pf.new_group_00(sp, "STPRES", source_str)))
 
     new_grpno = group.name.split("_")[0][-2:]
     src_name = "{h}_SRC{g}_{s}.tif".format(h=huc, g=new_grpno, s=source_str)
     src = sp.joinpath(group, src_name)
 
     td_args.extend(["-src", str(src), "-thresh", str(threshold)])
-    td_cmd_00(td_args)
+    td_cmd_00(td_args, n)
 
     return src
 
 
-def stream_net_00(fel_path, p_path, ad8_path, src_path):
+def stream_net_00(fel_path, p_path, ad8_path, src_path, n=None, columns=False):
     """
 
     Parameters
@@ -255,6 +499,11 @@ def stream_net_00(fel_path, p_path, ad8_path, src_path):
     p_path : str
     ad8_path : str
     src_path : str
+    n : int, optional
+        Number of MPI ranks (see `td_cmd_00`)
+    columns : bool, optional
+        Also export the RCH attributes and vertices to a columnar file
+        (see `td_network_00.export_reaches_00`), returned as `columns`
 
     Returns
     -------
@@ -276,13 +525,15 @@ def stream_net_00(fel_path, p_path, ad8_path, src_path):
 
     sn_parent = prj / "Stream_Net"
     sn_parent.mkdir(parents=True, exist_ok=True)
-    snet_grp = Path(str(pf.new_group_00(sn_parent, "SNET", src_str)))
+    with _group_lock:
+        snet_grp = Path(str(pf.new_group_00(sn_parent, "SNET", src_str)))
     snet_grpno = snet_grp.name.split("_")[0][-2:]
     snet_grp.mkdir(parents=True, exist_ok=True)
 
     bsn_parent = prj / "Basins"
     bsn_parent.mkdir(parents=True, exist_ok=True)
-    bsn_grp = Path(str(pf.new_group_00(bsn_parent, "BSN", src_str)))
+    with _group_lock:
+        bsn_grp = Path(str(pf.new_group_00(bsn_parent, "BSN", src_str)))
     bsn_grpno = bsn_grp.name.split("_")[0][-2:]
     bsn_grp.mkdir(parents=True, exist_ok=True)
 
@@ -305,9 +556,9 @@ def stream_net_00(fel_path, p_path, ad8_path, src_path):
     if src_str[:-2] is not "ORD":
         td_args.append("-sw")
 
-    td_cmd_00(td_args)
+    td_cmd_00(td_args, n)
 
-    return dict(
+    out_paths = dict(
         snet=snet_grp,
         ord=ord,
         tree=tree,
@@ -315,6 +566,97 @@ def stream_net_00(fel_path, p_path, ad8_path, src_path):
         rch=rch,
         bsn=bsn_grp,
     )
+    if columns:
+        from taudem_scripts import td_network_00 as tn
+        out_paths['columns'] = tn.export_reaches_00(rch)
+
+    return out_paths
+
+
+def network_stats_00(tree_path, coord_path):
+    """Reach count, total length and highest order of a StreamNet network.
+
+    Parameters
+    ----------
+    tree_path : str
+        TREE .dat file. Columns: link, start point, end point, downstream
+        link, upstream links (2), order, monitoring point, magnitude.
+    coord_path : str
+        COORD .dat file. Columns: x, y, distance to the outlet, elevation, area.
+        Both are read with `td_network_00.load_network_00`, which caches them.
+
+    Returns
+    -------
+    stats : dict
+        reaches, length (map units) and max_order
+    """
+
+    from taudem_scripts import td_network_00 as tn
+
+    net = tn.load_network_00(tree_path, coord_path)
+    reaches = len(net['tree'])
+    length = float(tn.link_lengths_00(net).sum())
+    max_order = int(net['tree']['order'].max()) if reaches else 0
+
+    return dict(reaches=reaches, length=length, max_order=max_order)
+
+
+def threshold_sweep_00(ssa_path, thresholds, fel_path, p_path, ad8_path,
+                       max_ranks=None):
+    """Runs Threshold and StreamNet for several thresholds at the same time and compares the networks.
+
+    The MPI rank budget is split evenly between the thresholds. If there
+    are more thresholds than ranks, each run gets 1 rank and the rest wait.
+
+    Parameters
+    ----------
+    ssa_path : str
+        Path to the .tif file to threshold (see `threshold_00`)
+    thresholds : list of int
+        Example: [5, 60, 500]
+    fel_path, p_path, ad8_path : str
+        Inputs of `stream_net_00`
+    max_ranks : int, optional
+        Total number of MPI ranks. Defaults to the free cores.
+
+    Returns
+    -------
+    table : list of dict
+        One row per threshold: threshold, src, snet, rch, reaches, length,
+        max_order and density (length per unit of basin area)
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from general_scripts import raster_utilities_00 as ru
+    from taudem_scripts import td_ranks_00 as tr
+
+    if max_ranks is None:
+        max_ranks = tr.free_cores_00()[0]
+    jobs = max(min(len(thresholds), max_ranks), 1)
+    ranks = max(max_ranks // jobs, 1)
+
+    area = ru.valid_area_00(str(p_path))
+
+    def run(threshold):
+        src = threshold_00(ssa_path, threshold, ranks)
+        out = stream_net_00(fel_path, p_path, ad8_path, src, ranks)
+        stats = network_stats_00(out['tree'], out['coord'])
+        return dict(threshold=threshold, src=str(src), snet=str(out['snet']),
+                    rch=str(out['rch']), density=stats['length'] / area if area else None,
+                    **stats)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        table = list(executor.map(run, thresholds))
+
+    print("threshold  reaches  length  max_order  density")
+    for row in table:
+        # Density is None when the DEM has no valid cells
+        density = "n/a" if row['density'] is None else "{:.6f}".format(row['density'])
+        print("{threshold:>9}  {reaches:>7}  {length:>6.0f}  {max_order:>9}  ".format(**row) + density)
+
+    return table
+
 
 ######################################################################
 # Combined functions
@@ -0,0 +1,64 @@
+"""Checks the culvert bucket index against a brute force search."""
+
+import json
+
+import numpy as np
+import pytest
+
+from general_scripts import shapefile_utilities_00 as su
+from whitebox_scripts import culvert_index_00 as ci
+
+
+def random_bboxes(seed, n=300):
+    rng = np.random.default_rng(seed)
+    corner = rng.uniform(0, 10000, (n, 2))
+    size = rng.exponential(50, (n, 2))
+    bboxes = [tuple(b) for b in np.hstack([corner, corner + size]).tolist()]
+    for i in rng.choice(n, 5, replace=False):
+        bboxes[i] = None
+    return bboxes
+
+
+def brute_force(bboxes, bbox):
+    return [i for i, b in enumerate(bboxes) if b is not None and
+            b[0] <= bbox[2] and b[2] >= bbox[0] and b[1] <= bbox[3] and b[3] >= bbox[1]]
+
+
+@pytest.fixture
+def culverts(tmp_path, monkeypatch):
+    shp = tmp_path / "culverts.shp"
+    shp.write_bytes(b"shp")
+    bboxes = random_bboxes(0)
+    monkeypatch.setattr(su, "read_bboxes_00", lambda path: bboxes)
+    monkeypatch.setattr(ci, "_indexes", {})
+    return str(shp), bboxes
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_query_matches_brute_force(culverts, seed):
+    shp, bboxes = culverts
+    rng = np.random.default_rng(seed)
+    for _ in range(50):
+        x, y = rng.uniform(-500, 10500, 2)
+        w, h = rng.exponential(800, 2)
+        bbox = (x, y, x + w, y + h)
+        assert ci.query_index_00(shp, bbox) == brute_force(bboxes, bbox)
+
+
+def test_index_files_round_trip(culverts, monkeypatch):
+    shp, bboxes = culverts
+    built = ci.build_index_00(shp)
+
+    # The JSON header has no per-feature data
+    with open(ci.index_path_00(shp)) as f:
+        header = json.load(f)
+    assert 'bboxes' not in header
+    assert all(len(span) == 2 for span in header['buckets'].values())
+
+    # A new process loads the arrays from the sidecar, without reading the shapefile
+    monkeypatch.setattr(ci, "_indexes", {})
+    monkeypatch.setattr(su, "read_bboxes_00", lambda path: pytest.fail("Index was rebuilt"))
+    loaded = ci.load_index_00(shp)
+    np.testing.assert_array_equal(loaded['bboxes'], built['bboxes'])
+    np.testing.assert_array_equal(loaded['members'], built['members'])
+    assert ci.query_index_00(shp, (0, 0, 5000, 5000)) == brute_force(bboxes, (0, 0, 5000, 5000))
@@ -0,0 +1,131 @@
+"""Checks the incremental culvert reburn against a full burn."""
+
+import numpy as np
+import pytest
+
+from whitebox_scripts import np_culverts_00 as nc
+
+CELL = 5.0
+X0, Y0 = 1000.0, 2000.0
+TRANSFORM = (X0, CELL, 0.0, Y0, 0.0, -CELL)
+NODATA = -32768.0
+
+
+def lines_of(cells):
+    """One single-part line per ((row, col), (row, col)) pair, through the cell centres."""
+    xy = [[X0 + CELL * (c + 0.5), Y0 - CELL * (r + 0.5)] for pair in cells for r, c in pair]
+    return dict(
+        xy=np.array(xy, 'float64').reshape(-1, 2),
+        part_offsets=np.arange(0, 2 * len(cells) + 1, 2, dtype='int64'),
+        part_records=np.arange(len(cells), dtype='int64'),
+        num_records=len(cells),
+    )
+
+
+def full_burn(lines, dem):
+    """Every zone's cells set to its minimum valid elevation, one zone at a time."""
+    rows, cols = dem.shape
+    burned = dem.copy()
+    flat, records = nc.cell_winners_00(lines, TRANSFORM, cols, rows)
+    for rec in np.unique(records):
+        cells = flat[records == rec]
+        elev = dem.flat[cells]
+        elev = elev[elev != NODATA]
+        if len(elev):
+            burned.flat[cells] = elev.min()
+    return burned
+
+
+def random_dem(seed):
+    rng = np.random.default_rng(seed)
+    dem = rng.uniform(50, 100, (40, 40)).astype('float32')
+    dem[rng.random(dem.shape) < 0.05] = NODATA
+    return dem
+
+
+CROSSING = [((10, 5), (10, 30))]
+ON_TOP = [((10, 5), (10, 30)), ((5, 20), (15, 20))]
+
+
+@pytest.mark.parametrize('old_cells, new_cells', [
+    (CROSSING, ON_TOP),
+    (ON_TOP, CROSSING),
+    (ON_TOP, ON_TOP[::-1]),
+    ([], ON_TOP),
+    (ON_TOP, []),
+])
+def test_reburn_array_matches_full_burn(old_cells, new_cells):
+    dem = random_dem(0)
+    # The low point of the first line is under the crossing of the second
+    dem[10, 20] = 1.0
+    old, new = lines_of(old_cells), lines_of(new_cells)
+
+    burned = full_burn(old, dem)
+    nc.reburn_array_00(old, new, dem, burned, TRANSFORM, NODATA)
+
+    np.testing.assert_array_equal(burned, full_burn(new, dem))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_reburn_array_random_changes(seed):
+    rng = np.random.default_rng(seed)
+    dem = random_dem(seed)
+
+    def random_cells(n):
+        ends = rng.integers(-3, 43, (n, 2, 2))
+        return [((a, b), (c, d)) for (a, b), (c, d) in ends.tolist()]
+
+    old_cells = random_cells(12)
+    keep = [c for c in old_cells if rng.random() < 0.6]
+    new_cells = keep + random_cells(5)
+    rng.shuffle(new_cells)
+    old, new = lines_of(old_cells), lines_of(new_cells)
+
+    burned = full_burn(old, dem)
+    result = nc.reburn_array_00(old, new, dem, burned, TRANSFORM, NODATA)
+
+    np.testing.assert_array_equal(burned, full_burn(new, dem))
+    assert result['added'] == len(set(map(tuple, new_cells)) - set(map(tuple, old_cells)))
+
+
+@pytest.mark.parametrize('added', [True, False])
+def test_reburn_zones_matches_burn_zone_min(tmp_path, added):
+    gdal = pytest.importorskip("osgeo.gdal")
+
+    def write_dem(path, elev):
+        rows, cols = elev.shape
+        ds = gdal.GetDriverByName('GTiff').Create(str(path), cols, rows, 1, gdal.GDT_Float32)
+        ds.SetGeoTransform(TRANSFORM)
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(NODATA)
+        band.WriteArray(elev)
+        band.FlushCache()
+        ds = None
+
+    def read(path):
+        ds = gdal.Open(str(path))
+        return ds.GetRasterBand(1).ReadAsArray()
+
+    def burn(lines, name):
+        zones = tmp_path / (name + '_zones.tif')
+        out = tmp_path / (name + '.tif')
+        nc.rasterize_lines_00(lines, lines['part_records'] + 1, str(dem), str(zones))
+        nc.burn_zone_min_00(str(dem), str(zones), str(out))
+        return out
+
+    elev = random_dem(0)
+    elev[10, 20] = 1.0
+    dem = tmp_path / 'dem.tif'
+    write_dem(dem, elev)
+
+    one, two = lines_of(CROSSING), lines_of(ON_TOP)
+    old, new = (one, two) if added else (two, one)
+
+    burned = burn(old, 'old')
+    expected = read(burn(new, 'new'))
+
+    result = nc.reburn_zones_00(old, new, str(dem), str(burned), tile_size=16)
+
+    np.testing.assert_array_equal(read(burned), expected)
+    assert result['added'] == int(added)
+    assert result['removed'] == int(not added)
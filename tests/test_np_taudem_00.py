@@ -0,0 +1,304 @@
+"""Checks the NumPy TauDEM tools against brute-force references on small grids."""
+
+import numpy as np
+import pytest
+
+from taudem_scripts import np_taudem_00 as nt
+
+
+def random_pointers(seed, shape=(30, 40), nodata_share=0.05, bowl=0.0):
+    """A D8 pointer grid without cycles: every cell points to a lower
+    neighbour or off the grid, and cells with neither are nodata. With
+    `bowl`, the surface slopes down to the centre, so flow paths are long."""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    rr, cc = np.mgrid[:rows, :cols]
+    z = rng.random(shape) + bowl * np.hypot(rr - rows / 2, cc - cols / 2)
+    z[rng.random(shape) < nodata_share] = np.nan
+    p = np.full(shape, nt.MISSING_SHORT, 'int16')
+    for r in range(rows):
+        for c in range(cols):
+            if np.isnan(z[r, c]):
+                continue
+            options = []
+            for k in range(1, 9):
+                rr, cc = r + nt.D8_ROWS[k], c + nt.D8_COLS[k]
+                inside = 0 <= rr < rows and 0 <= cc < cols
+                if not inside or z[rr, cc] < z[r, c]:
+                    options.append(k)
+            if options:
+                p[r, c] = rng.choice(options)
+    return p
+
+
+def downstream(p, r, c):
+    """The next cell down, or None off the grid or in nodata."""
+    rows, cols = p.shape
+    k = p[r, c]
+    rr, cc = r + nt.D8_ROWS[k], c + nt.D8_COLS[k]
+    if 0 <= rr < rows and 0 <= cc < cols and 1 <= p[rr, cc] <= 8:
+        return rr, cc
+    return None
+
+
+def valid_cells(p):
+    rows, cols = p.shape
+    return [(r, c) for r in range(rows) for c in range(cols) if 1 <= p[r, c] <= 8]
+
+
+def reference_area(p, contamination):
+    rows, cols = p.shape
+    area = np.full(p.shape, np.nan)
+    contaminated = np.zeros(p.shape, bool)
+    for r, c in valid_cells(p):
+        area[r, c] = 0
+    for r, c in valid_cells(p):
+        edge = any(not (0 <= r + dr < rows and 0 <= c + dc < cols) or
+                   not 1 <= p[r + dr, c + dc] <= 8
+                   for dr, dc in zip(nt.D8_ROWS[1:], nt.D8_COLS[1:]))
+        cell = (r, c)
+        while cell is not None:
+            area[cell] += 1
+            contaminated[cell] |= edge
+            cell = downstream(p, *cell)
+    if contamination:
+        area[contaminated] = np.nan
+    return area
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('bowl', [0.0, 0.5])
+@pytest.mark.parametrize('contamination', [True, False])
+def test_area_d8_matches_upstream_count(seed, bowl, contamination):
+    p = random_pointers(seed, bowl=bowl)
+    np.testing.assert_array_equal(nt.area_d8_array_00(p, contamination),
+                                  reference_area(p, contamination))
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('bowl', [0.0, 0.5])
+def test_flow_order_frontiers(seed, bowl):
+    p = random_pointers(seed, bowl=bowl)
+    down, valid = nt.d8_downstream_00(p)
+
+    position = np.full(p.size, -1)
+    for i, (frontier, targets, inverse, has_down) in enumerate(nt.flow_order_00(down, valid)):
+        assert (position[frontier] == -1).all()
+        position[frontier] = i
+        d = down[frontier]
+        np.testing.assert_array_equal(has_down, d >= 0)
+        np.testing.assert_array_equal(targets, np.unique(d[has_down]))
+        np.testing.assert_array_equal(targets[inverse], d[has_down])
+
+    # Every valid cell comes once, after all of its upstream cells
+    assert (position[valid] >= 0).all()
+    assert (position[~valid] == -1).all()
+    has_down = down >= 0
+    assert (position[np.flatnonzero(has_down)] < position[down[has_down]]).all()
+    # The first frontier is the cells with no upstream cells
+    sources = valid & (np.bincount(down[has_down], minlength=p.size) == 0)
+    np.testing.assert_array_equal(position == 0, sources)
+
+
+def follow(p, r, c, limit):
+    """Cells visited from (r, c) until the path leaves the grid or hits a cell without direction."""
+    path = [(r, c)]
+    for _ in range(limit):
+        k = p[r, c]
+        if not 1 <= k <= 8:
+            return path
+        r, c = r + nt.D8_ROWS[k], c + nt.D8_COLS[k]
+        if not (0 <= r < p.shape[0] and 0 <= c < p.shape[1]):
+            return path
+        path.append((r, c))
+    raise AssertionError("Flow path from {} has a cycle".format(path[0]))
+
+
+def drainable_flat_cells(fel, p_unresolved):
+    """Flat cells connected through flat cells at the same elevation to a
+    neighbour at that elevation with a direction (a low edge)."""
+    rows, cols = fel.shape
+    flat = p_unresolved == 0
+    reached = set()
+    stack = []
+    for r, c in zip(*np.nonzero(flat)):
+        for k in range(1, 9):
+            rr, cc = r + nt.D8_ROWS[k], c + nt.D8_COLS[k]
+            if fel[rr, cc] == fel[r, c] and p_unresolved[rr, cc] > 0:
+                stack.append((r, c))
+    while stack:
+        r, c = stack.pop()
+        if (r, c) in reached:
+            continue
+        reached.add((r, c))
+        for k in range(1, 9):
+            rr, cc = r + nt.D8_ROWS[k], c + nt.D8_COLS[k]
+            if flat[rr, cc] and fel[rr, cc] == fel[r, c]:
+                stack.append((rr, cc))
+    return reached
+
+
+def check_flow_dirs(fel):
+    p, slope = nt.flow_dir_array_00(fel, 1.0, 1.0)
+    rows, cols = fel.shape
+    fact = nt.d8_factors_00(1.0, 1.0)
+
+    unresolved = np.full(fel.shape, nt.MISSING_SHORT, 'int16')
+    for r in range(rows):
+        for c in range(cols):
+            nbs = [(r + nt.D8_ROWS[k], c + nt.D8_COLS[k]) for k in range(1, 9)]
+            # Like D8FlowDir, cells next to the edge or nodata have no direction
+            if np.isnan(fel[r, c]) or any(
+                    not (0 <= rr < rows and 0 <= cc < cols) or np.isnan(fel[rr, cc])
+                    for rr, cc in nbs):
+                assert p[r, c] == nt.MISSING_SHORT and np.isnan(slope[r, c])
+                continue
+            drops = [(fel[r, c] - fel[nb]) * fact[k] for k, nb in enumerate(nbs, 1)]
+            best = max(drops)
+            if best > 0:
+                # Steepest descent, first direction on ties
+                assert p[r, c] == drops.index(best) + 1
+                assert slope[r, c] == pytest.approx(best)
+                unresolved[r, c] = p[r, c]
+            else:
+                unresolved[r, c] = 0
+                assert slope[r, c] == 0
+
+    drainable = drainable_flat_cells(fel, unresolved)
+    for r, c in zip(*np.nonzero(unresolved == 0)):
+        if (r, c) in drainable:
+            assert 1 <= p[r, c] <= 8
+            # Flat cells flow across the flat to a cell at most as high
+            # that has its own direction
+            path = follow(p, r, c, fel.size)
+            out = next(i for i, cell in enumerate(path) if unresolved[cell] != 0)
+            assert all(fel[cell] == fel[r, c] for cell in path[:out])
+            assert unresolved[path[out]] > 0 and fel[path[out]] <= fel[r, c]
+        else:
+            assert p[r, c] == nt.MISSING_SHORT
+
+    # No cycles anywhere
+    for r, c in zip(*np.nonzero((p >= 1) & (p <= 8))):
+        follow(p, r, c, fel.size)
+
+    return p
+
+
+def test_plateau_drains_through_its_outlet():
+    # A flat at 10 ringed by a rim at 20, with a gap down to a channel
+    fel = np.full((12, 12), 20.0)
+    fel[2:10, 2:10] = 10.0
+    fel[5, 10:] = [5.0, 4.0]
+    p = check_flow_dirs(fel)
+    assert ((p[2:10, 2:10] >= 1) & (p[2:10, 2:10] <= 8)).all()
+    # Paths from the far corner leave through the gap
+    assert (5, 10) in follow(p, 2, 2, fel.size)
+
+
+def test_flat_without_outlet_stays_nodata():
+    fel = np.full((10, 10), 20.0)
+    fel[3:7, 3:7] = 10.0
+    p = check_flow_dirs(fel)
+    assert (p[3:7, 3:7] == nt.MISSING_SHORT).all()
+
+
+def test_flat_reaching_the_edge():
+    # The flat's only way out is the grid edge, whose cells have no direction
+    fel = np.full((10, 10), 20.0)
+    fel[3:7, :5] = 10.0
+    p = check_flow_dirs(fel)
+    assert (p[3:7, :5] == nt.MISSING_SHORT).all()
+
+    # With a low cell inside too, the flat drains into it, except for the
+    # cells on the edge. The low cell is a pit, so it has no direction.
+    fel[5, 4] = 5.0
+    p = check_flow_dirs(fel)
+    assert (p[3:7, 0] == nt.MISSING_SHORT).all()
+    drains = (p[3:7, 1:5] >= 1) & (p[3:7, 1:5] <= 8)
+    drains[2, 3] = True
+    assert drains.all()
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_terraced_dems(seed):
+    # Rounding a noisy slope to whole units makes many flats of all shapes
+    rng = np.random.default_rng(seed)
+    rr, cc = np.mgrid[:30, :30]
+    fel = np.round(0.2 * (rr + cc) + 2 * rng.random((30, 30)))
+    fel[rng.random(fel.shape) < 0.03] = np.nan
+    check_flow_dirs(fel)
+
+
+@pytest.mark.parametrize('strip_rows', [3, 7, 64])
+def test_flow_dir_strips_match_array(tmp_path, strip_rows):
+    gdal = pytest.importorskip("osgeo.gdal")
+
+    rng = np.random.default_rng(1)
+    rr, cc = np.mgrid[:30, :30]
+    fel = np.round(0.2 * (rr + cc) + 2 * rng.random((30, 30))).astype('float32')
+    fel[rng.random(fel.shape) < 0.03] = nt.MISSING_FLOAT
+    fel_path = str(tmp_path / 'fel.tif')
+    ds = gdal.GetDriverByName('GTiff').Create(fel_path, 30, 30, 1, gdal.GDT_Float32)
+    ds.SetGeoTransform((0.0, 1.0, 0.0, 30.0, 0.0, -1.0))
+    ds.GetRasterBand(1).SetNoDataValue(nt.MISSING_FLOAT)
+    ds.GetRasterBand(1).WriteArray(fel)
+    ds = None
+
+    p_path, slp_path = nt.flow_dir_00(fel_path, str(tmp_path / 'p.tif'),
+                                      str(tmp_path / 'slp.tif'), strip_rows)
+    expected, _ = nt.flow_dir_array_00(np.where(fel == nt.MISSING_FLOAT, np.nan, fel), 1.0, 1.0)
+    ds = gdal.Open(p_path)
+    np.testing.assert_array_equal(ds.GetRasterBand(1).ReadAsArray(), expected)
+
+
+def reference_grid_net(p, cell_x, cell_y):
+    """Gridnet by repeated passes over every cell until nothing changes."""
+    import math
+
+    step = {1: cell_x, 5: cell_x, 3: cell_y, 7: cell_y}
+    diag = math.hypot(cell_x, cell_y)
+    cells = valid_cells(p)
+    upstream = {cell: [] for cell in cells}
+    for cell in cells:
+        d = downstream(p, *cell)
+        if d is not None:
+            upstream[d].append(cell)
+
+    plen = {cell: 0.0 for cell in cells}
+    tlen = {cell: 0.0 for cell in cells}
+    gord = {cell: 1 for cell in cells}
+    changed = True
+    while changed:
+        changed = False
+        for cell in cells:
+            ups = upstream[cell]
+            lengths = [step.get(int(p[u]), diag) for u in ups]
+            new_plen = max([plen[u] + n for u, n in zip(ups, lengths)], default=0.0)
+            new_tlen = sum(tlen[u] + n for u, n in zip(ups, lengths))
+            orders = [gord[u] for u in ups]
+            top = max(orders, default=0)
+            new_gord = 1 if not ups else top + (orders.count(top) >= 2)
+            if (new_plen, new_gord) != (plen[cell], gord[cell]) or \
+                    not math.isclose(new_tlen, tlen[cell]):
+                plen[cell], tlen[cell], gord[cell] = new_plen, new_tlen, new_gord
+                changed = True
+
+    out_plen = np.full(p.shape, np.nan)
+    out_tlen = np.full(p.shape, np.nan)
+    out_gord = np.full(p.shape, nt.MISSING_SHORT, 'int16')
+    for cell in cells:
+        out_plen[cell], out_tlen[cell], out_gord[cell] = plen[cell], tlen[cell], gord[cell]
+    return out_plen, out_tlen, out_gord
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('bowl', [0.0, 0.5])
+def test_grid_net_matches_reference(seed, bowl):
+    p = random_pointers(seed, bowl=bowl)
+    plen, tlen, gord = nt.grid_net_arrays_00(p, 2.0, 3.0)
+    ref_plen, ref_tlen, ref_gord = reference_grid_net(p, 2.0, 3.0)
+
+    np.testing.assert_allclose(plen, ref_plen, rtol=1e-12)
+    np.testing.assert_allclose(tlen, ref_tlen, rtol=1e-12)
+    np.testing.assert_array_equal(gord, ref_gord)
+    assert gord.max() >= 2
@@ -0,0 +1,110 @@
+"""Checks the StreamNet network index and its sidecar cache."""
+
+import numpy as np
+import pytest
+
+from taudem_scripts import td_network_00 as tn
+
+
+def random_network(seed, n_links=40, outlets=2):
+    """TREE and COORD text of a random binary network, links in shuffled file order."""
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(np.arange(100, 100 + n_links))
+    down = {}
+    up = {i: [] for i in ids}
+    for j, link in enumerate(ids):
+        if j < outlets:
+            down[link] = -1
+            continue
+        # Attach to an earlier link that has room for another upstream link
+        parents = [p for p in ids[:j] if len(up[p]) < 2]
+        parent = parents[rng.integers(len(parents))]
+        down[link] = parent
+        up[parent].append(link)
+
+    tree_lines, coord_lines = [], []
+    point = 0
+    for link in ids:
+        n_points = int(rng.integers(2, 5))
+        dist = np.sort(rng.random(n_points))[::-1] * 100
+        for d in dist:
+            coord_lines.append("{:.3f} {:.3f} {:.6f} {:.2f} {:.1f}".format(
+                rng.random() * 1000, rng.random() * 1000, d, 10 + d, 500.0))
+        ups = up[link] + [-1] * (2 - len(up[link]))
+        tree_lines.append("{} {} {} {} {} {} {} {} {}".format(
+            link, point, point + n_points - 1, down[link], ups[0], ups[1], 1, -1, 1))
+        point += n_points
+
+    return "\n".join(tree_lines) + "\n", "\n".join(coord_lines) + "\n", down
+
+
+def upstream_of(down, link):
+    ups = {link}
+    changed = True
+    while changed:
+        changed = False
+        for child, parent in down.items():
+            if parent in ups and child not in ups:
+                ups.add(child)
+                changed = True
+    return ups
+
+
+def write_network(tmp_path, seed):
+    tree_text, coord_text, down = random_network(seed)
+    tree_path = tmp_path / "net_TREE00_SNET00.dat"
+    coord_path = tmp_path / "net_COORD00_SNET00.dat"
+    tree_path.write_text(tree_text)
+    coord_path.write_text(coord_text)
+    return str(tree_path), str(coord_path), down
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_preorder_slices_are_upstream_networks(tmp_path, seed):
+    tree_path, coord_path, down = write_network(tmp_path, seed)
+    net = tn.load_network_00(tree_path, coord_path, cache=False)
+
+    links = net['tree']['link']
+    assert sorted(net['tree']['link'][net['preorder']]) == sorted(links)
+    for link in links:
+        up = tn.upstream_links_00(net, link)
+        assert up[0] == link
+        assert set(up.tolist()) == upstream_of(down, link)
+        # Every link comes after the link it drains to
+        position = {l: i for i, l in enumerate(up.tolist())}
+        assert all(position[down[l]] < position[l] for l in up[1:].tolist())
+
+        path = tn.downstream_links_00(net, link).tolist()
+        assert path[0] == link and down[path[-1]] == -1
+        assert all(down[a] == b for a, b in zip(path, path[1:]))
+
+
+def test_sidecar_round_trip(tmp_path, monkeypatch):
+    tree_path, coord_path, down = write_network(tmp_path, 0)
+    net = tn.load_network_00(tree_path, coord_path)
+    assert tn.sidecar_path_00(tree_path).exists()
+
+    # The second load comes from the sidecar, without parsing the .dat files
+    def no_parse(*args):
+        raise AssertionError("The .dat files were parsed again")
+
+    with monkeypatch.context() as m:
+        m.setattr(tn, "read_dat_00", no_parse)
+        cached = tn.load_network_00(tree_path, coord_path)
+    assert set(cached) == set(tn.NETWORK_KEYS)
+    for key in tn.NETWORK_KEYS:
+        np.testing.assert_array_equal(cached[key], net[key])
+        assert cached[key].dtype == net[key].dtype
+    np.testing.assert_array_equal(tn.upstream_links_00(cached, 100),
+                                  tn.upstream_links_00(net, 100))
+
+    # A changed TREE file rebuilds the sidecar
+    tree_text, coord_text, down = random_network(1)
+    with open(tree_path, 'w') as f:
+        f.write(tree_text)
+    with open(coord_path, 'w') as f:
+        f.write(coord_text)
+    rebuilt = tn.load_network_00(tree_path, coord_path)
+    np.testing.assert_array_equal(rebuilt['tree'], tn.read_dat_00(tree_path, tn.TREE_DTYPE))
+    for link in rebuilt['tree']['link']:
+        assert set(tn.upstream_links_00(rebuilt, link).tolist()) == upstream_of(down, link)
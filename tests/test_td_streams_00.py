@@ -0,0 +1,62 @@
+"""Checks the parsing of TauDEM timing output."""
+
+import pytest
+
+from taudem_scripts import td_streams_00 as ts
+
+# Tool output as printed by TauDEM 5.3.7 (d8flowdir.cpp and aread8.cpp), with 4 ranks
+D8FLOWDIR_OUTPUT = """\
+D8FlowDir version 5.3.7
+Input file demfel.tif has projected coordinate system.
+All slopes evaluated. 1524 flats to resolve.
+Draining flats towards lower adjacent terrain
+..........
+Draining flats away from higher adjacent terrain
+...........
+Setting directions
+Iteration complete. Number of flats remaining: 0
+Processors: 4
+Header read time: 0.002132
+Data read time: 0.031554
+Compute Slope time: 0.047912
+Write Slope time: 0.020331
+Resolve Flat time: 0.118870
+Write Flat time: 0.017604
+Total time: 0.238403
+"""
+
+AREAD8_OUTPUT = """\
+AreaD8 version 5.3.7
+Input file demp.tif has projected coordinate system.
+Processors: 4
+Read time: 0.024517
+Compute time: 0.089310
+Write time: 0.019142
+Total time: 0.132969
+"""
+
+
+def test_d8flowdir_sub_phases_are_added():
+    t = ts.parse_timings_00(D8FLOWDIR_OUTPUT)
+    assert t['ranks'] == 4
+    assert t['read'] == pytest.approx(0.002132 + 0.031554)
+    assert t['compute'] == pytest.approx(0.047912 + 0.118870)
+    assert t['write'] == pytest.approx(0.020331 + 0.017604)
+    assert t['total'] == pytest.approx(0.238403)
+
+
+def test_aread8_timings():
+    t = ts.parse_timings_00(AREAD8_OUTPUT)
+    assert t == dict(ranks=4, read=pytest.approx(0.024517), compute=pytest.approx(0.089310),
+                     write=pytest.approx(0.019142), total=pytest.approx(0.132969))
+
+
+def test_missing_timings_are_none():
+    assert ts.parse_timings_00("PitRemove version 5.3.7\n") == dict(
+        ranks=None, read=None, compute=None, write=None, total=None)
+
+
+def test_unwritable_timing_log_is_not_an_error(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("TAUDEM_TIMING_LOG", str(tmp_path / "missing" / "timings.jsonl"))
+    ts.log_run_00(dict(tool="AreaD8", total=1.0))
+    assert "Could not write to timing log" in capsys.readouterr().out
@@ -0,0 +1,106 @@
+"""Checks that a basin run again resumes from its run manifest."""
+
+from pathlib import Path
+
+import pytest
+
+from whitebox_scripts import wb_basins_00 as wbs
+from whitebox_scripts import wb_hydro_00 as wh
+
+
+class FakeWhiteboxTools:
+    """Writes every output file a tool is given, without running anything."""
+
+    calls = []
+
+    def set_cpu_affinity(self, cpus=None):
+        pass
+
+    def __getattr__(self, tool_name):
+        def run(*args, **kwargs):
+            FakeWhiteboxTools.calls.append(tool_name)
+            for a in args:
+                a = str(a)
+                if a.endswith((".tif", ".shp")) and not Path(a).exists() \
+                        and Path(a).parent.is_dir():
+                    Path(a).write_bytes(b"out")
+            return 0
+        return run
+
+
+def fake_culverts_in_memory(culvert_paths, in_dem_path, extend_dist='20', shard_dir=None):
+    dem = Path(in_dem_path)
+    pipe_group = wh.new_group_01(str(dem.parent.parent.parent / "Hydro_Route"),
+                                 dem.stem.split("_")[1], "PIPES")
+    extended_pipes = wh.new_file_00(in_dem_path, "XTPIPE", "shp", pipe_group)
+    pipe_raster = wh.new_file_00(in_dem_path, "PIPR", "tif", pipe_group)
+    Path(extended_pipes).write_bytes(b"out")
+    Path(pipe_raster).write_bytes(b"out")
+    return extended_pipes, pipe_raster
+
+
+@pytest.fixture
+def basin_root(tmp_path, monkeypatch):
+    import WBT.whitebox_tools
+
+    monkeypatch.setattr(WBT.whitebox_tools, "WhiteboxTools", FakeWhiteboxTools)
+    monkeypatch.setattr(wh, "culverts_in_memory_00", fake_culverts_in_memory)
+    monkeypatch.setattr(wh, "zones_for_grid_00", lambda zones, dem: zones)
+    monkeypatch.setattr(wh, "register_zone_grid_00", lambda *a: None)
+    FakeWhiteboxTools.calls = []
+
+    dem_group = tmp_path / "H01" / "Surface" / "DSM00_LID00"
+    dem_group.mkdir(parents=True)
+    (dem_group / "H01_DEM00_LID00.tif").write_bytes(b"dem")
+    pipe_group = tmp_path / "H01" / "Hydro_Route" / "PIPES00_CLV00"
+    pipe_group.mkdir(parents=True)
+    (pipe_group / "H01_PIPES00_CLV00.shp").write_bytes(b"pipes")
+
+    return tmp_path
+
+
+def groups(root):
+    return sorted(str(p.relative_to(root)) for p in root.rglob("*") if p.is_dir())
+
+
+def test_basin_rerun_reuses_groups(basin_root):
+    culverts = [str(basin_root / "H01" / "Hydro_Route" / "PIPES00_CLV00" / "H01_PIPES00_CLV00.shp")]
+
+    basin, = wbs.find_basins_00(basin_root)
+    assert basin['pipr'] is None
+    dems = wbs.process_basin_00(basin, culverts)
+    first = groups(basin_root)
+    assert len(FakeWhiteboxTools.calls) > 0
+
+    # The second run finds the PIPR file made by the first
+    FakeWhiteboxTools.calls = []
+    basin, = wbs.find_basins_00(basin_root)
+    assert basin['pipr'] is not None
+    assert wbs.process_basin_00(basin, culverts) == dems
+    assert groups(basin_root) == first
+    assert FakeWhiteboxTools.calls == []
+
+
+def test_basin_retry_resumes_unfinished_steps(basin_root, monkeypatch):
+    culverts = [str(basin_root / "H01" / "Hydro_Route" / "PIPES00_CLV00" / "H01_PIPES00_CLV00.shp")]
+    basin, = wbs.find_basins_00(basin_root)
+
+    # The worker dies while breaching the burned DEM
+    breach = wh.breach_depressions_00
+
+    def killed(in_dem_path, *args, **kwargs):
+        if in_dem_path != basin['dem']:
+            raise MemoryError()
+        return breach(in_dem_path, *args, **kwargs)
+
+    monkeypatch.setattr(wh, "breach_depressions_00", killed)
+    with pytest.raises(MemoryError):
+        wbs.process_basin_00(basin, culverts)
+    first = groups(basin_root)
+
+    monkeypatch.setattr(wh, "breach_depressions_00", breach)
+    FakeWhiteboxTools.calls = []
+    dems = wbs.process_basin_00(basin, culverts)
+    assert groups(basin_root) == first
+    assert FakeWhiteboxTools.calls == ["breach_depressions_least_cost"]
+    assert all(Path(d).exists() for d in dems)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Spatial index for statewide culvert shapefiles
+
+The index puts each culvert's bounding box in square grid buckets and is saved
+next to the shapefile: the bounding boxes and the bucket member lists in
+`<name>.cidx.npz`, and the extent, bucket size and each bucket's slice of the
+member list in `<name>.cidx.json`. It is built once, and rebuilt
+automatically when the shapefile changes. With the index, finding the culverts
+that intersect a DEM only reads the index and the matching records instead of
+every feature in the statewide file.
+
+Usage
+------
+    ids = query_index_00(statewide_shp, (xmin, ymin, xmax, ymax))
+
+`wb_hydro_00.pipe_source_00` uses this to replace the WBT clip.
+
+Updated: 2026-10-19
+"""
+
+INDEX_SUFFIX = ".cidx.json"
+ARRAYS_SUFFIX = ".cidx.npz"
+
+# Indexes already loaded in this process, by index path
+_indexes = {}
+
+
+def index_path_00(shp_path):
+    """Path to the index file for a shapefile."""
+    from pathlib import Path
+
+    shp = Path(str(shp_path))
+    return str(shp.with_name(shp.stem + INDEX_SUFFIX))
+
+
+def arrays_path_00(shp_path):
+    """Path to the bounding box and bucket member arrays of a shapefile's index."""
+    from pathlib import Path
+
+    shp = Path(str(shp_path))
+    return str(shp.with_name(shp.stem + ARRAYS_SUFFIX))
+
+
+def source_fingerprint_00(shp_path):
+    """Size and modification time of the shapefile's .shp, .shx and .dbf files."""
+    from pathlib import Path
+
+    shp = Path(str(shp_path))
+    fingerprint = []
+    for ext in (".shp", ".shx", ".dbf"):
+        f = shp.with_suffix(ext)
+        if f.exists():
+            st = f.stat()
+            fingerprint.append([ext, st.st_size, int(st.st_mtime)])
+
+    return fingerprint
+
+
+def build_index_00(shp_path, bucket_size=None):
+    """Builds and saves the bucket index for a shapefile.
+
+    Parameters
+    ----------
+    shp_path: str
+        Path to culvert .shp file
+    bucket_size: float, optional
+        Width of the square buckets, in map units. Defaults to a size that
+        gives about one feature per bucket.
+
+    Returns
+    -------
+    index: dict
+        Bounding boxes (n x 4 array, NaN for null shapes), bucket member
+        array, and bucket slices of it by "bx,by" key
+    """
+    import json
+    import math
+    import os
+
+    import numpy as np
+
+    from general_scripts import shapefile_utilities_00 as su
+
+    bboxes = su.read_bboxes_00(shp_path)
+    boxes = [b for b in bboxes if b is not None]
+    if boxes:
+        extent = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                  max(b[2] for b in boxes), max(b[3] for b in boxes))
+    else:
+        extent = (0.0, 0.0, 0.0, 0.0)
+
+    if bucket_size is None:
+        span = max(extent[2] - extent[0], extent[3] - extent[1])
+        bucket_size = span / max(int(math.sqrt(len(boxes))), 1) or 1.0
+
+    buckets = {}
+    for i, b in enumerate(bboxes):
+        if b is None:
+            continue
+        for bx in range(int((b[0] - extent[0]) // bucket_size),
+                        int((b[2] - extent[0]) // bucket_size) + 1):
+            for by in range(int((b[1] - extent[1]) // bucket_size),
+                            int((b[3] - extent[1]) // bucket_size) + 1):
+                buckets.setdefault("{},{}".format(bx, by), []).append(i)
+
+    # Bucket member lists are stored end to end, each bucket keeps its slice
+    members = []
+    slices = {}
+    for key, ids in buckets.items():
+        slices[key] = [len(members), len(members) + len(ids)]
+        members.extend(ids)
+
+    header = dict(
+        source=source_fingerprint_00(shp_path),
+        extent=extent,
+        bucket_size=bucket_size,
+        count=len(bboxes),
+        buckets=slices,
+    )
+    arrays = dict(
+        bboxes=np.array([b if b is not None else [np.nan] * 4 for b in bboxes],
+                        'float64').reshape(-1, 4),
+        members=np.array(members, 'int64'),
+    )
+
+    # The header goes last, so it only matches the source once the arrays are saved
+    arrays_path = arrays_path_00(shp_path)
+    tmp = arrays_path + ".tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, arrays_path)
+
+    index_path = index_path_00(shp_path)
+    tmp = index_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp, index_path)
+
+    index = dict(header, **arrays)
+    _indexes[index_path] = index
+
+    return index
+
+
+def load_index_00(shp_path):
+    """Loads the index for a shapefile, building it if it's missing or out of date.
+
+    Parameters
+    ----------
+    shp_path: str
+        Path to culvert .shp file
+
+    Returns
+    -------
+    index: dict
+    """
+    import json
+    from pathlib import Path
+
+    import numpy as np
+
+    index_path = index_path_00(shp_path)
+    arrays_path = arrays_path_00(shp_path)
+    fingerprint = source_fingerprint_00(shp_path)
+
+    index = _indexes.get(index_path)
+    if index is None and Path(index_path).exists() and Path(arrays_path).exists():
+        with open(index_path) as f:
+            index = json.load(f)
+        with np.load(arrays_path) as data:
+            index.update(bboxes=data['bboxes'], members=data['members'])
+    if (index is None or index['source'] != fingerprint or
+            len(index['bboxes']) != index['count']):
+        return build_index_00(shp_path)
+
+    _indexes[index_path] = index
+    return index
+
+
+def query_index_00(shp_path, bbox):
+    """Finds the culverts whose bounding boxes intersect a box.
+
+    Parameters
+    ----------
+    shp_path: str
+        Path to culvert .shp file
+    bbox: tuple
+        (xmin, ymin, xmax, ymax)
+
+    Returns
+    -------
+    record_ids: list of int
+        Zero-based record numbers, sorted
+    """
+    import numpy as np
+
+    index = load_index_00(shp_path)
+    x0, y0 = index['extent'][0], index['extent'][1]
+    size = index['bucket_size']
+    buckets = index['buckets']
+    members = index['members']
+
+    # Only visit buckets inside the index extent
+    nx = int((index['extent'][2] - x0) // size)
+    ny = int((index['extent'][3] - y0) // size)
+    candidates = []
+    for bx in range(max(int((bbox[0] - x0) // size), 0), min(int((bbox[2] - x0) // size), nx) + 1):
+        for by in range(max(int((bbox[1] - y0) // size), 0), min(int((bbox[3] - y0) // size), ny) + 1):
+            span = buckets.get("{},{}".format(bx, by))
+            if span is not None:
+                candidates.append(members[span[0]:span[1]])
+    if not candidates:
+        return []
+
+    ids = np.unique(np.concatenate(candidates))
+    b = index['bboxes'][ids]
+    hit = (b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])
+
+    return ids[hit].tolist()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Build (or refresh) the indexes for the shapefiles given on the command line
+    for shp in sys.argv[1:]:
+        idx = build_index_00(shp)
+        print("{}: {} features in {} buckets".format(
+            shp, len(idx['bboxes']), len(idx['buckets'])))
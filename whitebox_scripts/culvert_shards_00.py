@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Splits statewide culvert shapefiles into one small shapefile per HUC
+
+Each shard holds the culverts of one source file that intersect one basin's DEM
+extent, and is named `<HUC>/<HUC>_<source>_<hash>.shp` in the shard folder, where
+the hash of the source's path keeps sources with the same name apart. A manifest
+(`manifest.json`) records each source's checksum and the HUC extents used, so
+rerunning the partition only rebuilds the shards of sources that changed and
+adds shards for new HUCs.
+
+Usage
+------
+From the repository root:
+
+    python -m whitebox_scripts.culvert_shards_00 D:/Basins D:/Culvert_Shards --sources state_culverts.shp
+
+Then pass `shard_dir` to `wb_hydro_00.process_culverts_00` (or `process_dems_first_00`),
+and each basin reads its own shard instead of the statewide file.
+
+Updated: 2026-10-19
+"""
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_checksum_00(shp_path):
+    """SHA-256 of the shapefile's .shp and .dbf files."""
+    import hashlib
+    from pathlib import Path
+
+    h = hashlib.sha256()
+    for ext in (".shp", ".dbf"):
+        f = Path(str(shp_path)).with_suffix(ext)
+        if f.exists():
+            with open(str(f), 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b''):
+                    h.update(chunk)
+
+    return h.hexdigest()
+
+
+def huc_extents_00(root_path, dem_group="DSM00"):
+    """Extent of each basin's initial DEM.
+
+    Parameters
+    ----------
+    root_path: str
+        Folder containing one folder per HUC
+    dem_group: str, optional
+        Class and number of the group holding the initial DEM
+
+    Returns
+    -------
+    extents: dict
+        (xmin, ymin, xmax, ymax) by HUC
+    """
+    from general_scripts import raster_utilities_00 as ru
+    from whitebox_scripts import wb_basins_00 as wbs
+
+    return {b['huc']: list(ru.read_header_00(b['dem'])['extent'])
+            for b in wbs.find_basins_00(root_path, dem_group)}
+
+
+def load_manifest_00(shard_dir):
+    import json
+    from pathlib import Path
+
+    manifest_path = Path(str(shard_dir)) / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(str(manifest_path)) as f:
+            return json.load(f)
+    return dict(sources={})
+
+
+def save_manifest_00(shard_dir, manifest):
+    import json
+    import os
+    from pathlib import Path
+
+    manifest_path = str(Path(str(shard_dir)) / MANIFEST_NAME)
+    tmp = manifest_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+
+
+def source_unchanged_00(record, source_path):
+    """Checks a source against its manifest record, hashing it only if its size or time changed."""
+    from pathlib import Path
+
+    st = Path(str(source_path)).stat()
+    if record.get('size') == st.st_size and record.get('mtime') == int(st.st_mtime):
+        return True
+    if record.get('checksum') == file_checksum_00(source_path):
+        record.update(size=st.st_size, mtime=int(st.st_mtime))
+        return True
+
+    return False
+
+
+def partition_culverts_00(source_paths, extents, shard_dir):
+    """Writes or updates the per-HUC shards of culvert source files.
+
+    Parameters
+    ----------
+    source_paths: list of str
+        Paths to statewide culvert .shp files
+    extents: dict
+        (xmin, ymin, xmax, ymax) by HUC, for example from `huc_extents_00`
+    shard_dir: str
+        Folder for the shards and manifest
+
+    Returns
+    -------
+    manifest: dict
+    """
+    import hashlib
+    from pathlib import Path
+
+    from general_scripts import shapefile_utilities_00 as su
+    from whitebox_scripts import culvert_index_00 as ci
+
+    shards = Path(str(shard_dir))
+    shards.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest_00(shard_dir)
+
+    for source_path in source_paths:
+        source = Path(str(source_path)).resolve()
+        key = str(source)
+        path_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        record = manifest['sources'].get(key)
+
+        if record is None or not source_unchanged_00(record, key):
+            st = source.stat()
+            record = dict(checksum=file_checksum_00(key), size=st.st_size,
+                          mtime=int(st.st_mtime), shards={})
+            manifest['sources'][key] = record
+            print("{}: changed, rebuilding shards".format(source.name))
+
+        for huc, extent in sorted(extents.items()):
+            shard = record['shards'].get(huc)
+            if (shard is not None and shard['extent'] == list(extent) and
+                    (shards / shard['path']).exists()):
+                continue
+            ids = ci.query_index_00(key, extent)
+            rel = "{h}/{h}_{s}_{k}.shp".format(h=huc, s=source.stem, k=path_hash)
+            su.write_subset_00(key, ids, str(shards / rel))
+            record['shards'][huc] = dict(path=rel, count=len(ids),
+                                         extent=list(extent))
+        save_manifest_00(shard_dir, manifest)
+
+    return manifest
+
+
+def find_shard_00(shard_dir, source_path, huc, extent):
+    """Returns the shard of a source for a HUC, or None if it's missing or out of date.
+
+    Parameters
+    ----------
+    shard_dir: str
+        Folder with the shards and manifest
+    source_path: str
+        Path to the statewide culvert .shp file
+    huc: str
+    extent: tuple
+        Current (xmin, ymin, xmax, ymax) of the HUC's DEM. A shard cut for
+        another extent is out of date.
+
+    Returns
+    -------
+    shard_path: str or None
+    """
+    from pathlib import Path
+
+    manifest = load_manifest_00(shard_dir)
+    key = str(Path(str(source_path)).resolve())
+    record = manifest['sources'].get(key)
+    if record is None or huc not in record['shards']:
+        return None
+    if not source_unchanged_00(record, key):
+        return None
+    if record['shards'][huc]['extent'] != list(extent):
+        return None
+
+    shard = Path(str(shard_dir)) / record['shards'][huc]['path']
+    return str(shard) if shard.exists() else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Splits statewide culvert files into per-HUC shards.")
+    parser.add_argument("root", help="folder containing one folder per HUC")
+    parser.add_argument("shard_dir", help="output folder for the shards")
+    parser.add_argument("--sources", nargs="+", required=True, help="statewide culvert .shp files")
+    parser.add_argument("--dem-group", default="DSM00")
+    a = parser.parse_args()
+
+    m = partition_culverts_00(a.sources, huc_extents_00(a.root, a.dem_group), a.shard_dir)
+    for src, rec in sorted(m['sources'].items()):
+        print("{}: {} shards, {} culverts".format(
+            src, len(rec['shards']), sum(s['count'] for s in rec['shards'].values())))
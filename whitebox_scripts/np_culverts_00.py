@@ -0,0 +1,633 @@
+#!/usr/bin/env python3
+"""
+In-process culvert operations with NumPy and GDAL
+
+These replace chains of WhiteboxTools calls that each read and write whole
+rasters. They read rasters in row strips, so memory use doesn't depend on the
+DEM size.
+
+Requires NumPy and the GDAL Python bindings (`osgeo`).
+
+Updated: 2026-10-19
+"""
+
+
+def zone_minima_00(zones, elev, valid):
+    """Minimum elevation of each zone, as a vectorized group-by.
+
+    Parameters
+    ----------
+    zones: numpy array
+        Zone id of each culvert cell
+    elev: numpy array
+        DEM value of each culvert cell
+    valid: numpy array of bool
+        Cells where the DEM has data
+
+    Returns
+    -------
+    zone_ids: numpy array
+        Sorted unique zone ids
+    mins: numpy array
+        Minimum valid elevation of each zone, or inf if the zone has no valid cells
+    inverse: numpy array
+        Index into `zone_ids` of each cell
+    """
+    import numpy as np
+
+    zone_ids, inverse = np.unique(zones, return_inverse=True)
+    mins = np.full(len(zone_ids), np.inf)
+
+    v_inv = inverse[valid]
+    if len(v_inv):
+        order = np.argsort(v_inv, kind='stable')
+        sorted_inv = v_inv[order]
+        starts = np.flatnonzero(np.r_[True, sorted_inv[1:] != sorted_inv[:-1]])
+        mins[sorted_inv[starts]] = np.minimum.reduceat(elev[valid][order].astype('float64'), starts)
+
+    return zone_ids, mins, inverse
+
+
+def burn_zone_min_00(in_dem_path, in_zones_path, output_path, strip_rows=None):
+    """Burns culvert zones into a DEM in one pass over the DEM and zone raster.
+
+    Gives the same result as WBT `zonal_statistics` (minimum), `is_no_data` and
+    `pick_from_list`: every cell of a culvert zone is set to the zone's minimum
+    elevation, and all other cells keep their DEM value. The DEM and zone
+    raster are each read once. Culvert cells are collected while the DEM is
+    copied to the output, and then rewritten with their zone minimum.
+
+    Parameters
+    ----------
+    in_dem_path: str
+        Path to the DEM
+    in_zones_path: str
+        Path to the culvert zone raster (PIPR), on the DEM's grid
+    output_path: str
+        Path to the burned DEM .tif file
+    strip_rows: int, optional
+        Number of rows read at a time. Defaults to a multiple of the DEM's block height.
+
+    Returns
+    -------
+    stats: dict
+        Number of zones and of burned cells
+    """
+    import numpy as np
+    from osgeo import gdal
+
+    from general_scripts import raster_utilities_00 as ru
+
+    dem_ds = gdal.Open(str(in_dem_path))
+    zones_ds = gdal.Open(str(in_zones_path))
+    cols, rows = dem_ds.RasterXSize, dem_ds.RasterYSize
+    if (zones_ds.RasterXSize, zones_ds.RasterYSize) != (cols, rows):
+        raise ValueError("Zone raster {} is not on the grid of {}".format(
+            in_zones_path, in_dem_path))
+    dem_band = dem_ds.GetRasterBand(1)
+    zones_band = zones_ds.GetRasterBand(1)
+    dem_nodata = dem_band.GetNoDataValue()
+    zones_nodata = zones_band.GetNoDataValue()
+
+    out_ds = ru.create_like_00(in_dem_path, output_path)
+    out_band = out_ds.GetRasterBand(1)
+
+    if strip_rows is None:
+        strip_rows = ru.block_rows_00(in_dem_path)
+    strips = ru.row_strips_00(rows, strip_rows)
+
+    # Copy the DEM and collect the culvert cells
+    cell_rows, cell_cols, cell_zones, cell_elev = [], [], [], []
+    for r0, n in strips:
+        dem = dem_band.ReadAsArray(0, r0, cols, n)
+        zones = zones_band.ReadAsArray(0, r0, cols, n)
+        out_band.WriteArray(dem, 0, r0)
+
+        rr, cc = np.nonzero(ru.valid_mask_00(zones, zones_nodata))
+        cell_rows.append(rr + r0)
+        cell_cols.append(cc)
+        cell_zones.append(zones[rr, cc])
+        cell_elev.append(dem[rr, cc])
+    dem_ds = None
+    zones_ds = None
+
+    cell_rows = np.concatenate(cell_rows)
+    cell_cols = np.concatenate(cell_cols)
+    cell_zones = np.concatenate(cell_zones)
+    cell_elev = np.concatenate(cell_elev)
+
+    zone_ids, mins, inverse = zone_minima_00(
+        cell_zones, cell_elev, ru.valid_mask_00(cell_elev, dem_nodata))
+    burn = np.isfinite(mins)[inverse]
+    cell_rows = cell_rows[burn]
+    cell_cols = cell_cols[burn]
+    values = mins[inverse][burn]
+
+    # Rewrite the culvert cells, one window per strip. Cells are in row order.
+    for r0, n in strips:
+        lo, hi = np.searchsorted(cell_rows, [r0, r0 + n])
+        if lo == hi:
+            continue
+        rr = cell_rows[lo:hi]
+        cc = cell_cols[lo:hi]
+        row_off, col_off = int(rr.min()), int(cc.min())
+        window = out_band.ReadAsArray(col_off, row_off, int(cc.max()) - col_off + 1,
+                                      int(rr.max()) - row_off + 1)
+        window[rr - row_off, cc - col_off] = values[lo:hi]
+        out_band.WriteArray(window, col_off, row_off)
+
+    out_band.FlushCache()
+    out_ds = None
+
+    return dict(zones=int(np.count_nonzero(np.isfinite(mins))),
+                cells=int(len(values)))
+
+
+def line_cells_00(lines, transform, cols, rows):
+    """Finds the grid cells crossed by polylines.
+
+    For every segment, all of its crossings with grid lines are found at
+    once, and each piece between two crossings gives one cell. So every
+    cell a line passes through is found, and the cells of each part form
+    an unbroken line of edge-sharing cells. Vertices outside the grid are
+    allowed; cells outside it are dropped.
+
+    Parameters
+    ----------
+    lines: dict
+        Polylines, as returned by `shapefile_utilities_00.read_polylines_00`
+    transform: tuple
+        GDAL geotransform of the grid (not rotated)
+    cols, rows: int
+        Grid size
+
+    Returns
+    -------
+    cell_rows, cell_cols, cell_parts: numpy arrays
+        Row, column and part number of each cell crossed. A cell crossed by
+        several parts appears once per part.
+    """
+    import numpy as np
+
+    xy = lines['xy']
+    offsets = lines['part_offsets']
+    if len(xy) == 0:
+        empty = np.zeros(0, 'int64')
+        return empty, empty, empty
+
+    vertex_parts = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    # Positions in cell units
+    pos = np.empty_like(xy)
+    pos[:, 0] = (xy[:, 0] - transform[0]) / transform[1]
+    pos[:, 1] = (xy[:, 1] - transform[3]) / transform[5]
+
+    # Segments join consecutive vertices of the same part
+    seg = np.flatnonzero(vertex_parts[:-1] == vertex_parts[1:])
+    start = pos[seg]
+    step = pos[seg + 1] - start
+
+    # Segment parameter t of every grid line crossing, plus both ends
+    seg_ids = [np.arange(len(seg)), np.arange(len(seg))]
+    ts = [np.zeros(len(seg)), np.ones(len(seg))]
+    for axis in (0, 1):
+        a = np.floor(start[:, axis])
+        b = np.floor(start[:, axis] + step[:, axis])
+        n = np.abs(b - a).astype('int64')
+        idx = np.repeat(np.arange(len(seg)), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + 1
+        line = np.minimum(a, b)[idx] + k
+        seg_ids.append(idx)
+        ts.append((line - start[idx, axis]) / step[idx, axis])
+    seg_ids = np.concatenate(seg_ids)
+    ts = np.concatenate(ts)
+    order = np.lexsort((ts, seg_ids))
+    seg_ids = seg_ids[order]
+    ts = ts[order]
+
+    # Midpoints between consecutive crossings are inside the crossed cells
+    same = seg_ids[1:] == seg_ids[:-1]
+    mid_seg = seg_ids[1:][same]
+    mid_t = (ts[1:][same] + ts[:-1][same]) / 2
+    samples = start[mid_seg] + mid_t[:, None] * step[mid_seg]
+
+    # Vertices are included too, for parts with a single vertex
+    samples = np.concatenate([samples, pos])
+    parts = np.concatenate([vertex_parts[seg][mid_seg], vertex_parts])
+
+    cell_cols = np.floor(samples[:, 0]).astype('int64')
+    cell_rows = np.floor(samples[:, 1]).astype('int64')
+    inside = (cell_cols >= 0) & (cell_cols < cols) & (cell_rows >= 0) & (cell_rows < rows)
+    key = np.unique((parts[inside] * rows + cell_rows[inside]) * cols + cell_cols[inside])
+
+    return (key // cols) % rows, key % cols, key // (rows * cols)
+
+
+def rasterize_lines_00(lines, values, in_dem_path, output_path,
+                       options=('TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER')):
+    """Burns polylines into a zone raster on a DEM's grid.
+
+    Only the DEM's header is read. Where parts overlap, the highest value wins.
+    The raster is written one strip at a time, so memory use depends on the
+    number of line cells, not the DEM size.
+
+    Parameters
+    ----------
+    lines: dict
+        Polylines, as returned by `shapefile_utilities_00.read_polylines_00`
+    values: numpy array of int
+        Zone value of each part. Must be greater than 0, which is nodata.
+    in_dem_path: str
+        Path to the DEM that defines the grid
+    output_path: str
+        Path to the output .tif file
+    options: tuple of str, optional
+        GDAL GTiff creation options
+
+    Returns
+    -------
+    cells: int
+        Number of cells burned
+    """
+    import numpy as np
+
+    from general_scripts import raster_utilities_00 as ru
+
+    header = ru.read_header_00(in_dem_path)
+    cols, rows = header['cols'], header['rows']
+    if header['transform'][2] or header['transform'][4]:
+        raise ValueError("Rotated grids are not supported: {}".format(in_dem_path))
+
+    values = np.asarray(values, dtype='int64')
+    cell_rows, cell_cols, cell_parts = line_cells_00(lines, header['transform'], cols, rows)
+    cell_values = values[cell_parts]
+
+    # One value per cell: sort by cell, then value, and keep the last
+    flat = cell_rows * cols + cell_cols
+    order = np.lexsort((cell_values, flat))
+    flat = flat[order]
+    last = np.ones(len(flat), bool)
+    last[:-1] = flat[1:] != flat[:-1]
+    flat = flat[last]
+    cell_values = cell_values[order][last]
+
+    dtype = 'UInt16' if values.max(initial=0) < 65536 else 'UInt32'
+    out_ds = ru.create_like_00(in_dem_path, output_path, dtype=dtype, nodata=0,
+                               options=options)
+    out_band = out_ds.GetRasterBand(1)
+    np_type = 'uint16' if dtype == 'UInt16' else 'uint32'
+
+    # Whole rows of 256-cell tiles
+    strip_rows = max(4194304 // max(cols, 1) // 256, 1) * 256
+    for r0, n in ru.row_strips_00(rows, strip_rows):
+        lo, hi = np.searchsorted(flat, [r0 * cols, (r0 + n) * cols])
+        strip = np.zeros((n, cols), np_type)
+        strip.flat[flat[lo:hi] - r0 * cols] = cell_values[lo:hi]
+        out_band.WriteArray(strip, 0, r0)
+
+    out_band.FlushCache()
+    out_ds = None
+
+    return int(len(flat))
+
+
+def rasterize_pipes_00(in_pipe_path, in_dem_path, output_path):
+    """Rasterizes a culvert line shapefile with FID zones, like WBT `vector_lines_to_raster`.
+
+    Each feature's zone is its record number plus 1, as WBT numbers FID.
+
+    Parameters
+    ----------
+    in_pipe_path: str
+        Path to the culvert .shp file
+    in_dem_path: str
+        Path to the DEM that defines the grid
+    output_path: str
+        Path to the output .tif file
+
+    Returns
+    -------
+    output_path: str
+    """
+    from general_scripts import shapefile_utilities_00 as su
+
+    lines = su.read_polylines_00(in_pipe_path)
+    rasterize_lines_00(lines, lines['part_records'] + 1, in_dem_path, output_path)
+
+    return output_path
+
+
+def merge_lines_00(lines_list):
+    """Merges polylines from several sources, like WBT `merge_vectors`.
+
+    Records are numbered in order: all records of the first source, then
+    the second, and so on.
+
+    Parameters
+    ----------
+    lines_list: list of dict
+        Polylines, as returned by `shapefile_utilities_00.read_polylines_00`
+
+    Returns
+    -------
+    lines: dict
+    """
+    import numpy as np
+
+    xy, offsets, part_records = [], [], []
+    points = 0
+    records = 0
+    for lines in lines_list:
+        xy.append(lines['xy'])
+        offsets.append(lines['part_offsets'][:-1] + points)
+        part_records.append(lines['part_records'] + records)
+        points += len(lines['xy'])
+        records += lines['num_records']
+    offsets.append(np.array([points]))
+
+    return dict(
+        xy=np.concatenate(xy) if xy else np.zeros((0, 2)),
+        part_offsets=np.concatenate(offsets).astype('int64'),
+        part_records=np.concatenate(part_records).astype('int64') if part_records
+        else np.zeros(0, 'int64'),
+        num_records=records,
+    )
+
+
+def extend_lines_00(lines, dist):
+    """Extends every line part at both ends, like WBT `extend_vector_lines`.
+
+    The first and last vertices of each part are moved outward by `dist`
+    along the direction of the part's end segments. Parts with one vertex,
+    or with a zero-length end segment, are left as they are at that end.
+
+    Parameters
+    ----------
+    lines: dict
+        Polylines, as returned by `shapefile_utilities_00.read_polylines_00`
+    dist: float
+        Distance to extend each end, in map units
+
+    Returns
+    -------
+    lines: dict
+        A copy of `lines` with the moved end vertices
+    """
+    import numpy as np
+
+    xy = lines['xy'].copy()
+    offsets = lines['part_offsets']
+    first = offsets[:-1]
+    last = offsets[1:] - 1
+    long_enough = last > first
+    first = first[long_enough]
+    last = last[long_enough]
+
+    for end, inner in ((first, first + 1), (last, last - 1)):
+        direction = xy[end] - xy[inner]
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        moved = length > 0
+        xy[end[moved]] += direction[moved] * (float(dist) / length[moved])[:, None]
+
+    return dict(lines, xy=xy)
+
+
+def record_hashes_00(lines):
+    """SHA-1 of each record's geometry, for matching culverts between two sets."""
+    import hashlib
+
+    from general_scripts import shapefile_utilities_00 as su
+
+    return [hashlib.sha1(r).hexdigest() for r in su.polyline_records_00(lines)]
+
+
+def cell_winners_00(lines, transform, cols, rows):
+    """The record whose zone each line cell gets, with the highest record winning.
+
+    Returns
+    -------
+    flat: numpy array
+        Sorted flat index (row * cols + col) of each cell
+    records: numpy array
+        Record number that wins each cell
+    """
+    import numpy as np
+
+    cell_rows, cell_cols, cell_parts = line_cells_00(lines, transform, cols, rows)
+    flat = cell_rows * cols + cell_cols
+    records = lines['part_records'][cell_parts]
+    order = np.lexsort((records, flat))
+    flat = flat[order]
+    last = np.ones(len(flat), bool)
+    last[:-1] = flat[1:] != flat[:-1]
+
+    return flat[last], records[order][last]
+
+
+def tiles_00(flat, cols, tile_size):
+    """Groups sorted flat cell indexes by square tile.
+
+    Yields
+    ------
+    tile: tuple
+        (row_off, col_off) of the tile
+    index: numpy array
+        Positions in `flat` of the tile's cells
+    """
+    import numpy as np
+
+    rows_ = flat // cols
+    cols_ = flat % cols
+    ntc = cols // tile_size + 1
+    key = (rows_ // tile_size) * ntc + cols_ // tile_size
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    for lo, hi in zip(starts, np.r_[starts[1:], len(key)]):
+        k = int(key[lo])
+        yield ((k // ntc) * tile_size, (k % ntc) * tile_size), order[lo:hi]
+
+
+def reburn_cells_00(old_lines, new_lines, transform, cols, rows):
+    """Finds the cells of a burned DEM to rewrite for a changed set of culvert lines.
+
+    See `reburn_zones_00`.
+
+    Returns
+    -------
+    update: numpy array
+        Sorted flat index (row * cols + col) of each cell to rewrite
+    update_zones: numpy array
+        Record number in `new_lines` of each cell's zone, or -1 for cells
+        that get the original DEM value back
+    counts: dict
+        zones (number of zones burned again), added and removed (number of lines)
+    """
+    import numpy as np
+
+    # Number the distinct geometries of both sets
+    old_hashes = record_hashes_00(old_lines)
+    new_hashes = record_hashes_00(new_lines)
+    ids = {h: i for i, h in enumerate(sorted(set(old_hashes) | set(new_hashes)))}
+    old_ids = np.array([ids[h] for h in old_hashes] or [0], 'int64')
+    new_ids = np.array([ids[h] for h in new_hashes] or [0], 'int64')
+
+    old_flat, old_rec = cell_winners_00(old_lines, transform, cols, rows)
+    new_flat, new_rec = cell_winners_00(new_lines, transform, cols, rows)
+
+    # Cells whose winning geometry changed
+    k = len(ids) + 1
+    changed = np.setxor1d(old_flat * k + old_ids[old_rec], new_flat * k + new_ids[new_rec])
+    dirty = np.unique(changed // k)
+
+    # Zones with a dirty cell are burned again, all of their cells
+    pos = np.searchsorted(new_flat, dirty)
+    pos = np.minimum(pos, max(len(new_flat) - 1, 0))
+    in_new = (new_flat[pos] == dirty) if len(new_flat) else np.zeros(len(dirty), bool)
+    zones = new_rec[pos[in_new]]
+
+    # So are the zones that lost a dirty cell, as their minimum may change
+    pos = np.searchsorted(old_flat, dirty)
+    pos = np.minimum(pos, max(len(old_flat) - 1, 0))
+    in_old = (old_flat[pos] == dirty) if len(old_flat) else np.zeros(len(dirty), bool)
+    lost = old_ids[old_rec[pos[in_old]]]
+    kept = np.flatnonzero(np.isin(new_ids[:len(new_hashes)], lost))
+    zones = np.union1d(zones, kept)
+    zone_cells = np.isin(new_rec, zones)
+    update = np.union1d(dirty, new_flat[zone_cells])
+
+    pos = np.searchsorted(new_flat, update)
+    pos = np.minimum(pos, max(len(new_flat) - 1, 0))
+    update_zones = np.full(len(update), -1, 'int64')
+    if len(new_flat):
+        in_zone = new_flat[pos] == update
+        update_zones[in_zone] = new_rec[pos[in_zone]]
+
+    return update, update_zones, dict(
+        zones=int(len(zones)),
+        added=len(set(new_hashes) - set(old_hashes)),
+        removed=len(set(old_hashes) - set(new_hashes)),
+    )
+
+
+def reburn_values_00(update_zones, elev, nodata):
+    """New values of the cells from `reburn_cells_00`, given their original DEM values.
+
+    Zone cells get their zone's minimum, like `burn_zone_min_00`; the other
+    cells keep `elev`.
+    """
+    import numpy as np
+
+    from general_scripts import raster_utilities_00 as ru
+
+    values = elev.astype('float64')
+    in_zone = update_zones >= 0
+    if in_zone.any():
+        valid = ru.valid_mask_00(elev[in_zone], nodata)
+        zone_ids, mins, inverse = zone_minima_00(update_zones[in_zone], elev[in_zone], valid)
+        zone_values = mins[inverse]
+        burn = np.isfinite(zone_values)
+        values[np.flatnonzero(in_zone)[burn]] = zone_values[burn]
+
+    return values
+
+
+def reburn_array_00(old_lines, new_lines, dem, burned, transform, nodata=None):
+    """Updates a burned DEM array in place for a changed set of culvert lines.
+
+    Same as `reburn_zones_00`, for DEMs held in memory.
+
+    Parameters
+    ----------
+    old_lines, new_lines: dict
+        Extended culvert lines used for the existing burn, and the new ones
+    dem: numpy array
+        Original (unburned) DEM
+    burned: numpy array
+        Burned DEM to update, the same shape as `dem`
+    transform: tuple
+        GDAL geotransform of the grid
+    nodata: float, optional
+        The DEM's nodata value
+
+    Returns
+    -------
+    result: dict
+        cells, zones, added and removed, as for `reburn_zones_00`
+    """
+    rows, cols = dem.shape
+    update, update_zones, counts = reburn_cells_00(old_lines, new_lines, transform, cols, rows)
+    burned.flat[update] = reburn_values_00(update_zones, dem.flat[update], nodata)
+
+    return dict(counts, cells=int(len(update)))
+
+
+def reburn_zones_00(old_lines, new_lines, in_dem_path, burned_dem_path,
+                    tile_size=256):
+    """Updates a burned DEM in place for a changed set of culvert lines.
+
+    Each line cell belongs to the highest-numbered line crossing it (as in
+    `rasterize_lines_00`). Cells whose winning line isn't the same geometry
+    in both sets are dirty. Every new zone with a dirty cell, and every
+    zone that won a dirty cell before and still exists, is burned again
+    with its minimum on the original DEM. Dirty cells outside the new zones
+    get the original DEM value back. Everything else in the burned DEM is
+    left alone, and only the tiles holding changed cells are read and
+    written.
+
+    Parameters
+    ----------
+    old_lines, new_lines: dict
+        Extended culvert lines used for the existing burn, and the new ones
+        (see `shapefile_utilities_00.read_polylines_00`)
+    in_dem_path: str
+        Path to the original (unburned) DEM
+    burned_dem_path: str
+        Path to the burned DEM to update, on the same grid
+    tile_size: int, optional
+        Size of the square tiles that are updated and reported
+
+    Returns
+    -------
+    result: dict
+        dirty_tiles (list of [row_off, col_off, rows, cols]), cells
+        (number of cells rewritten), zones (number of zones burned again),
+        added and removed (number of lines)
+    """
+    import numpy as np
+    from osgeo import gdal
+
+    from general_scripts import raster_utilities_00 as ru
+
+    header = ru.read_header_00(in_dem_path)
+    cols, rows = header['cols'], header['rows']
+    update, update_zones, counts = reburn_cells_00(old_lines, new_lines,
+                                                   header['transform'], cols, rows)
+
+    dem_ds = gdal.Open(str(in_dem_path))
+    dem_band = dem_ds.GetRasterBand(1)
+    out_ds = gdal.Open(str(burned_dem_path), gdal.GA_Update)
+    out_band = out_ds.GetRasterBand(1)
+
+    # Original DEM values of the cells to update
+    tiles = list(tiles_00(update, cols, tile_size))
+    elev = np.empty(len(update))
+    for (r0, c0), index in tiles:
+        rr, cc = update[index] // cols, update[index] % cols
+        window = dem_band.ReadAsArray(c0, r0, min(tile_size, cols - c0), min(tile_size, rows - r0))
+        elev[index] = window[rr - r0, cc - c0]
+
+    values = reburn_values_00(update_zones, elev, header['nodata'])
+
+    dirty_tiles = []
+    for (r0, c0), index in tiles:
+        n_rows, n_cols = min(tile_size, rows - r0), min(tile_size, cols - c0)
+        window = out_band.ReadAsArray(c0, r0, n_cols, n_rows)
+        window[update[index] // cols - r0, update[index] % cols - c0] = values[index]
+        out_band.WriteArray(window, c0, r0)
+        dirty_tiles.append([r0, c0, n_rows, n_cols])
+    out_band.FlushCache()
+    out_ds = None
+    dem_ds = None
+
+    return dict(counts, dirty_tiles=dirty_tiles, cells=int(len(update)))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+DEM quality measures computed with NumPy and GDAL
+
+Rasters are read in row strips, so memory use doesn't depend on the DEM
+size. Neighbourhood measures read each strip with one extra row above and
+below it.
+
+Requires NumPy and the GDAL Python bindings (`osgeo`).
+
+Updated: 2026-10-19
+"""
+
+# Row and column offsets of the 8 neighbours
+NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+# Default histogram edges for elevation changes, in elevation units
+CHANGE_BINS = (-100.0, -10.0, -5.0, -2.0, -1.0, -0.5, -0.1, 0.0,
+               0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 100.0)
+
+
+def halo_strips_00(dem_path, strip_rows=None, halo=1):
+    """Reads a DEM in row strips with a border of `halo` cells.
+
+    Parameters
+    ----------
+    dem_path: str
+        Path to the DEM
+    strip_rows: int, optional
+        Number of rows in each strip. Defaults to a multiple of the DEM's block height.
+    halo: int, optional
+        Width of the border, in cells
+
+    Yields
+    ------
+    first_row: int
+    values: numpy array
+        Float64 array of (rows + 2 * halo, cols + 2 * halo) cells. Nodata
+        cells and cells outside the grid are NaN.
+    """
+    import numpy as np
+    from osgeo import gdal
+
+    from general_scripts import raster_utilities_00 as ru
+
+    ds = gdal.Open(str(dem_path))
+    band = ds.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    cols, rows = ds.RasterXSize, ds.RasterYSize
+    if strip_rows is None:
+        strip_rows = ru.block_rows_00(dem_path)
+
+    for r0, n in ru.row_strips_00(rows, strip_rows):
+        top = max(r0 - halo, 0)
+        bottom = min(r0 + n + halo, rows)
+        block = band.ReadAsArray(0, top, cols, bottom - top).astype('float64')
+        block[~ru.valid_mask_00(block, nodata)] = np.nan
+
+        values = np.full((n + 2 * halo, cols + 2 * halo), np.nan)
+        start = halo - (r0 - top)
+        values[start:start + (bottom - top), halo:halo + cols] = block
+        yield r0, values
+    ds = None
+
+
+def pit_mask_00(values):
+    """Cells of a halo strip that have no lower neighbour and don't drain off the DEM.
+
+    Cells next to nodata or the grid edge can drain out of the DEM, so they
+    aren't pits. Cells in flat areas without an outlet count as pits.
+
+    Parameters
+    ----------
+    values: numpy array
+        A strip from `halo_strips_00`
+
+    Returns
+    -------
+    pits: numpy array of bool
+        Mask of the strip's cells, without the border
+    """
+    import numpy as np
+
+    centre = values[1:-1, 1:-1]
+    rows, cols = centre.shape
+    has_outlet = np.isnan(centre)
+    for dr, dc in NEIGHBOURS:
+        nb = values[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+        has_outlet |= np.isnan(nb) | (nb < centre)
+
+    return ~has_outlet
+
+
+def count_pits_00(dem_path, strip_rows=None):
+    """Counts the cells with no downslope path out of the cell (see `pit_mask_00`)."""
+    import numpy as np
+
+    return int(sum(np.count_nonzero(pit_mask_00(values))
+                   for r0, values in halo_strips_00(dem_path, strip_rows)))
+
+
+def change_metrics_00(orig_path, new_path, strip_rows=None, bins=CHANGE_BINS,
+                      top_k=0):
+    """Measures how much a conditioned DEM differs from the original, in one pass.
+
+    Parameters
+    ----------
+    orig_path: str
+        Path to the original DEM
+    new_path: str
+        Path to the conditioned DEM, on the same grid
+    strip_rows: int, optional
+        Number of rows read at a time
+    bins: tuple of float, optional
+        Edges of the histogram of changes (new - original), in elevation
+        units. Changes outside the edges are counted in the first or last bin.
+    top_k: int, optional
+        Number of largest changes (by absolute value) to list
+
+    Returns
+    -------
+    metrics: dict
+        changed_cells, cut_cells, fill_cells, cut_volume and fill_volume (in
+        cubic map units), max_cut and max_fill (in elevation units),
+        histogram (dict with `edges` and `counts` of the changed cells) and
+        largest (list of dicts with row, col, x, y, orig, new and change)
+    """
+    import numpy as np
+    from osgeo import gdal
+
+    from general_scripts import raster_utilities_00 as ru
+
+    header = ru.read_header_00(orig_path)
+    cell_area = header['cell_x'] * header['cell_y']
+    gt = header['transform']
+    orig_ds = gdal.Open(str(orig_path))
+    new_ds = gdal.Open(str(new_path))
+    cols, rows = orig_ds.RasterXSize, orig_ds.RasterYSize
+    if (new_ds.RasterXSize, new_ds.RasterYSize) != (cols, rows):
+        raise ValueError("{} is not on the grid of {}".format(new_path, orig_path))
+    orig_band = orig_ds.GetRasterBand(1)
+    new_band = new_ds.GetRasterBand(1)
+    orig_nodata = orig_band.GetNoDataValue()
+    new_nodata = new_band.GetNoDataValue()
+    if strip_rows is None:
+        strip_rows = ru.block_rows_00(orig_path)
+
+    edges = np.asarray(bins, dtype='float64')
+    counts = np.zeros(len(edges) - 1, dtype='int64')
+    # Largest changes so far: flat index, original value, change
+    top = (np.zeros(0, 'int64'), np.zeros(0), np.zeros(0))
+
+    m = dict(changed_cells=0, cut_cells=0, fill_cells=0, cut_volume=0.0,
+             fill_volume=0.0, max_cut=0.0, max_fill=0.0)
+    for r0, n in ru.row_strips_00(rows, strip_rows):
+        orig = orig_band.ReadAsArray(0, r0, cols, n)
+        new = new_band.ReadAsArray(0, r0, cols, n)
+        valid = ru.valid_mask_00(orig, orig_nodata) & ru.valid_mask_00(new, new_nodata)
+        diff = new.astype('float64') - orig
+        changed = np.flatnonzero(valid & (diff != 0))
+        if not len(changed):
+            continue
+        d = diff.flat[changed]
+        cut = -d[d < 0]
+        fill = d[d > 0]
+        m['cut_cells'] += len(cut)
+        m['fill_cells'] += len(fill)
+        m['cut_volume'] += float(cut.sum()) * cell_area
+        m['fill_volume'] += float(fill.sum()) * cell_area
+        if len(cut):
+            m['max_cut'] = max(m['max_cut'], float(cut.max()))
+        if len(fill):
+            m['max_fill'] = max(m['max_fill'], float(fill.max()))
+        counts += np.histogram(np.clip(d, edges[0], edges[-1]), edges)[0]
+
+        if top_k:
+            index = np.r_[top[0], changed + r0 * cols]
+            values = np.r_[top[1], orig.flat[changed]]
+            d = np.r_[top[2], d]
+            keep = np.arange(len(d))
+            if len(d) > top_k:
+                keep = np.argpartition(-np.abs(d), top_k - 1)[:top_k]
+            keep = keep[np.argsort(-np.abs(d[keep]), kind='stable')]
+            top = (index[keep], values[keep], d[keep])
+    m['changed_cells'] = m['cut_cells'] + m['fill_cells']
+    m['histogram'] = dict(edges=edges.tolist(), counts=counts.tolist())
+    orig_ds = None
+    new_ds = None
+
+    m['largest'] = []
+    for index, value, d in zip(*top):
+        r, c = divmod(int(index), cols)
+        m['largest'].append(dict(
+            row=r, col=c,
+            x=gt[0] + (c + 0.5) * gt[1], y=gt[3] + (r + 0.5) * gt[5],
+            orig=float(value), new=float(value + d), change=float(d)))
+
+    return m
+
+
+def qa_report_00(orig_path, new_path, report_path, top_k=100, strip_rows=None):
+    """Writes the change metrics of a conditioned DEM to a .json report.
+
+    Parameters
+    ----------
+    orig_path: str
+        Path to the original DEM
+    new_path: str
+        Path to the conditioned DEM
+    report_path: str
+        Path to the .json report
+    top_k: int, optional
+        Number of largest changes to list
+
+    Returns
+    -------
+    metrics: dict
+        See `change_metrics_00`
+    """
+    import json
+    import os
+
+    metrics = change_metrics_00(orig_path, new_path, strip_rows, top_k=top_k)
+    report = dict(original=str(orig_path), conditioned=str(new_path), **metrics)
+
+    tmp = str(report_path) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(tmp, str(report_path))
+
+    return metrics
+
+
+def breach_metrics_00(orig_path, breached_path, strip_rows=None):
+    """Quality measures of a breached DEM: remaining pits, cut volume and max cut depth.
+
+    Returns
+    -------
+    metrics: dict
+        `pits` and the keys of `change_metrics_00`
+    """
+    metrics = change_metrics_00(orig_path, breached_path, strip_rows)
+    metrics['pits'] = count_pits_00(breached_path, strip_rows)
+
+    return metrics
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Writes a QA report of the changes between two DEMs.")
+    parser.add_argument("original", help="original DEM")
+    parser.add_argument("conditioned", help="conditioned DEM, on the same grid")
+    parser.add_argument("report", help="output .json report")
+    parser.add_argument("--top", type=int, default=100, help="number of largest changes to list")
+    a = parser.parse_args()
+
+    r = qa_report_00(a.original, a.conditioned, a.report, a.top)
+    print("{} cells changed, cut {:.1f}, fill {:.1f}, max cut {:.2f}".format(
+        r['changed_cells'], r['cut_volume'], r['fill_volume'], r['max_cut']))
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Runs the hydro-enforced DEM pipeline (wb_hydro_00) for many basins at once
+
+Basins are found under a root folder with the HUC/Surface/DSMxx_DEMyy layout,
+for example `Basins/CHOWN05/Surface/DSM00_LID00/CHOWN05_DEM00_LID00.tif`.
+Each basin's pipeline runs in its own process, with its tools pinned to
+its own CPUs. The pool size depends on the number of cores and on the
+memory available for the largest DEMs. The status of every basin is saved
+in a state file in the root folder, so if the batch is interrupted,
+rerunning it only processes the basins that didn't finish.
+
+Usage
+------
+From the repository root:
+
+    python -m whitebox_scripts.wb_basins_00 D:/Basins --culverts state_culverts.shp local_culverts.shp
+
+or from another script, `process_basins_00(root_path, culvert_paths)`.
+
+If a basin already has a PIPR file, `process_dems_00` is used with it. If not,
+`process_dems_first_00` creates it from the culvert files. Either way the
+steps are recorded in the basin's run manifest (RUN .json file next to the
+DEM), so a basin that is retried or run again reuses its PIPES and DSM
+groups and only runs the steps that didn't finish.
+
+Updated: 2026-10-19
+"""
+
+STATE_FILE_NAME = "basin_batch_state.json"
+
+
+def find_basins_00(root_path, dem_group="DSM00"):
+    """Finds the initial DEM of every basin under a root folder.
+
+    Parameters
+    ----------
+    root_path: str
+        Folder containing one folder per HUC
+    dem_group: str, optional
+        Class and number of the group holding the initial DEM. Example: 'DSM00'
+
+    Returns
+    -------
+    basins: list of dict
+        One dict per basin with keys `huc`, `dem` and `pipr` (path to an existing
+        pipe zones raster, or None)
+    """
+    from pathlib import Path
+
+    basins = []
+    for huc_dir in sorted(Path(str(root_path)).iterdir()):
+        surface = huc_dir / "Surface"
+        if not surface.is_dir():
+            continue
+        for grp in sorted(surface.glob("{}_*".format(dem_group))):
+            dems = sorted(grp.glob("{}_DEM*.tif".format(huc_dir.name)))
+            if not dems:
+                continue
+            piprs = sorted((huc_dir / "Hydro_Route").glob("PIPES*/*_PIPR*.tif"))
+            basins.append(dict(
+                huc=huc_dir.name,
+                dem=str(dems[0]),
+                pipr=str(piprs[-1]) if piprs else None,
+            ))
+
+    return basins
+
+
+def available_memory_00():
+    """Returns the available memory in bytes, or None if it can't be found."""
+    import os
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def pool_size_00(basins, cpus_per_basin=4, mem_factor=8.0):
+    """Number of basins to process at the same time on this machine.
+
+    Parameters
+    ----------
+    basins: list of dict
+        Basins from `find_basins_00`
+    cpus_per_basin: int, optional
+        CPUs given to each basin's tools
+    mem_factor: float, optional
+        Estimated peak memory of a basin's pipeline, as a multiple of its DEM
+        file size
+
+    Returns
+    -------
+    workers: int
+    """
+    import os
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    workers = max(cores // max(int(cpus_per_basin), 1), 1)
+
+    memory = available_memory_00()
+    if memory is not None and basins:
+        largest = max(os.path.getsize(b['dem']) for b in basins)
+        if largest > 0:
+            workers = min(workers, max(int(memory // (largest * mem_factor)), 1))
+
+    return max(min(workers, len(basins)), 1)
+
+
+def process_basin_00(basin, culvert_paths, extend_dist='20', breach_dist='50',
+                     cpus=None, shard_dir=None):
+    """Runs the DEM pipeline for one basin.
+
+    Parameters
+    ----------
+    basin: dict
+        Basin from `find_basins_00`
+    culvert_paths: list of str
+        Paths to culvert .shp files
+    extend_dist: str, optional
+        Distance in feet to extend culvert lines from each end
+    breach_dist: str, optional
+        Max breach distance, in feet
+    cpus: list of int, optional
+        CPU ids for the basin's tools (see `cpu_slots_00`). Defaults to all
+        available CPUs.
+    shard_dir: str, optional
+        Folder of per-HUC culvert shards (see `culvert_shards_00`)
+
+    Returns
+    -------
+    dems: list of str
+    """
+    from whitebox_scripts import wb_hydro_00 as wh
+
+    if basin['pipr'] is not None and wh.check_exists_00(basin['pipr']):
+        # Same manifest as process_dems_first_00, so a basin whose PIPR file
+        # was made by an earlier run keeps its DSM groups
+        manifest_path = wh.new_file_00(basin['dem'], "RUN", "json")
+        dems = wh.process_dems_00(basin['pipr'], basin['dem'], breach_dist,
+                                  manifest_path=manifest_path, cpus=cpus)
+    else:
+        dems = wh.process_dems_first_00(culvert_paths, basin['dem'], extend_dist,
+                                        breach_dist, shard_dir, cpus=cpus)
+
+    missing = [d for d in dems if not wh.check_exists_00(d)]
+    if missing:
+        raise RuntimeError("DEMs were not written: {}".format(missing))
+
+    return dems
+
+
+def cpu_slots_00(workers, cpus_per_basin):
+    """Splits the available CPUs into one list per worker.
+
+    Slot i gets CPUs i * cpus_per_basin to (i + 1) * cpus_per_basin - 1,
+    wrapping around if there are more workers than CPUs for them.
+
+    Returns
+    -------
+    slots: list of list of int
+    """
+    import os
+
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    k = max(int(cpus_per_basin), 1)
+
+    return [[cpus[(i * k + j) % len(cpus)] for j in range(min(k, len(cpus)))]
+            for i in range(workers)]
+
+
+def load_state_00(state_path):
+    """Reads the state file. Records are keyed by DEM path."""
+    import json
+    from pathlib import Path
+
+    if Path(state_path).exists():
+        with open(state_path) as f:
+            state = json.load(f)
+        # State files written before records were keyed by DEM path
+        return {r.get('dem', k): r for k, r in state.items()}
+    return {}
+
+
+def save_state_00(state_path, state):
+    import json
+    import os
+
+    tmp = "{}.tmp".format(state_path)
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, state_path)
+
+
+def process_basins_00(root_path, culvert_paths, extend_dist='20',
+                      breach_dist='50', cpus_per_basin=4, mem_factor=8.0,
+                      max_workers=None, max_attempts=2, dem_group="DSM00",
+                      shard_dir=None):
+    """Runs the DEM pipeline for every basin under the root folder.
+
+    Basins already marked as done in the state file are skipped. Each
+    running basin gets its own slice of the CPUs (see `cpu_slots_00`), and
+    no more basins are submitted than there are slices. A basin that was
+    running when a worker process crashed (for example, killed for running
+    out of memory) is retried up to `max_attempts` times; basins that were
+    still waiting are retried without using up an attempt.
+
+    Parameters
+    ----------
+    root_path: str
+        Folder containing one folder per HUC
+    culvert_paths: list of str
+        Paths to culvert .shp files (statewide or per basin)
+    extend_dist: str, optional
+        Distance in feet to extend culvert lines from each end
+    breach_dist: str, optional
+        Max breach distance, in feet
+    cpus_per_basin: int, optional
+        CPUs given to each basin's tools
+    mem_factor: float, optional
+        Estimated peak memory of a basin's pipeline, as a multiple of its DEM
+        file size
+    max_workers: int, optional
+        Number of basins to run at the same time. Defaults to `pool_size_00`.
+    max_attempts: int, optional
+        Number of times to try a basin before marking it as failed
+    dem_group: str, optional
+        Class and number of the group holding the initial DEM
+    shard_dir: str, optional
+        Folder of per-HUC culvert shards (see `culvert_shards_00`)
+
+    Returns
+    -------
+    state: dict
+        Status of every basin, by DEM path
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+    from pathlib import Path
+
+    state_path = str(Path(str(root_path)) / STATE_FILE_NAME)
+    state = load_state_00(state_path)
+    basins = [b for b in find_basins_00(root_path, dem_group)
+              if state.get(b['dem'], {}).get('status') != 'done']
+
+    if max_workers is None:
+        max_workers = pool_size_00(basins, cpus_per_basin, mem_factor)
+    slots = cpu_slots_00(max_workers, cpus_per_basin)
+    print("{} basins to process, {} at a time".format(len(basins), max_workers))
+
+    for b in basins:
+        state.setdefault(b['dem'], {}).update(huc=b['huc'], dem=b['dem'], attempts=0)
+
+    start = time.time()
+    pending = list(basins)
+    while pending:
+        queue = list(pending)
+        retry = []
+        free_slots = list(range(max_workers))
+        broken = False
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while running or (queue and not broken):
+                while queue and free_slots and not broken:
+                    b = queue.pop(0)
+                    slot = free_slots.pop(0)
+                    record = state[b['dem']]
+                    record.update(status='running', attempts=record.get('attempts', 0) + 1,
+                                  cpus=slots[slot],
+                                  started=time.strftime('%Y-%m-%dT%H:%M:%S'))
+                    f = executor.submit(process_basin_00, b, culvert_paths,
+                                        extend_dist, breach_dist, slots[slot],
+                                        shard_dir)
+                    running[f] = (b, slot, time.time())
+                save_state_00(state_path, state)
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for f in done:
+                    b, slot, submitted = running.pop(f)
+                    free_slots.append(slot)
+                    record = state[b['dem']]
+                    try:
+                        record.update(status='done', dems=f.result(), error=None)
+                    except BrokenProcessPool as e:
+                        # The pool is unusable; the basin is retried in a new pool
+                        broken = True
+                        if record['attempts'] < max_attempts:
+                            record.update(status='pending', error=repr(e))
+                            retry.append(b)
+                        else:
+                            record.update(status='failed', error=repr(e))
+                    except Exception as e:
+                        record.update(status='failed', error=repr(e))
+                    record['seconds'] = time.time() - submitted
+                    save_state_00(state_path, state)
+                    print("{}: {}".format(b['dem'], record['status']))
+        # Basins that never started don't use up an attempt
+        pending = retry + queue
+
+    done = [d for d, r in state.items() if r.get('status') == 'done']
+    failed = [d for d, r in state.items() if r.get('status') == 'failed']
+    elapsed = time.time() - start
+    print("{} basins done, {} failed, in {:.0f}s".format(len(done), len(failed), elapsed))
+    for d in failed:
+        print("  {}: {}".format(d, state[d]['error']))
+
+    return state
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Creates hydro-enforced DEMs for every basin in a folder.")
+    parser.add_argument("root", help="folder containing one folder per HUC")
+    parser.add_argument("--culverts", nargs="+", required=True, help="culvert .shp files")
+    parser.add_argument("--extend-dist", default='20')
+    parser.add_argument("--breach-dist", default='50')
+    parser.add_argument("--cpus-per-basin", type=int, default=4)
+    parser.add_argument("--mem-factor", type=float, default=8.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dem-group", default="DSM00")
+    parser.add_argument("--shard-dir", default=None, help="folder of per-HUC culvert shards")
+    a = parser.parse_args()
+
+    process_basins_00(a.root, a.culverts, a.extend_dist, a.breach_dist,
+                      a.cpus_per_basin, a.mem_factor, a.workers,
+                      dem_group=a.dem_group, shard_dir=a.shard_dir)
@@ -14,8 +14,18 @@ Use `process_dems_first_00`. This will create the next 3 DSM groups. It will als
 rasterized pipe zones file (PIPR), which you can re-use with higher-resolution DEMs.
 
 If you already have a PIPR file for the basin, you can just run process_dems_00(pipe_zones_path, dem_path).
+The PIPR file doesn't have to be on the same grid as the DEM. Zones aligned to the DEM's grid are made from
+the extended culvert lines (XTPIPE) next to it, or by resampling the PIPR file if there is no XTPIPE file.
+They are cached in the PIPES group for each grid, so each new resolution only needs one rasterization.
 
-Updated: 2020-07-15
+When the culvert inventory changes, make new XTPIPE lines with `process_culverts_00` and update each
+burned DEM with `reburn_culverts_00(old_xtpipe, new_xtpipe, dem_path, burned_dem_path)`. Only the
+changed culvert zones are burned again, and the changed tiles are listed for the steps downstream.
+
+To choose a breach distance, `breach_sweep_00(dem_path, ['20', '50', '100'])` runs the breach with each
+distance at the same time, scores the results and keeps the best one.
+
+Updated: 2026-10-19
 """
 
 
@@ -198,6 +208,87 @@ def clip_pipes_00(in_pipe_path, dem_path):
     return out_file
 
 
+def pipe_source_00(in_pipe_path, dem_path, shard_dir=None):
+    """Finds where to read a basin's culverts from a statewide culvert shapefile.
+
+    Parameters
+    -----------
+    in_pipe_path: str
+        Path to full culvert file
+    dem_path: str
+        Path to DEM .tif file
+    shard_dir: str, optional
+        Folder of per-HUC culvert shards (see `culvert_shards_00`)
+
+    Returns
+    -------
+    source_path: str
+        The basin's up-to-date shard, or the statewide file
+    record_ids: list of int
+        Zero-based record numbers of the basin's culverts in `source_path`
+    """
+    from pathlib import Path
+    
+    from general_scripts import raster_utilities_00 as ru
+    from general_scripts import shapefile_utilities_00 as su
+    from whitebox_scripts import culvert_index_00 as ci
+    from whitebox_scripts import culvert_shards_00 as cs
+    
+    huc = Path(dem_path).stem.split("_")[0]
+    
+    extent = ru.read_header_00(dem_path)['extent']
+    
+    shard = None
+    if shard_dir is not None:
+        shard = cs.find_shard_00(shard_dir, in_pipe_path, huc, extent)
+    
+    if shard is not None:
+        return shard, list(range(len(su.read_shx_00(shard))))
+    
+    return in_pipe_path, ci.query_index_00(in_pipe_path, extent)
+
+
+def extract_pipes_00(in_pipe_path, dem_path, shard_dir=None):
+    """Extracts the culverts that intersect a raster's extent from a statewide culvert shapefile.
+
+    Works like `clip_pipes_00`, but uses the spatial index next to the culvert
+    file (see `culvert_index_00`) instead of clipping the whole file with WBT.
+    Culverts crossing the raster's edge are kept whole.
+
+    Parameters
+    -----------
+    in_pipe_path: str
+        Path to full culvert file
+    dem_path: str
+        Path to DEM .tif file
+    shard_dir: str, optional
+        Folder of per-HUC culvert shards (see `culvert_shards_00`). If it has an
+        up-to-date shard of this file for the basin, the shard is copied instead.
+
+    Returns
+    -------
+    out_file: str
+    """
+    from pathlib import Path
+    
+    from general_scripts import shapefile_utilities_00 as su
+    
+    dem = Path(dem_path)
+    source_string = dem.stem.split("_")[0]
+    huc_dir = dem.parent.parent.parent
+    
+    source_path, ids = pipe_source_00(in_pipe_path, dem_path, shard_dir)
+    
+    # Create new pipe group
+    pipe_group = new_group_01(str(huc_dir / "Hydro_Route"),
+                              source_string,
+                              "PIPES")
+    out_file = new_file_00(dem_path, "PIPES", "shp", pipe_group)
+    su.write_subset_00(source_path, ids, out_file)
+    
+    return out_file
+
+
 def merge_pipes_00(in_pipe_paths):
     """Merges culvert features from multiple files.
 
@@ -257,7 +348,8 @@ def extend_pipes_00(in_pipe_path, dist='20.0'):
     return output_path
 
 
-def pipes_to_raster_00(in_pipe_path, in_dem_path):
+def pipes_to_raster_00(in_pipe_path, in_dem_path, output_path=None,
+                       in_process=False):
     """Converts the pipes feature to a raster.
 
     Rasterized culvert lines will be 1 cell wide, with the same cell size as the raster.
@@ -268,17 +360,30 @@ def pipes_to_raster_00(in_pipe_path, in_dem_path):
         Path to the pipe file to buffer
     in_dem_path: str
         Path to the base DEM
+    output_path: str, optional
+        Path to the output raster. If none given, creates a PIPR file next to
+        the pipe file.
+    in_process: bool, optional
+        Rasterize with `np_culverts_00.rasterize_pipes_00`, which only reads
+        the DEM's header, instead of WBT `vector_lines_to_raster`. Needs
+        NumPy and GDAL.
 
     Returns
     --------
     output_path: str
     """
     
+    # Create pipe raster file
+    if output_path is None:
+        output_path = new_file_00(in_pipe_path, "PIPR", "tif")
+    
+    if in_process:
+        from whitebox_scripts import np_culverts_00 as npc
+        
+        return npc.rasterize_pipes_00(in_pipe_path, in_dem_path, output_path)
+    
     from WBT.whitebox_tools import WhiteboxTools
     wbt = WhiteboxTools()
-    
-    # Create pipe raster file
-    output_path = new_file_00(in_pipe_path, "PIPR", "tif")
     wbt.vector_lines_to_raster(in_pipe_path, output_path, field="FID",
                                nodata=True,
                                base=in_dem_path)
@@ -286,7 +391,159 @@ def pipes_to_raster_00(in_pipe_path, in_dem_path):
     return output_path
 
 
-def zone_min_00(in_dem_path, in_zones_path):
+def zone_grids_index_00(zones_source_path):
+    """Path to the index of grid-aligned zone rasters made from a culvert source."""
+    from pathlib import Path
+    
+    return str(Path(str(zones_source_path)).parent / "zone_grids.json")
+
+
+def register_zone_grid_00(zones_source_path, in_dem_path, zones_path):
+    """Records a zone raster as the zones for the DEM's grid.
+
+    Parameters
+    ----------
+    zones_source_path: str
+        Path to the culvert lines (XTPIPE .shp) or master PIPR file
+    in_dem_path: str
+        Path to a DEM on the zone raster's grid
+    zones_path: str
+        Path to the zone raster
+    """
+    import json
+    import os
+    from pathlib import Path
+    
+    from general_scripts import raster_utilities_00 as ru
+    
+    index_path = zone_grids_index_00(zones_source_path)
+    index = {}
+    if Path(index_path).exists():
+        with open(index_path) as f:
+            index = json.load(f)
+    
+    rel = os.path.relpath(str(zones_path), str(Path(index_path).parent))
+    index[ru.grid_signature_00(in_dem_path)] = rel
+    
+    tmp = index_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, index_path)
+
+
+def xtpipe_for_pipr_00(pipr_path):
+    """Finds the extended culvert lines (XTPIPE file) a PIPR file was made from.
+
+    Both are in the same PIPES group. `process_culverts_00` names them
+    `{huc}_XTPIPE{nn}_{source}.shp` and `{huc}_PIPR{nn}_XTPIPE{nn}.tif`;
+    `culverts_in_memory_00` names them `{huc}_XTPIPE{nn}_{dem}.shp` and
+    `{huc}_PIPR{nn}_{dem}.tif`.
+
+    Parameters
+    ----------
+    pipr_path: str
+        Path to the PIPR .tif file
+
+    Returns
+    -------
+    lines: path object or None
+        Path to the XTPIPE .shp file, or None if there isn't one
+    """
+    from pathlib import Path
+    
+    pipr = Path(str(pipr_path))
+    name_strings = pipr.stem.split('_')
+    if len(name_strings) < 3:
+        return None
+    huc, grpno, source = name_strings[0], name_strings[1][-2:], name_strings[2]
+    
+    if source.startswith("XTPIPE"):
+        candidates = sorted(pipr.parent.glob("{}_{}_*.shp".format(huc, source)))
+    else:
+        candidates = [pipr.parent / "{}_XTPIPE{}_{}.shp".format(huc, grpno, source)]
+    for lines in candidates:
+        if lines.exists():
+            return lines
+    
+    return None
+
+
+def zones_for_grid_00(zones_source_path, in_dem_path):
+    """Returns a culvert zone raster aligned to the DEM's grid.
+
+    The first time a grid is seen, the zones are rasterized from the extended
+    culvert lines (XTPIPE file) onto the DEM's grid. If the source is a PIPR
+    file without an XTPIPE file next to it, the PIPR file is resampled to the
+    DEM's grid with nearest neighbour instead, which makes the culverts as wide
+    as the PIPR cells. Results are cached in the source's PIPES group by grid,
+    so later calls for the same grid return the cached raster.
+
+    Parameters
+    ----------
+    zones_source_path: str
+        Path to an XTPIPE .shp file or a PIPR .tif file on any grid
+    in_dem_path: str
+        Path to the DEM
+
+    Returns
+    -------
+    zones_path: str
+        Path to the zone raster for the DEM's grid
+    """
+    import json
+    from pathlib import Path
+    
+    from general_scripts import raster_utilities_00 as ru
+    from WBT.whitebox_tools import WhiteboxTools
+    
+    source = Path(str(zones_source_path))
+    signature = ru.grid_signature_00(in_dem_path)
+    
+    # A PIPR file already on this grid
+    if source.suffix.lower() == ".tif" and ru.grid_signature_00(str(source)) == signature:
+        return str(source)
+    
+    index_path = Path(zone_grids_index_00(str(source)))
+    if index_path.exists():
+        with open(str(index_path)) as f:
+            cached = json.load(f).get(signature)
+        if cached is not None:
+            cached_path = index_path.parent / cached
+            if (cached_path.exists() and
+                    cached_path.stat().st_mtime >= source.stat().st_mtime):
+                return str(cached_path)
+    
+    if source.suffix.lower() == ".tif":
+        lines = xtpipe_for_pipr_00(str(source))
+        pipr_name = source.name
+    else:
+        lines = source
+        pipr_name = Path(new_file_00(str(source), "PIPR", "tif")).name
+    
+    grid_dir = source.parent / "zone_grids" / signature
+    grid_dir.mkdir(parents=True, exist_ok=True)
+    zones_path = grid_dir / pipr_name
+    
+    if lines is not None and lines.exists():
+        pipes_to_raster_00(str(lines), in_dem_path, str(zones_path))
+    else:
+        # Resample takes its grid from the existing destination raster, so
+        # start from one on the DEM's grid where every cell is outside the zones
+        header = ru.read_header_00(str(source))
+        nodata = header['nodata'] if header['nodata'] is not None else 0
+        ds = ru.create_like_00(in_dem_path, str(zones_path), dtype=header['dtype'],
+                               nodata=nodata)
+        ds.GetRasterBand(1).Fill(nodata)
+        ds = None
+        wbt = WhiteboxTools()
+        wbt.resample(str(source), str(zones_path), method="nn")
+    
+    register_zone_grid_00(str(source), in_dem_path, str(zones_path))
+    
+    return str(zones_path)
+
+
+def zone_min_00(in_dem_path, in_zones_path, cpus=None):
     """Set cells in culvert zones to the min elevation for the zone.
 
     Parameters
@@ -295,6 +552,8 @@ def zone_min_00(in_dem_path, in_zones_path):
         Path to input DEM file
     in_zones_path: str
         Path to culvert raster file
+    cpus: list of int, optional
+        CPU ids the tool may use. Defaults to all.
 
     Returns
     -------
@@ -302,6 +561,7 @@ def zone_min_00(in_dem_path, in_zones_path):
     """
     from WBT.whitebox_tools import WhiteboxTools
     wbt = WhiteboxTools()
+    wbt.set_cpu_affinity(cpus)
     
     output_path = new_file_00(in_zones_path, "MIN", "tif")
     wbt.zonal_statistics(in_dem_path, in_zones_path, output_path,
@@ -310,7 +570,8 @@ def zone_min_00(in_dem_path, in_zones_path):
     return output_path
 
 
-def burn_min_00(in_dem_path, in_zones_path):
+def burn_min_00(in_dem_path, in_zones_path, out_group=None, cpus=None,
+                fused=False):
     """Creates a new DEM with culvert zones burned in.
 
     Uses culvert zone minimum values where they exist and values from the
@@ -321,7 +582,16 @@ def burn_min_00(in_dem_path, in_zones_path):
     in_dem_path: str
         Path to the DEM input file
     in_zones_path: str
-        Path to raster file resulting from zonal statistics minimum tool
+        Path to raster file resulting from zonal statistics minimum tool, or
+        to the pipe zones raster (PIPR) if `fused` is True
+    out_group: str, optional
+        Path to an existing output group. If none given, creates the next group.
+    cpus: list of int, optional
+        CPU ids the tools may use. Defaults to all.
+    fused: bool, optional
+        Burn the zones in one pass with `np_culverts_00.burn_zone_min_00`
+        instead of running zone_min_00, is_no_data and pick_from_list. Needs
+        NumPy and GDAL.
 
     Returns
     -------
@@ -330,8 +600,18 @@ def burn_min_00(in_dem_path, in_zones_path):
     
     from WBT.whitebox_tools import WhiteboxTools
     wbt = WhiteboxTools()
+    wbt.set_cpu_affinity(cpus)
     
-    out_group = new_group_00(in_dem_path)
+    if out_group is None:
+        out_group = new_group_00(in_dem_path)
+    
+    if fused:
+        from whitebox_scripts import np_culverts_00 as npc
+        
+        output_path = new_file_00(in_dem_path, "DEM", "tif", out_group)
+        npc.burn_zone_min_00(in_dem_path, in_zones_path, output_path)
+        
+        return output_path
     
     # Create position raster
     pos_path = new_file_00(in_dem_path, "POS", "tif", out_group)
@@ -348,7 +628,8 @@ def burn_min_00(in_dem_path, in_zones_path):
     return output_path
 
 
-def breach_depressions_00(in_dem_path, breach_dist='20'):
+def breach_depressions_00(in_dem_path, breach_dist='20', out_group=None,
+                          cpus=None, max_cost=None, output_path=None):
     """Runs whitebox breach_depressions_least_cost tool
 
     Parameters
@@ -357,6 +638,14 @@ def breach_depressions_00(in_dem_path, breach_dist='20'):
         Path to the DEM
     breach_dist: str, optional
         Search radius
+    out_group: str, optional
+        Path to an existing output group. If none given, creates the next group.
+    cpus: list of int, optional
+        CPU ids the tool may use. Defaults to all.
+    max_cost: str, optional
+        Maximum breach cost, for DEMs with quarries. Defaults to no limit.
+    output_path: str, optional
+        Path to the output DEM. If given, `out_group` isn't used.
 
     Returns
     --------
@@ -365,28 +654,186 @@ def breach_depressions_00(in_dem_path, breach_dist='20'):
     
     from WBT.whitebox_tools import WhiteboxTools
     wbt = WhiteboxTools()
+    wbt.set_cpu_affinity(cpus)
     
-    out_group = new_group_00(in_dem_path)
-    output_path = new_file_00(in_dem_path, "DEM", "tif", out_group)
+    if output_path is None:
+        if out_group is None:
+            out_group = new_group_00(in_dem_path)
+        output_path = new_file_00(in_dem_path, "DEM", "tif", out_group)
     
     wbt.breach_depressions_least_cost(in_dem_path, output_path, breach_dist,
-                                      fill=True)
-    # TODO: Add max_cost parameter for DEMs with quarries?
+                                      max_cost=max_cost, fill=True)
     
     return output_path
 
 
-def process_culverts_00(culvert_paths, in_dem_path, extend_dist='20'):
+def breach_score_00(metrics):
+    """Default ranking of breach results: fewest pits, then least total change, then shallowest cut.
+
+    The breach fills what it can't breach (`fill=True`), so pits are nearly
+    always 0, and a short breach distance trades cut for fill. The total
+    change is therefore cut plus fill volume, not cut volume alone, which
+    would always favour the shortest distance.
+    """
+    return (metrics['pits'], metrics['cut_volume'] + metrics['fill_volume'],
+            metrics['max_cut'])
+
+
+def breach_sweep_00(in_dem_path, breach_dists, max_costs=None, out_group=None,
+                    max_cpus=None, score=breach_score_00):
+    """Breaches a DEM with several settings at the same time and keeps the best result.
+
+    Every combination of breach distance and max cost is run under the CPU
+    budget (see `run_graph_00`) and scored with `np_dem_00.breach_metrics_00`
+    as soon as it finishes. The best result is saved as the group's DEM,
+    with a table of every run's metrics next to it (BRS .csv file). The
+    other results are deleted.
+
+    Each run needs as much memory as a single breach of the DEM, so lower
+    `max_cpus` for DEMs that don't fit in memory that many times.
+
+    Parameters
+    ----------
+    in_dem_path: str
+        Path to the DEM
+    breach_dists: list of str
+        Breach distances to try. Example: ['20', '50', '100']
+    max_costs: list of str, optional
+        Maximum breach costs to try. Defaults to no limit.
+    out_group: str, optional
+        Path to an existing output group. If none given, creates the next group.
+    max_cpus: int, optional
+        Total number of CPUs to use. Defaults to all available CPUs.
+    score: function, optional
+        Takes a run's metrics dict and returns a key; the run with the
+        lowest key is kept. The default counts cut and fill volume together
+        (see `breach_score_00`).
+
+    Returns
+    -------
+    output_path: str
+        Path to the chosen DEM
+    table: list of dict
+        Settings and metrics of each run, best first
+    """
+    import csv
+    import os
+    import shutil
+    from pathlib import Path
+    
+    from whitebox_scripts import np_dem_00 as nd
+    
+    if out_group is None:
+        out_group = new_group_00(in_dem_path)
+    sweep_dir = Path(out_group) / "breach_sweep"
+    sweep_dir.mkdir(exist_ok=True)
+    
+    def run(dist, cost, path, cpus=None):
+        breach_depressions_00(in_dem_path, dist, cpus=cpus, max_cost=cost,
+                              output_path=path)
+        if not check_exists_00(path):
+            raise IOError("Breach with distance {} and max cost {} failed".format(dist, cost))
+        metrics = nd.breach_metrics_00(in_dem_path, path)
+        metrics.update(breach_dist=dist, max_cost=cost, path=path)
+        return metrics
+    
+    steps = {}
+    for dist in breach_dists:
+        for cost in (max_costs or [None]):
+            name = "d{}_c{}".format(dist, cost)
+            path = str(sweep_dir / "{}.tif".format(name))
+            steps[name] = (run, [], lambda r, a=(str(dist), cost, path): a)
+    results = run_graph_00(steps, max_cpus)
+    
+    table = sorted(results.values(), key=score)
+    output_path = new_file_00(in_dem_path, "DEM", "tif", out_group)
+    os.replace(table[0]['path'], output_path)
+    shutil.rmtree(str(sweep_dir))
+    
+    fields = ['breach_dist', 'max_cost', 'pits', 'cut_volume', 'max_cut',
+              'cut_cells', 'fill_volume', 'max_fill', 'fill_cells', 'changed_cells']
+    table_path = new_file_00(in_dem_path, "BRS", "csv", out_group)
+    with open(table_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fields + ['chosen'], extrasaction='ignore')
+        writer.writeheader()
+        for i, row in enumerate(table):
+            row.pop('path')
+            writer.writerow(dict(row, chosen=int(i == 0)))
+    
+    return output_path, table
+
+
+def load_pipes_00(culvert_paths, in_dem_path, shard_dir=None):
+    """Loads a basin's culvert lines from culvert shapefiles into memory.
+
+    Statewide files are read through their index or the basin's shard (see
+    `pipe_source_00`). Files already clipped to the basin are read whole.
+
+    Parameters
+    ----------
+    culvert_paths: list of str
+        Paths to culvert files
+    in_dem_path: str
+        Path to the basin's DEM
+    shard_dir: str, optional
+        Folder of per-HUC shards of the statewide files
+
+    Returns
+    -------
+    lines: dict
+        Merged polylines (see `np_culverts_00.merge_lines_00`)
+    sources: list of tuple
+        (source path, record number) of each merged record
+    """
+    from pathlib import Path
+    
+    from general_scripts import shapefile_utilities_00 as su
+    from whitebox_scripts import np_culverts_00 as npc
+    
+    huc = Path(in_dem_path).stem.split("_")[0]
+    
+    lines_list = []
+    sources = []
+    for cp in culvert_paths:
+        if huc not in cp:
+            source_path, ids = pipe_source_00(cp, in_dem_path, shard_dir)
+        else:
+            source_path, ids = cp, None
+        lines = su.read_polylines_00(source_path, ids)
+        if ids is None:
+            ids = range(lines['num_records'])
+        lines_list.append(lines)
+        sources.extend((source_path, i) for i in ids)
+    
+    return npc.merge_lines_00(lines_list), sources
+
+
+def process_culverts_00(culvert_paths, in_dem_path, extend_dist='20',
+                        shard_dir=None, manifest_path=None, in_memory=False):
     """Creates a pipe zones raster file from a list of culvert shapefiles
 
+    By default each step writes a shapefile and runs a WBT tool. With
+    `in_memory=True`, the culvert lines are merged, extended and rasterized
+    in memory (see `load_pipes_00`), and only the extended lines (XTPIPE)
+    and pipe zones raster (PIPR) are written, to a new PIPES group.
+
     Parameters
     ----------
     culvert_paths: list of str
         Paths to culvert files. Can be statewide shapefiles or those already clipped to the basin extent.
+        Statewide files are indexed the first time they are used (see `extract_pipes_00`).
     in_dem_path: str
         Path to first DEM file
     extend_dist: str, optional
         Distance to extend pipes from each end, in feet
+    shard_dir: str, optional
+        Folder of per-HUC shards of the statewide files (see `culvert_shards_00`)
+    manifest_path: str, optional
+        Path to a run manifest (see `general_scripts.step_manifest_00`). Steps
+        recorded in it that are still current are skipped.
+    in_memory: bool, optional
+        Merge and extend the lines in memory instead of with WBT. Needs
+        NumPy and GDAL.
 
     Returns
     --------
@@ -394,25 +841,201 @@ def process_culverts_00(culvert_paths, in_dem_path, extend_dist='20'):
         Path to raster created from clipped, merged pipe files
     """
     from pathlib import Path
+    
+    from general_scripts import step_manifest_00 as sm
+    
+    if in_memory:
+        extended_pipes, pipe_raster = sm.run_step_00(
+            manifest_path, "culverts", culverts_in_memory_00,
+            [list(culvert_paths), in_dem_path, str(extend_dist), shard_dir])
+        register_zone_grid_00(str(extended_pipes), in_dem_path, pipe_raster)
+        
+        return pipe_raster
 
     huc = Path(in_dem_path).stem.split("_")[0]
     
     pipes = []
-    for cp in culvert_paths:
+    for i, cp in enumerate(culvert_paths):
         if huc not in cp:
-            clip = clip_pipes_00(cp, in_dem_path)
+            clip = sm.run_step_00(manifest_path, "extract{:02d}".format(i),
+                                  extract_pipes_00, [cp, in_dem_path, shard_dir])
             pipes.append(clip)
         else:
             pipes.append(cp)
     
-    merged_pipes = merge_pipes_00(pipes)
-    extended_pipes = extend_pipes_00(str(merged_pipes), str(extend_dist))
-    pipe_raster = pipes_to_raster_00(str(extended_pipes), in_dem_path)
+    merged_pipes = sm.run_step_00(manifest_path, "merge", merge_pipes_00, [pipes])
+    extended_pipes = sm.run_step_00(manifest_path, "extend", extend_pipes_00,
+                                    [str(merged_pipes), str(extend_dist)])
+    pipe_raster = sm.run_step_00(manifest_path, "rasterize", pipes_to_raster_00,
+                                 [str(extended_pipes), in_dem_path])
+    register_zone_grid_00(str(extended_pipes), in_dem_path, pipe_raster)
     
     return pipe_raster
 
 
-def process_dems_00(pipe_zones_path, in_dem_path, breach_dist='50'):
+def culverts_in_memory_00(culvert_paths, in_dem_path, extend_dist='20',
+                          shard_dir=None):
+    """Loads, merges, extends and rasterizes culvert lines without intermediate files.
+
+    Writes the extended lines (XTPIPE, with FID, SRC and SRC_FID fields) and
+    the pipe zones raster (PIPR) to a new PIPES group. Zones are numbered
+    like the WBT steps number them: record number of the XTPIPE file plus 1.
+
+    Returns
+    -------
+    extended_pipes: str
+        Path to the XTPIPE .shp file
+    pipe_raster: str
+        Path to the PIPR .tif file
+    """
+    from pathlib import Path
+    
+    from general_scripts import shapefile_utilities_00 as su
+    from whitebox_scripts import np_culverts_00 as npc
+    
+    lines, sources = load_pipes_00(culvert_paths, in_dem_path, shard_dir)
+    lines = npc.extend_lines_00(lines, float(extend_dist))
+    
+    dem = Path(in_dem_path)
+    pipe_group = new_group_01(str(dem.parent.parent.parent / "Hydro_Route"),
+                              dem.stem.split("_")[1], "PIPES")
+    extended_pipes = new_file_00(in_dem_path, "XTPIPE", "shp", pipe_group)
+    pipe_raster = new_file_00(in_dem_path, "PIPR", "tif", pipe_group)
+    
+    npc.rasterize_lines_00(lines, lines['part_records'] + 1, in_dem_path, pipe_raster)
+    
+    fields = [('FID', 'N', 10, 0), ('SRC', 'C', 80, 0), ('SRC_FID', 'N', 10, 0)]
+    dbf_records = [su.dbf_record_00(fields, (i + 1, Path(src).stem, rec + 1))
+                   for i, (src, rec) in enumerate(sources)]
+    prj = Path(str(sources[0][0])).with_suffix(".prj") if sources else None
+    su.write_shapefile_00(extended_pipes, 3, su.polyline_records_00(lines),
+                          su.dbf_header_00(fields, len(dbf_records)), dbf_records,
+                          str(prj) if prj else None)
+    
+    return extended_pipes, pipe_raster
+
+
+def reburn_culverts_00(old_pipe_path, new_pipe_path, in_dem_path,
+                       burned_dem_path, tile_size=256):
+    """Updates a burned DEM for a changed culvert inventory, without burning it again.
+
+    Make the new extended culvert lines first, with `process_culverts_00`
+    (quickest with `in_memory=True`), then call this for each resolution's burned
+    DEM. Only the zones whose lines changed are burned again (see
+    `np_culverts_00.reburn_zones_00`), and the tiles that changed are listed
+    in a DIRTY .json file next to the burned DEM, for the steps downstream.
+
+    Parameters
+    ----------
+    old_pipe_path: str
+        Path to the extended culvert lines (XTPIPE .shp) used for the existing burn
+    new_pipe_path: str
+        Path to the new extended culvert lines
+    in_dem_path: str
+        Path to the original DEM
+    burned_dem_path: str
+        Path to the burned DEM (DSM01 group), updated in place
+    tile_size: int, optional
+        Size of the square tiles that are updated and reported
+
+    Returns
+    -------
+    dirty_path: str
+        Path to the .json file listing the changed tiles
+    """
+    import json
+    
+    from general_scripts import shapefile_utilities_00 as su
+    from whitebox_scripts import np_culverts_00 as npc
+    
+    result = npc.reburn_zones_00(su.read_polylines_00(old_pipe_path),
+                                 su.read_polylines_00(new_pipe_path),
+                                 in_dem_path, burned_dem_path, tile_size)
+    result.update(dem=str(burned_dem_path), old_pipes=str(old_pipe_path),
+                  new_pipes=str(new_pipe_path), tile_size=tile_size)
+    
+    dirty_path = new_file_00(burned_dem_path, "DIRTY", "json")
+    with open(dirty_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print("{}: {} lines added, {} removed, {} zones and {} cells in {} tiles updated".format(
+        burned_dem_path, result['added'], result['removed'], result['zones'],
+        result['cells'], len(result['dirty_tiles'])))
+    
+    return dirty_path
+
+
+def run_graph_00(steps, max_cpus=None, cpus=None):
+    """Runs a small dependency graph of steps, running independent steps at the same time.
+
+    CPUs are split evenly between the steps that are running or ready to run.
+    If there are more ready steps than free CPUs, the rest wait for a
+    running step to finish. Each step function must accept a `cpus` keyword
+    argument with the list of CPU ids it may use.
+
+    Parameters
+    ----------
+    steps: dict
+        Maps step names to (function, dependencies, args) tuples. `args`
+        is a function that takes the dict of finished step results and
+        returns the step function's positional arguments.
+    max_cpus: int, optional
+        Total number of CPUs to use. Defaults to all available CPUs.
+    cpus: list of int, optional
+        CPU ids to use, instead of the first `max_cpus` available ones. Give
+        each graph its own list when several graphs run at the same time.
+
+    Returns
+    -------
+    results: dict
+        Return value of each step, by step name
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    
+    if cpus is not None:
+        all_cpus = list(cpus)
+    elif hasattr(os, 'sched_getaffinity'):
+        all_cpus = sorted(os.sched_getaffinity(0))
+    else:
+        all_cpus = list(range(os.cpu_count() or 1))
+    if max_cpus is not None:
+        all_cpus = all_cpus[:max(int(max_cpus), 1)]
+    
+    free_cpus = list(all_cpus)
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        while len(results) < len(steps):
+            started = [name for name, cpus in running.values()]
+            ready = [name for name, (func, deps, args) in steps.items()
+                     if name not in results and name not in started
+                     and all(d in results for d in deps)]
+            share = max(len(all_cpus) // max(len(running) + len(ready), 1), 1)
+            for name in ready:
+                if not free_cpus:
+                    break
+                cpus = free_cpus[:share]
+                free_cpus = free_cpus[len(cpus):]
+                func, deps, args = steps[name]
+                f = executor.submit(func, *args(results), cpus=cpus)
+                running[f] = (name, cpus)
+            
+            if not running:
+                raise ValueError("Step dependencies can't be satisfied: {}".format(
+                    sorted(set(steps) - set(results))))
+            
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for f in done:
+                name, cpus = running.pop(f)
+                free_cpus.extend(c for c in cpus if c not in free_cpus)
+                results[name] = f.result()
+    
+    return results
+
+
+def process_dems_00(pipe_zones_path, in_dem_path, breach_dist='50',
+                    max_cpus=None, fused=False, manifest_path=None, qa=False,
+                    cpus=None):
     """Creates 3 new DSM groups from initial DEM and pipe zones raster.
 
     If you already have a PIPR file for the basin, you can start here. If
@@ -422,46 +1045,135 @@ def process_dems_00(pipe_zones_path, in_dem_path, breach_dist='50'):
     DSM01_DEM00: Burn in culverts DSM02_DEM00: Breach depressions DSM03_DEM01:
     Burn in culverts, then breach depressions
 
+    Breaching the original DEM doesn't depend on the culvert burn, so it runs
+    at the same time as the burn, and the CPUs are split between them.
+
     Parameters
     -----------
     pipe_zones_path: str
-        Path to pipe zone .tif file (created from first run)
+        Path to pipe zone .tif file (created from first run). It can be on
+        another grid than the DEM, or be the XTPIPE .shp file; see
+        `zones_for_grid_00`.
     in_dem_path: str
         Path to initial DEM file
     breach_dist: str, optional
         Maximum distance to breach depressions
+    max_cpus: int, optional
+        Total number of CPUs to use. Defaults to all available CPUs.
+    fused: bool, optional
+        Burn in culverts in one pass over the DEM (see `burn_min_00`)
+    manifest_path: str, optional
+        Path to a run manifest (see `general_scripts.step_manifest_00`). The
+        DSM groups recorded in it are reused instead of creating new ones,
+        and steps that are still current are skipped.
+    qa: bool, optional
+        Write a QA report of the changes in each new group (see `qa_dems_00`)
+    cpus: list of int, optional
+        CPU ids to use (see `run_graph_00`)
 
     Returns
     -------
     dems: list of str
         List of paths to DEM files (useful if called from another script)
     """
-    dems = [in_dem_path]
+    import functools
+    from pathlib import Path
     
-    # Add culverts to DEM
-    min_zones = zone_min_00(in_dem_path, pipe_zones_path)
-    dem01 = burn_min_00(in_dem_path, min_zones)
-    dems.append(dem01)
+    from general_scripts import step_manifest_00 as sm
     
-    # Breach depressions on original DEM file
-    dem02 = breach_depressions_00(in_dem_path, str(breach_dist))
-    dems.append(dem02)
+    pipe_zones_path = zones_for_grid_00(pipe_zones_path, in_dem_path)
     
-    # Breach depressions on file with culverts
-    dem03 = breach_depressions_00(dem01, str(breach_dist))
-    dems.append(dem03)
+    # Create the groups first, so their numbers don't depend on which step
+    # finishes first
+    groups = sm.load_manifest_00(manifest_path)['groups']
+    names = ['grp01', 'grp02', 'grp03']
+    if all(n in groups and Path(groups[n]).is_dir() for n in names):
+        grp01, grp02, grp03 = [groups[n] for n in names]
+    else:
+        grp01 = new_group_00(in_dem_path)
+        dem01_path = new_file_00(in_dem_path, "DEM", "tif", grp01)
+        grp02 = new_group_00(in_dem_path)
+        grp03 = new_group_00(dem01_path)
+        if manifest_path is not None:
+            for n, grp in zip(names, [grp01, grp02, grp03]):
+                sm.update_manifest_00(manifest_path, 'groups', n, grp)
+    
+    if fused:
+        burn_step = (sm.checkpointed_00(manifest_path, 'dem01',
+                                        functools.partial(burn_min_00, fused=True),
+                                        dict(fused=True)),
+                     [], lambda r: (in_dem_path, pipe_zones_path, grp01))
+    else:
+        burn_step = (sm.checkpointed_00(manifest_path, 'dem01', burn_min_00), ['min'],
+                     lambda r: (in_dem_path, r['min'], grp01))
+    
+    steps = {
+        # Add culverts to DEM
+        'dem01': burn_step,
+        # Breach depressions on original DEM file
+        'dem02': (sm.checkpointed_00(manifest_path, 'dem02', breach_depressions_00), [],
+                  lambda r: (in_dem_path, str(breach_dist), grp02)),
+        # Breach depressions on file with culverts
+        'dem03': (sm.checkpointed_00(manifest_path, 'dem03', breach_depressions_00), ['dem01'],
+                  lambda r: (r['dem01'], str(breach_dist), grp03)),
+    }
+    if not fused:
+        steps['min'] = (sm.checkpointed_00(manifest_path, 'min', zone_min_00), [],
+                        lambda r: (in_dem_path, pipe_zones_path))
+    results = run_graph_00(steps, max_cpus, cpus)
+    
+    dems = [in_dem_path, results['dem01'], results['dem02'], results['dem03']]
+    if qa:
+        qa_dems_00(dems)
     
     return dems
 
 
+def qa_dems_00(dems, top_k=100):
+    """Writes a QA report for each conditioned DEM made by `process_dems_00`.
+
+    Each DEM after the first is compared with the first (the original DEM)
+    in one streaming pass (see `np_dem_00.change_metrics_00`), and the report
+    is saved in the DEM's group as a QA .json file.
+
+    Parameters
+    ----------
+    dems: list of str
+        The original DEM followed by the conditioned DEMs
+    top_k: int, optional
+        Number of largest changes to list in each report
+
+    Returns
+    -------
+    reports: list of str
+        Paths to the reports
+    """
+    from whitebox_scripts import np_dem_00 as nd
+    
+    reports = []
+    for dem in dems[1:]:
+        report_path = new_file_00(dem, "QA", "json")
+        m = nd.qa_report_00(dems[0], dem, report_path, top_k)
+        print("{}: {} cells changed, max cut {:.2f}, max fill {:.2f}".format(
+            dem, m['changed_cells'], m['max_cut'], m['max_fill']))
+        reports.append(report_path)
+    
+    return reports
+
+
 def process_dems_first_00(culvert_paths, in_dem_path, extend_dist='20',
-                          breach_dist='50'):
+                          breach_dist='50', shard_dir=None, resume=True, cpus=None):
     """Creates the next 3 DEMs from the initial DEM and pipe shapefiles.
 
     You only need to run this once, preferably using a 20ft resolution DEM.
     If you already have a culvert raster file for the basin, use
     `process_dems_00` instead.
 
+    Each completed step is recorded in a run manifest next to the DEM
+    (`<huc>_RUNxx_<source>.json`). If a run stops part way, running it
+    again with the same arguments reuses its PIPES and DSM groups and only
+    runs the steps that didn't finish, or whose inputs changed since.
+
     Parameters
     ----------
     culvert_paths: list
@@ -472,15 +1184,33 @@ def process_dems_first_00(culvert_paths, in_dem_path, extend_dist='20',
         Distance in feet to extend culvert lines from each end
     breach_dist: str, optional
         Max breach distance, in feet
+    shard_dir: str, optional
+        Folder of per-HUC shards of the statewide files (see `culvert_shards_00`)
+    resume: bool, optional
+        Continue from the run manifest. If False, starts a new run with new groups.
+    cpus: list of int, optional
+        CPU ids to use (see `run_graph_00`)
 
     Returns
     -------
     dems: list of str
         List of paths to DEM files (useful if called from another script)
     """
+    from pathlib import Path
+    
+    from general_scripts import step_manifest_00 as sm
+    
+    manifest_path = new_file_00(in_dem_path, "RUN", "json")
+    if not resume and Path(manifest_path).exists():
+        Path(manifest_path).unlink()
+    sm.start_run_00(manifest_path, dict(
+        culvert_paths=[str(Path(str(cp)).resolve()) for cp in culvert_paths],
+        extend_dist=str(extend_dist), breach_dist=str(breach_dist)))
     
-    pipe_raster = process_culverts_00(culvert_paths, in_dem_path, extend_dist)
-    dems = process_dems_00(pipe_raster, in_dem_path, breach_dist)
+    pipe_raster = process_culverts_00(culvert_paths, in_dem_path, extend_dist,
+                                      shard_dir, manifest_path)
+    dems = process_dems_00(pipe_raster, in_dem_path, breach_dist,
+                           manifest_path=manifest_path, cpus=cpus)
     
     return dems
 